@@ -22,17 +22,17 @@ with DAG(
 
     t1 = BashOperator(
         task_id='ingest_drone_images',
-        bash_command='python3 /home/ubuntu/pasture-ai-debug/data_pipeline/ingest_drone.py --src /data/raw/drone/ --out /data/interim/catalog.csv',
+        bash_command='python3 /home/ubuntu/pasture-ai-debug/data_pipeline/ingest_drone.py --src /data/raw/drone/ --out /data/interim/catalog.parquet --workers 16',
     )
 
     t2 = BashOperator(
         task_id='compute_vegetation_indices',
-        bash_command='python3 /home/ubuntu/pasture-ai-debug/data_pipeline/compute_indices.py --tif /data/processed/latest_scene.tif --out /data/processed/indices/',
+        bash_command='python3 /home/ubuntu/pasture-ai-debug/data_pipeline/compute_indices.py --tif /data/processed/latest_scene.tif --out /data/processed/indices/ --cog --compress zstd',
     )
 
     t3 = BashOperator(
         task_id='extract_training_patches',
-        bash_command='python3 /home/ubuntu/pasture-ai-debug/data_pipeline/patch_sampler.py --tif /data/processed/indices/ndvi.tif --out /data/processed/patches/ --patch 256 --stride 128',
+        bash_command='python3 /home/ubuntu/pasture-ai-debug/data_pipeline/patch_sampler.py --tif /data/processed/indices/ndvi.tif --out /data/processed/patches/ --patch 256 --stride 128 --format shards',
     )
 
     t1 >> t2 >> t3
@@ -0,0 +1,111 @@
+"""
+Biomass map layer: run the exported UNetRegressor over an orthomosaic,
+write a float32 biomass raster (t/ha, NaN outside the mosaic footprint) and
+render it to a colour-mapped XYZ/MBTiles pyramid for the web map.
+
+Tiles use a fixed t/ha range and the 256-entry "biomass" colormap lookup
+table from tile_generator, so colours mean the same biomass on every
+paddock and flight.
+"""
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+import logging
+
+try:
+    from .cog import COG_COMPRESSIONS
+    from .scene_inference import BLEND_MODES, predict_scene
+    from .tile_generator import COLORMAPS, generate_xyz_tiles
+except ImportError:  # run as a script
+    from cog import COG_COMPRESSIONS
+    from scene_inference import BLEND_MODES, predict_scene
+    from tile_generator import COLORMAPS, generate_xyz_tiles
+
+logger = logging.getLogger(__name__)
+
+# Display range of the biomass layer in t/ha
+BIOMASS_RANGE = (0.0, 8.0)
+# Mosaic DN to reflectance, as in training (PatchDataset) and predict_patch
+REFLECTANCE_SCALE = 10000.0
+
+
+def load_biomass_model(model_path: str):
+    """Load the TorchScript export of UNetRegressor (models/export_torchscript.py) for CPU inference."""
+    import torch
+
+    if not Path(model_path).exists():
+        raise FileNotFoundError(f"Biomass model not found: {model_path}")
+    model = torch.jit.load(str(model_path), map_location="cpu")
+    model.eval()
+    return model
+
+
+def predict_biomass_raster(
+    mosaic_path: str,
+    model_path: str,
+    out_path: str,
+    window: int = 256,
+    overlap: int = 64,
+    batch_size: int = 8,
+    blend: str = "cosine",
+    bands: Optional[Sequence[int]] = None,
+    cog: bool = False,
+    compress: str = "deflate",
+) -> str:
+    """
+    Predict per-pixel biomass over the whole mosaic into a float32 GeoTIFF
+    on the mosaic's grid, using overlapping, blended windows (see
+    scene_inference.predict_scene). Pixels outside the mosaic's valid mask
+    are NaN.
+    """
+    model = load_biomass_model(model_path)
+    predict_scene(
+        model, mosaic_path, out_path, window=window, overlap=overlap, batch_size=batch_size,
+        blend=blend, bands=bands, scale=REFLECTANCE_SCALE, cog=cog, compress=compress,
+        tags={"units": "t/ha"},
+    )
+    logger.info(f"Biomass raster: {out_path}")
+    return str(out_path)
+
+
+def render_biomass_tiles(
+    biomass_path: str,
+    output: str,
+    min_zoom: int = 10,
+    max_zoom: int = 16,
+    value_range: Tuple[float, float] = BIOMASS_RANGE,
+    colormap: str = "biomass",
+    workers: int = 1,
+) -> str:
+    """Render the biomass raster as a colour-mapped tile pyramid (directory or .mbtiles); returns the TileJSON path."""
+    return generate_xyz_tiles(
+        biomass_path, output, min_zoom, max_zoom, bands=(1,), workers=workers,
+        colormap=colormap, value_range=value_range, name="pasture-biomass",
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mosaic", required=True, help="Input orthomosaic GeoTIFF (B,G,R,NIR)")
+    parser.add_argument("--model", default="runs/biomass_model_ts.pt", help="TorchScript biomass model")
+    parser.add_argument("--raster", required=True, help="Output biomass GeoTIFF (t/ha)")
+    parser.add_argument("--tiles", help="Output tiles directory or .mbtiles file")
+    parser.add_argument("--window", type=int, default=256, help="Inference window size")
+    parser.add_argument("--overlap", type=int, default=64, help="Overlap between neighbouring windows (px)")
+    parser.add_argument("--blend", default="cosine", choices=BLEND_MODES, help="Overlap blending weights")
+    parser.add_argument("--batch-size", type=int, default=8, help="Windows per forward pass")
+    parser.add_argument("--min-zoom", type=int, default=10, help="Lowest zoom level")
+    parser.add_argument("--max-zoom", type=int, default=16, help="Highest (native) zoom level")
+    parser.add_argument("--vmin", type=float, default=BIOMASS_RANGE[0], help="Biomass (t/ha) at the bottom of the colormap")
+    parser.add_argument("--vmax", type=float, default=BIOMASS_RANGE[1], help="Biomass (t/ha) at the top of the colormap")
+    parser.add_argument("--colormap", default="biomass", choices=sorted(COLORMAPS), help="Tile colormap")
+    parser.add_argument("--workers", type=int, default=1, help="Tile rendering processes")
+    parser.add_argument("--cog", action="store_true", help="Write the biomass raster as a Cloud-Optimized GeoTIFF")
+    parser.add_argument("--compress", default="deflate", choices=COG_COMPRESSIONS, help="Raster compression")
+    args = parser.parse_args()
+    predict_biomass_raster(args.mosaic, args.model, args.raster, window=args.window, overlap=args.overlap,
+                           batch_size=args.batch_size, blend=args.blend, cog=args.cog, compress=args.compress)
+    if args.tiles:
+        render_biomass_tiles(args.raster, args.tiles, args.min_zoom, args.max_zoom,
+                             value_range=(args.vmin, args.vmax), colormap=args.colormap, workers=args.workers)
@@ -0,0 +1,250 @@
+"""
+Columnar drone image catalog: a hive-partitioned Parquet dataset
+(capture_date=YYYY-MM-DD/camera_model=...) written in row groups as ingest
+batches finish, plus a reader that pushes date and bbox predicates down to
+partition pruning and row-group statistics.
+"""
+import os
+import uuid
+import logging
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN = "unknown"
+
+# Columns stored inside each Parquet file; partition columns live in the path
+CATALOG_SCHEMA = pa.schema([
+    ("image_path", pa.string()),
+    ("timestamp", pa.string()),
+    ("lat", pa.float64()),
+    ("lon", pa.float64()),
+    ("error", pa.string()),
+])
+PARTITION_SCHEMA = pa.schema([
+    ("capture_date", pa.string()),
+    ("camera_model", pa.string()),
+])
+
+DateLike = Union[str, date]
+# (min_lon, min_lat, max_lon, max_lat), same order as rasterio bounds
+BBox = Tuple[float, float, float, float]
+
+
+def is_parquet_catalog(path: str) -> bool:
+    """Anything that is not a .csv file is treated as a Parquet dataset directory."""
+    return Path(path).suffix.lower() != ".csv"
+
+
+def capture_date(timestamp) -> str:
+    """EXIF 'YYYY:MM:DD HH:MM:SS' -> 'YYYY-MM-DD', or 'unknown'."""
+    try:
+        return datetime.strptime(str(timestamp)[:10], "%Y:%m:%d").date().isoformat()
+    except ValueError:
+        return UNKNOWN
+
+
+def _partition_key(meta: Dict) -> Tuple[str, str]:
+    model = meta.get("camera_model") or UNKNOWN
+    return capture_date(meta.get("timestamp")), str(model).strip() or UNKNOWN
+
+
+class ParquetCatalogWriter:
+    """
+    Streams metadata dicts into a partitioned Parquet catalog.
+
+    One ParquetWriter is kept open per (capture_date, camera_model) partition
+    touched by this run; every `batch_size` rows the buffers are flushed as a
+    new row group, so memory stays bounded regardless of survey size. Files are
+    written under a hidden name and renamed on close, so readers never see a
+    half-written file.
+    """
+
+    def __init__(self, root: str, batch_size: int = 10000, run_id: Optional[str] = None):
+        self.root = Path(root)
+        self.batch_size = batch_size
+        self.run_id = run_id or f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        self.rows_written = 0
+        self._buffers: Dict[Tuple[str, str], List[Dict]] = {}
+        self._writers: Dict[Tuple[str, str], Tuple[pq.ParquetWriter, Path, Path]] = {}
+        self._pending = 0
+
+    def _writer(self, key: Tuple[str, str]) -> pq.ParquetWriter:
+        if key not in self._writers:
+            d, model = key
+            part_dir = (
+                self.root
+                / f"capture_date={quote(d, safe='')}"
+                / f"camera_model={quote(model, safe='')}"
+            )
+            part_dir.mkdir(parents=True, exist_ok=True)
+            final = part_dir / f"part-{self.run_id}.parquet"
+            tmp = part_dir / f".{final.name}.tmp"
+            self._writers[key] = (pq.ParquetWriter(str(tmp), CATALOG_SCHEMA), tmp, final)
+        return self._writers[key][0]
+
+    def add(self, meta: Dict) -> None:
+        self._buffers.setdefault(_partition_key(meta), []).append(meta)
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered rows as one row group per partition."""
+        for key, rows in self._buffers.items():
+            if rows:
+                self._writer(key).write_table(pa.Table.from_pylist(rows, schema=CATALOG_SCHEMA))
+                self.rows_written += len(rows)
+        self._buffers = {}
+        self._pending = 0
+
+    def close(self) -> None:
+        self.flush()
+        for writer, tmp, final in self._writers.values():
+            writer.close()
+            os.replace(tmp, final)
+        self._writers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            for writer, tmp, _ in self._writers.values():
+                writer.close()
+                tmp.unlink(missing_ok=True)
+            self._writers = {}
+
+
+def _catalog_files(root: Path) -> List[Path]:
+    return sorted(
+        f for f in root.rglob("*.parquet") if not f.name.startswith((".", "_"))
+    )
+
+
+def catalog_exists(root: str) -> bool:
+    """True when the Parquet catalog directory holds at least one data file."""
+    return Path(root).is_dir() and bool(_catalog_files(Path(root)))
+
+
+def retain_paths(root: str, keep: Iterable[str]) -> int:
+    """
+    Drop rows whose image_path is not in `keep` (changed, deleted or
+    previously failed images). Only the image_path column is scanned; a file
+    is rewritten only when it actually contains a stale row. Returns the
+    number of rows removed.
+    """
+    keep = set(keep)
+    root = Path(root)
+    if not root.exists():
+        return 0
+
+    removed = 0
+    for f in _catalog_files(root):
+        names = pq.ParquetFile(f).read(columns=["image_path"]).column(0).to_pylist()
+        mask = [n in keep for n in names]
+        if all(mask):
+            continue
+        table = pq.ParquetFile(f).read().filter(pa.array(mask))
+        removed += len(mask) - table.num_rows
+        if table.num_rows:
+            tmp = f.with_name(f".{f.name}.tmp")
+            pq.write_table(table, str(tmp))
+            os.replace(tmp, f)
+        else:
+            f.unlink()
+    return removed
+
+
+def _date_str(d: DateLike) -> str:
+    return d.isoformat() if isinstance(d, date) else str(d)
+
+
+def _filter_expression(
+    start_date: Optional[DateLike], end_date: Optional[DateLike], bbox: Optional[BBox]
+):
+    expr = None
+
+    def _and(e):
+        return e if expr is None else expr & e
+
+    if start_date is not None or end_date is not None:
+        expr = _and(ds.field("capture_date") != UNKNOWN)
+    if start_date is not None:
+        expr = _and(ds.field("capture_date") >= _date_str(start_date))
+    if end_date is not None:
+        expr = _and(ds.field("capture_date") <= _date_str(end_date))
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        expr = _and(
+            (ds.field("lon") >= min_lon) & (ds.field("lon") <= max_lon)
+            & (ds.field("lat") >= min_lat) & (ds.field("lat") <= max_lat)
+        )
+    return expr
+
+
+def _read_csv_catalog(
+    path: str,
+    start_date: Optional[DateLike],
+    end_date: Optional[DateLike],
+    bbox: Optional[BBox],
+    columns: Optional[Sequence[str]],
+) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    df["capture_date"] = df["timestamp"].map(capture_date) if "timestamp" in df else UNKNOWN
+    mask = pd.Series(True, index=df.index)
+    if start_date is not None or end_date is not None:
+        mask &= df["capture_date"] != UNKNOWN
+    if start_date is not None:
+        mask &= df["capture_date"] >= _date_str(start_date)
+    if end_date is not None:
+        mask &= df["capture_date"] <= _date_str(end_date)
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        mask &= df["lon"].between(min_lon, max_lon) & df["lat"].between(min_lat, max_lat)
+    df = df[mask]
+    return df[list(columns)] if columns else df
+
+
+def read_catalog(
+    path: str,
+    start_date: Optional[DateLike] = None,
+    end_date: Optional[DateLike] = None,
+    bbox: Optional[BBox] = None,
+    columns: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    Load catalog rows captured in [start_date, end_date] (inclusive) whose GPS
+    position falls inside bbox = (min_lon, min_lat, max_lon, max_lat).
+
+    For Parquet catalogs the date range prunes whole partitions and the bbox
+    is evaluated against row-group statistics before any rows are decoded.
+    Legacy CSV catalogs are filtered in pandas after a full read.
+    """
+    if not is_parquet_catalog(path):
+        return _read_csv_catalog(path, start_date, end_date, bbox, columns)
+
+    if not Path(path).exists() or not _catalog_files(Path(path)):
+        names = list(columns) if columns else CATALOG_SCHEMA.names + PARTITION_SCHEMA.names
+        return pd.DataFrame(columns=names)
+
+    dataset = ds.dataset(
+        str(path),
+        format="parquet",
+        partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+    )
+    table = dataset.to_table(
+        columns=list(columns) if columns else None,
+        filter=_filter_expression(start_date, end_date, bbox),
+    )
+    return table.to_pandas()
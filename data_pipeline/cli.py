@@ -3,8 +3,10 @@ import sys
 import logging
 from pathlib import Path
 from .ingest_drone import ingest_directory
-from .compute_indices import process_geotiff
-from .patch_sampler import extract_patches
+from .compute_indices import process_geotiff, parse_list, INDEX_REGISTRY, DEFAULT_INDICES, DEFAULT_BAND_ORDER
+from .patch_sampler import extract_patches, extract_patches_multi, resolve_scenes, PATCH_FORMATS
+from .cog import COG_COMPRESSIONS
+from .biomass_map import BIOMASS_RANGE, predict_biomass_raster, render_biomass_tiles
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("pasture-ai-cli")
@@ -16,28 +18,71 @@ def main():
     # Ingest command
     ingest_parser = subparsers.add_parser("ingest", help="Ingest drone images")
     ingest_parser.add_argument("--src", required=True, help="Source directory")
-    ingest_parser.add_argument("--out", default="data/catalog.csv", help="Output catalog path")
+    ingest_parser.add_argument("--out", default="data/catalog.parquet", help="Output catalog (Parquet dataset dir, or .csv)")
+    ingest_parser.add_argument("--workers", type=int, default=1, help="EXIF extraction processes")
+    ingest_parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-read every image")
 
     # Indices command
     indices_parser = subparsers.add_parser("indices", help="Compute vegetation indices")
     indices_parser.add_argument("--tif", required=True, help="Input GeoTIFF")
     indices_parser.add_argument("--out", required=True, help="Output directory")
+    indices_parser.add_argument("--indices", default=",".join(DEFAULT_INDICES),
+                                help=f"Comma-separated indices ({', '.join(INDEX_REGISTRY)})")
+    indices_parser.add_argument("--band-order", default=",".join(DEFAULT_BAND_ORDER),
+                                help="Comma-separated band names in file order")
+    indices_parser.add_argument("--multiband", action="store_true", help="Write one multi-band indices.tif")
+    indices_parser.add_argument("--workers", type=int, default=1, help="Threads computing windows in parallel")
+    indices_parser.add_argument("--cog", action="store_true", help="Write Cloud-Optimized GeoTIFFs")
+    indices_parser.add_argument("--compress", default="deflate", choices=COG_COMPRESSIONS, help="COG compression")
 
     # Patch command
     patch_parser = subparsers.add_parser("patch", help="Extract patches")
-    patch_parser.add_argument("--tif", required=True, help="Input GeoTIFF")
+    patch_parser.add_argument("--tif", help="Input GeoTIFF")
+    patch_parser.add_argument("--tifs", nargs="+", help="Glob pattern(s) of input GeoTIFFs (multi-scene mode)")
+    patch_parser.add_argument("--scene-list", help="File listing input GeoTIFFs, one per line (multi-scene mode)")
     patch_parser.add_argument("--out", required=True, help="Output directory")
     patch_parser.add_argument("--size", type=int, default=256, help="Patch size")
     patch_parser.add_argument("--stride", type=int, default=128, help="Stride")
+    patch_parser.add_argument("--format", default="shards", choices=PATCH_FORMATS,
+                              help="Patch output format (multi-scene mode writes shards only)")
+    patch_parser.add_argument("--shard-size", type=int, default=4096, help="Patches per .npy shard")
+    patch_parser.add_argument("--workers", type=int, default=1, help="Scene extraction processes (multi-scene mode)")
+
+    # Biomass map command
+    biomass_parser = subparsers.add_parser("biomass", help="Predict a biomass raster and render its map tiles")
+    biomass_parser.add_argument("--mosaic", required=True, help="Input orthomosaic GeoTIFF (B,G,R,NIR)")
+    biomass_parser.add_argument("--model", default="runs/biomass_model_ts.pt", help="TorchScript biomass model")
+    biomass_parser.add_argument("--raster", required=True, help="Output biomass GeoTIFF (t/ha)")
+    biomass_parser.add_argument("--tiles", help="Output tiles directory or .mbtiles file")
+    biomass_parser.add_argument("--overlap", type=int, default=64, help="Overlap between inference windows (px)")
+    biomass_parser.add_argument("--batch-size", type=int, default=8, help="Windows per forward pass")
+    biomass_parser.add_argument("--min-zoom", type=int, default=10, help="Lowest zoom level")
+    biomass_parser.add_argument("--max-zoom", type=int, default=16, help="Highest (native) zoom level")
+    biomass_parser.add_argument("--vmax", type=float, default=BIOMASS_RANGE[1], help="Biomass (t/ha) at the top of the colormap")
+    biomass_parser.add_argument("--workers", type=int, default=1, help="Tile rendering processes")
+    biomass_parser.add_argument("--cog", action="store_true", help="Write the biomass raster as a Cloud-Optimized GeoTIFF")
 
     args = parser.parse_args()
+    if args.command == "patch" and (args.tifs or args.scene_list) and args.format != "shards":
+        patch_parser.error(f"--format {args.format} is only supported with --tif; multi-scene mode writes shards")
 
     if args.command == "ingest":
-        ingest_directory(args.src, args.out)
+        ingest_directory(args.src, args.out, workers=args.workers, incremental=not args.full)
     elif args.command == "indices":
-        process_geotiff(args.tif, args.out)
-    elif args.command == "patch":
-        extract_patches(args.tif, args.out, args.size, args.stride)
+        process_geotiff(args.tif, args.out, indices=parse_list(args.indices),
+                        band_order=parse_list(args.band_order), multiband=args.multiband,
+                        workers=args.workers, cog=args.cog, compress=args.compress)
+    elif args.command == "patch" and (args.tifs or args.scene_list):
+        extract_patches_multi(resolve_scenes(args.tifs, args.scene_list), args.out, args.size, args.stride,
+                              workers=args.workers, shard_size=args.shard_size)
+    elif args.command == "patch" and args.tif:
+        extract_patches(args.tif, args.out, args.size, args.stride, fmt=args.format, shard_size=args.shard_size)
+    elif args.command == "biomass":
+        predict_biomass_raster(args.mosaic, args.model, args.raster, overlap=args.overlap,
+                               batch_size=args.batch_size, cog=args.cog)
+        if args.tiles:
+            render_biomass_tiles(args.raster, args.tiles, args.min_zoom, args.max_zoom,
+                                 value_range=(BIOMASS_RANGE[0], args.vmax), workers=args.workers)
     else:
         parser.print_help()
         sys.exit(1)
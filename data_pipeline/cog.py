@@ -0,0 +1,76 @@
+"""
+Cloud-Optimized GeoTIFF output: internally tiled, compressed rasters with
+a predictor and an overview pyramid, so tile servers and web maps can fetch
+a few KB per request with HTTP range reads instead of whole strips.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+import logging
+
+import rasterio
+from rasterio.shutil import copy as rio_copy
+
+logger = logging.getLogger(__name__)
+
+COG_COMPRESSIONS = ("deflate", "zstd", "lzw")
+
+
+def tiled_profile(profile: dict, blocksize: int = 512) -> dict:
+    """Uncompressed, internally tiled GTiff profile used as the COG build intermediate."""
+    out = dict(profile)
+    for key in ("compress", "predictor", "photometric", "interleave"):
+        out.pop(key, None)
+    out.update(
+        driver="GTiff",
+        tiled=True,
+        blockxsize=blocksize,
+        blockysize=blocksize,
+        BIGTIFF="IF_SAFER",
+    )
+    return out
+
+
+def to_cog(
+    src_path: str,
+    dst_path: str,
+    compress: str = "deflate",
+    blocksize: int = 512,
+    resampling: str = "average",
+) -> str:
+    """
+    Rewrite a raster as a COG with GDAL's COG driver: tiles of `blocksize`,
+    DEFLATE/ZSTD/LZW compression with the matching predictor (horizontal
+    differencing for integers, floating-point for floats) and overviews down
+    to a single tile, laid out ahead of the full-resolution data.
+    """
+    if compress.lower() not in COG_COMPRESSIONS:
+        raise ValueError(f"Unsupported COG compression {compress!r}; use one of {COG_COMPRESSIONS}")
+    rio_copy(
+        str(src_path),
+        str(dst_path),
+        driver="COG",
+        compress=compress.upper(),
+        predictor="YES",
+        blocksize=blocksize,
+        overview_resampling=resampling.upper(),
+        bigtiff="IF_SAFER",
+    )
+    return str(dst_path)
+
+
+@contextmanager
+def open_cog_writer(path, profile: dict, compress: str = "deflate", blocksize: int = 512):
+    """
+    Context manager with the same write API as rasterio.open(path, 'w', ...)
+    that produces a COG at `path` on successful exit. Data is written to a
+    hidden tiled intermediate next to the output, converted, then removed.
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.stem}.build.tif")
+    try:
+        with rasterio.open(tmp, "w", **tiled_profile(profile, blocksize)) as dst:
+            yield dst
+        to_cog(tmp, path, compress=compress, blocksize=blocksize)
+        logger.info(f"Wrote COG {path} ({compress})")
+    finally:
+        tmp.unlink(missing_ok=True)
@@ -1,8 +1,17 @@
 import numpy as np
 import rasterio
+import threading
+from rasterio.windows import Window
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from contextlib import ExitStack
 from pathlib import Path
 import logging
 
+try:
+    from .cog import open_cog_writer, COG_COMPRESSIONS
+except ImportError:  # run as a script
+    from cog import open_cog_writer, COG_COMPRESSIONS
+
 logger = logging.getLogger(__name__)
 
 def calculate_ndvi(red, nir):
@@ -25,37 +34,175 @@ def calculate_gndvi(green, nir):
     denom = nir + green + 1e-8
     return (nir - green) / denom
 
-def process_geotiff(tif_path: str, out_dir: str):
-    """Compute indices from a multispectral GeoTIFF."""
+def calculate_savi(red, nir, L=0.5):
+    """Compute Soil Adjusted Vegetation Index."""
+    denom = nir + red + L + 1e-8
+    return (1.0 + L) * (nir - red) / denom
+
+def calculate_ndre(rededge, nir):
+    """Compute Normalized Difference Red Edge index."""
+    denom = nir + rededge + 1e-8
+    return (nir - rededge) / denom
+
+# name -> (function, band names passed positionally)
+INDEX_REGISTRY = {
+    "ndvi": (calculate_ndvi, ("red", "nir")),
+    "gndvi": (calculate_gndvi, ("green", "nir")),
+    "evi": (calculate_evi, ("blue", "red", "nir")),
+    "savi": (calculate_savi, ("red", "nir")),
+    "ndre": (calculate_ndre, ("rededge", "nir")),
+}
+DEFAULT_INDICES = ("ndvi", "gndvi", "evi")
+# Standard 4-band multispectral order; 5-band sensors add "rededge"
+DEFAULT_BAND_ORDER = ("blue", "green", "red", "nir")
+
+def parse_list(value: str):
+    """Parse a comma-separated CLI value into a tuple of lower-case names."""
+    return tuple(v.strip().lower() for v in value.split(",") if v.strip())
+
+def iter_windows(src, max_pixels: int = 1 << 20):
+    """
+    Yield read windows that follow the raster's internal block layout.
+
+    Tiled rasters are walked block by block. Striped rasters (full-width
+    blocks a few rows tall) have their strips merged into bands of roughly
+    max_pixels so per-window overhead doesn't dominate; either way peak
+    memory is bounded by the window, not the scene.
+    """
+    block_h, block_w = src.block_shapes[0]
+    if block_w >= src.width and block_h * src.width < max_pixels:
+        rows = max(block_h, (max_pixels // src.width) // block_h * block_h)
+        for row in range(0, src.height, rows):
+            yield Window(0, row, src.width, min(rows, src.height - row))
+    else:
+        for _, window in src.block_windows(1):
+            yield window
+
+def _compute_window(src, window, needed, read_idx, indices):
+    """Read the needed bands for one window and return {index name: float32 array}."""
+    bands = dict(zip(needed, src.read(read_idx, window=window, out_dtype="float32")))
+    results = {}
+    for name in indices:
+        func, args = INDEX_REGISTRY[name]
+        results[name] = func(*(bands[b] for b in args)).astype(np.float32, copy=False)
+    return results
+
+def _compute_windows_threaded(tif_path, windows, needed, read_idx, indices, workers):
+    """
+    Yield (window, results) computed on a thread pool.
+
+    Each thread reads through its own dataset handle (GDAL handles are not
+    safe to share across threads); GDAL releases the GIL while decoding and
+    NumPy does for the element-wise arithmetic, so windows overlap on
+    multiple cores. At most 2 * workers windows are in flight at once.
+    """
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def work(window):
+        if not hasattr(local, "src"):
+            local.src = rasterio.open(tif_path)
+            with handles_lock:
+                handles.append(local.src)
+        return window, _compute_window(local.src, window, needed, read_idx, indices)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for window in windows:
+                pending.add(pool.submit(work, window))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        yield fut.result()
+            for fut in as_completed(pending):
+                yield fut.result()
+    finally:
+        for handle in handles:
+            handle.close()
+
+def process_geotiff(
+    tif_path: str,
+    out_dir: str,
+    indices=DEFAULT_INDICES,
+    band_order=DEFAULT_BAND_ORDER,
+    multiband: bool = False,
+    workers: int = 1,
+    cog: bool = False,
+    compress: str = "deflate",
+):
+    """
+    Compute indices from a multispectral GeoTIFF.
+
+    Only the bands needed by the selected indices are read, once per window,
+    as float32, and every index window is written straight to its output, so
+    a full-scene copy of the mosaic is never materialised. Outputs are either
+    one `<index>.tif` per index or a single `indices.tif` with one band per
+    index (band descriptions carry the index names).
+
+    With workers > 1 windows are computed on a thread pool while all writes
+    stay on the calling thread, which is the only one touching the outputs.
+
+    With cog=True outputs are Cloud-Optimized GeoTIFFs (512px tiles,
+    `compress` + predictor, average-resampled overviews).
+    """
     if not Path(tif_path).exists():
         logger.error(f"Input file {tif_path} does not exist.")
         return
 
+    unknown = [name for name in indices if name not in INDEX_REGISTRY]
+    if unknown:
+        raise ValueError(f"Unknown indices {unknown}; available: {sorted(INDEX_REGISTRY)}")
+    band_pos = {band: i + 1 for i, band in enumerate(band_order)}
+    needed = {b for name in indices for b in INDEX_REGISTRY[name][1]}
+    missing = sorted(needed - set(band_pos))
+    if missing:
+        raise ValueError(f"Indices {list(indices)} need bands {missing} not in band order {list(band_order)}")
+    needed = sorted(needed, key=band_pos.get)
+
     try:
         with rasterio.open(tif_path) as src:
-            # Assuming standard band order: 1:Blue, 2:Green, 3:Red, 4:NIR
-            blue = src.read(1).astype(float)
-            green = src.read(2).astype(float)
-            red = src.read(3).astype(float)
-            nir = src.read(4).astype(float)
-            
             profile = src.profile
-            profile.update(dtype=rasterio.float32, count=1)
-            
+            profile.update(dtype=rasterio.float32, count=len(indices) if multiband else 1)
+
             out_path = Path(out_dir)
             out_path.mkdir(parents=True, exist_ok=True)
-            
-            # NDVI
-            ndvi = calculate_ndvi(red, nir)
-            with rasterio.open(out_path / "ndvi.tif", 'w', **profile) as dst:
-                dst.write(ndvi.astype(rasterio.float32), 1)
-                
-            # GNDVI
-            gndvi = calculate_gndvi(green, nir)
-            with rasterio.open(out_path / "gndvi.tif", 'w', **profile) as dst:
-                dst.write(gndvi.astype(rasterio.float32), 1)
-                
-            logger.info(f"Computed indices for {tif_path}")
+
+            def open_output(path):
+                if cog:
+                    return open_cog_writer(path, profile, compress=compress)
+                return rasterio.open(path, 'w', **profile)
+
+            with ExitStack() as stack:
+                # index name -> (dataset, band)
+                targets = {}
+                if multiband:
+                    dst = stack.enter_context(open_output(out_path / "indices.tif"))
+                    for band, name in enumerate(indices, start=1):
+                        dst.set_band_description(band, name)
+                        targets[name] = (dst, band)
+                else:
+                    for name in indices:
+                        dst = stack.enter_context(open_output(out_path / f"{name}.tif"))
+                        targets[name] = (dst, 1)
+
+                read_idx = [band_pos[b] for b in needed]
+                if workers > 1:
+                    computed = _compute_windows_threaded(
+                        tif_path, iter_windows(src), needed, read_idx, indices, workers
+                    )
+                else:
+                    computed = (
+                        (window, _compute_window(src, window, needed, read_idx, indices))
+                        for window in iter_windows(src)
+                    )
+                for window, results in computed:
+                    for name, result in results.items():
+                        dst, band = targets[name]
+                        dst.write(result, band, window=window)
+
+            logger.info(f"Computed {', '.join(indices)} for {tif_path}")
     except Exception as e:
         logger.error(f"Failed to process {tif_path}: {e}")
 
@@ -64,5 +211,15 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--tif", required=True, help="Input multispectral GeoTIFF")
     parser.add_argument("--out", required=True, help="Output directory for index TIFs")
+    parser.add_argument("--indices", default=",".join(DEFAULT_INDICES),
+                        help=f"Comma-separated indices ({', '.join(INDEX_REGISTRY)})")
+    parser.add_argument("--band-order", default=",".join(DEFAULT_BAND_ORDER),
+                        help="Comma-separated band names in file order")
+    parser.add_argument("--multiband", action="store_true", help="Write one multi-band indices.tif")
+    parser.add_argument("--workers", type=int, default=1, help="Threads computing windows in parallel")
+    parser.add_argument("--cog", action="store_true", help="Write Cloud-Optimized GeoTIFFs")
+    parser.add_argument("--compress", default="deflate", choices=COG_COMPRESSIONS, help="COG compression")
     args = parser.parse_args()
-    process_geotiff(args.tif, args.out)
+    process_geotiff(args.tif, args.out, indices=parse_list(args.indices),
+                    band_order=parse_list(args.band_order), multiband=args.multiband,
+                    workers=args.workers, cog=args.cog, compress=args.compress)
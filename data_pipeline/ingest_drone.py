@@ -1,12 +1,17 @@
 import os
+import json
 import exifread
 import pandas as pd
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import logging
-from typing import List, Dict
+from typing import List, Dict, Iterator, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Extensions (lower-case) recognised as drone captures during the directory walk
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".tif", ".tiff", ".dng"}
+
 def _dms_to_dd(dms, ref):
     """Convert Degrees Minutes Seconds to Decimal Degrees."""
     d = float(dms[0].num) / float(dms[0].den)
@@ -22,7 +27,7 @@ def extract_metadata(img_path: Path) -> Dict:
     try:
         with open(img_path, 'rb') as f:
             tags = exifread.process_file(f, details=False)
-            
+
         metadata = {
             "image_path": str(img_path),
             "timestamp": str(tags.get('EXIF DateTimeOriginal', 'unknown')),
@@ -30,38 +35,187 @@ def extract_metadata(img_path: Path) -> Dict:
             "lat": None,
             "lon": None
         }
-        
+
         if 'GPS GPSLatitude' in tags and 'GPS GPSLatitudeRef' in tags:
             metadata['lat'] = _dms_to_dd(tags['GPS GPSLatitude'].values, tags['GPS GPSLatitudeRef'].values)
         if 'GPS GPSLongitude' in tags and 'GPS GPSLongitudeRef' in tags:
             metadata['lon'] = _dms_to_dd(tags['GPS GPSLongitude'].values, tags['GPS GPSLongitudeRef'].values)
-            
+
         return metadata
     except Exception as e:
         logger.error(f"Error extracting metadata from {img_path}: {e}")
         return {"image_path": str(img_path), "error": str(e)}
 
-def ingest_directory(src_dir: str, output_catalog: str):
-    """Scan directory for drone images and create a metadata catalog."""
-    src_path = Path(src_dir)
-    images = list(src_path.rglob('*.jpg')) + list(src_path.rglob('*.JPG'))
-    
-    catalog = []
-    for img in images:
-        meta = extract_metadata(img)
-        catalog.append(meta)
-        
-    df = pd.DataFrame(catalog)
-    df.to_csv(output_catalog, index=False)
-    logger.info(f"Ingested {len(catalog)} images into {output_catalog}")
-    return df
+def scan_images(src_dir: str) -> Iterator[Tuple[str, int, int]]:
+    """
+    Walk src_dir once with os.scandir, yielding (path, mtime_ns, size) for
+    every file whose extension is in IMAGE_EXTENSIONS (case-insensitive).
+    """
+    stack = [str(src_dir)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                        st = entry.stat()
+                        yield entry.path, st.st_mtime_ns, st.st_size
+        except OSError as e:
+            logger.error(f"Cannot scan {current}: {e}")
+
+def manifest_path_for(output_catalog: str) -> Path:
+    """Manifest of already-ingested files, stored next to the catalog."""
+    return Path(f"{output_catalog}.manifest.json")
+
+def load_manifest(path: Path) -> Dict[str, List[int]]:
+    """Load the {image_path: [mtime_ns, size]} manifest; empty if missing or unreadable."""
+    if not path.exists():
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+def save_manifest(path: Path, files: Dict[str, List[int]]) -> None:
+    """Atomically persist the ingest manifest."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump({"version": 1, "files": files}, f)
+    os.replace(tmp, path)
+
+def _chunks(items: List, size: int) -> Iterator[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def extract_many(paths: List[str], workers: int = 1, chunk_size: int = 512) -> Iterator[Dict]:
+    """
+    Run extract_metadata over paths, fanning out to a process pool when
+    workers > 1. Paths are submitted in bounded chunks so the number of
+    in-flight results stays proportional to chunk_size, not the survey size.
+    """
+    if workers <= 1:
+        for p in paths:
+            yield extract_metadata(Path(p))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        per_task = max(1, chunk_size // (workers * 4))
+        for chunk in _chunks(paths, chunk_size):
+            yield from pool.map(extract_metadata, [Path(p) for p in chunk], chunksize=per_task)
+
+def _parquet_catalog():
+    """Import the Parquet catalog lazily so CSV-only installs don't need pyarrow."""
+    try:
+        from . import catalog
+    except ImportError:
+        import catalog
+    return catalog
+
+def _spatial_index():
+    """Import the spatial index lazily; it reads catalogs through catalog.py."""
+    try:
+        from . import spatial_index
+    except ImportError:
+        import spatial_index
+    return spatial_index
+
+def ingest_directory(
+    src_dir: str,
+    output_catalog: str,
+    workers: int = 1,
+    incremental: bool = True,
+    chunk_size: int = 512,
+    batch_size: int = 10000,
+    spatial_index: bool = True,
+):
+    """
+    Scan directory for drone images and create a metadata catalog.
+
+    With incremental=True a (path, mtime, size) manifest is kept next to the
+    catalog, and only new or changed files are re-read; rows for unchanged
+    files are kept and all other rows are dropped.
+
+    A `.csv` output is rewritten in full. Any other output path is a
+    partitioned Parquet dataset (see catalog.py) that is appended to in row
+    groups of `batch_size`, so extraction memory stays bounded. Either way
+    the resulting catalog is returned as a DataFrame.
+
+    With spatial_index=True the grid index used for bbox / nearest-capture
+    queries (see spatial_index.py) is rebuilt next to the catalog.
+    """
+    manifest_path = manifest_path_for(output_catalog)
+    previous = load_manifest(manifest_path) if incremental else {}
+    is_csv = Path(output_catalog).suffix.lower() == ".csv"
+
+    # The manifest only describes rows the catalog still holds: with the
+    # catalog gone (or unreadable) every file has to be read again
+    existing = None
+    if previous and is_csv:
+        try:
+            existing = pd.read_csv(output_catalog)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Catalog {output_catalog} missing or unreadable ({e}); re-reading every image")
+            previous = {}
+    elif previous and not _parquet_catalog().catalog_exists(output_catalog):
+        logger.warning(f"Catalog {output_catalog} is missing; re-reading every image")
+        previous = {}
+
+    current = {path: [mtime, size] for path, mtime, size in scan_images(src_dir)}
+    todo = sorted(p for p, sig in current.items() if previous.get(p) != sig)
+    unchanged = set(current) - set(todo)
+
+    results = extract_many(todo, workers=workers, chunk_size=chunk_size)
+    failed = set()
+
+    if not is_csv:
+        catalog = _parquet_catalog()
+        catalog.retain_paths(output_catalog, unchanged)
+        with catalog.ParquetCatalogWriter(output_catalog, batch_size=batch_size) as writer:
+            for meta in results:
+                if "error" in meta:
+                    failed.add(meta["image_path"])
+                writer.add(meta)
+        n_new = writer.rows_written
+        result = catalog.read_catalog(output_catalog)
+    else:
+        if existing is not None:
+            existing = existing[existing["image_path"].isin(unchanged)]
+
+        rows = list(results)
+        failed = {m["image_path"] for m in rows if "error" in m}
+        n_new = len(rows)
+        result = pd.DataFrame(rows)
+        if existing is not None:
+            result = pd.concat([existing, result], ignore_index=True)
+        result.to_csv(output_catalog, index=False)
+
+    # Failed reads stay out of the manifest so they are retried next run
+    if incremental:
+        save_manifest(manifest_path, {p: sig for p, sig in current.items() if p not in failed})
+
+    if spatial_index:
+        if len(result):
+            _spatial_index().build_index(output_catalog)
+        else:
+            # Nothing to index (an empty CSV catalog is not even readable back)
+            _spatial_index().index_path_for(output_catalog).unlink(missing_ok=True)
+
+    logger.info(f"Ingested {n_new} new/changed images into {output_catalog}")
+    return result
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--src", required=True, help="Source directory of drone images")
-    parser.add_argument("--out", default="data/catalog.csv", help="Output catalog CSV path")
+    parser.add_argument("--out", default="data/catalog.parquet", help="Output catalog (Parquet dataset dir, or .csv)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="EXIF extraction processes")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-read every image")
     args = parser.parse_args()
-    
+
     os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    ingest_directory(args.src, args.out)
+    ingest_directory(args.src, args.out, workers=args.workers, incremental=not args.full)
@@ -32,10 +32,13 @@ def run_odm_ortho(
 def run_placeholder_ortho(
     input_images_dir: str,
     output_tif: str,
+    cog: bool = False,
+    compress: str = "deflate",
 ) -> str:
     """
     Placeholder for dev/demo: create empty GeoTIFF.
     Replace with real ODM/Pix4D/Metashape in production.
+    With cog=True the mosaic is written as a Cloud-Optimized GeoTIFF.
     """
     try:
         import numpy as np
@@ -51,9 +54,7 @@ def run_placeholder_ortho(
         arr[2] = 0.15
         arr[3] = 0.25  # NIR
 
-        with rasterio.open(
-            output_tif,
-            "w",
+        profile = dict(
             driver="GTiff",
             height=1024,
             width=1024,
@@ -61,7 +62,16 @@ def run_placeholder_ortho(
             dtype=arr.dtype,
             crs=CRS.from_epsg(4326),
             transform=transform,
-        ) as dst:
+        )
+        if cog:
+            try:
+                from .cog import open_cog_writer
+            except ImportError:  # run as a script
+                from cog import open_cog_writer
+            writer = open_cog_writer(output_tif, profile, compress=compress)
+        else:
+            writer = rasterio.open(output_tif, "w", **profile)
+        with writer as dst:
             dst.write(arr)
         logger.info(f"Created placeholder ortho: {output_tif}")
         return output_tif
@@ -75,5 +85,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", required=True, help="Input images directory")
     parser.add_argument("--output", required=True, help="Output GeoTIFF path")
+    parser.add_argument("--cog", action="store_true", help="Write a Cloud-Optimized GeoTIFF")
+    parser.add_argument("--compress", default="deflate", help="COG compression (deflate, zstd, lzw)")
     args = parser.parse_args()
-    run_placeholder_ortho(args.input, args.output)
+    run_placeholder_ortho(args.input, args.output, cog=args.cog, compress=args.compress)
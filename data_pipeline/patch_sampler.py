@@ -1,40 +1,205 @@
+import glob
+import hashlib
 import numpy as np
+import pandas as pd
 import rasterio
+from rasterio.windows import Window
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Iterable, List, Optional
 import logging
 
+try:
+    from .patch_store import INDEX_COLUMNS, PatchShardWriter, write_index_file
+except ImportError:  # run as a script
+    from patch_store import INDEX_COLUMNS, PatchShardWriter, write_index_file
+
 logger = logging.getLogger(__name__)
 
-def extract_patches(tif_path: str, out_dir: str, patch_size: int = 256, stride: int = 128):
-    """Extract sliding-window patches from a GeoTIFF."""
+PATCH_FORMATS = ("shards", "npz")
+
+def iter_strips(src, patch_size: int, stride: int):
+    """
+    Yield (y, strip) for every patch row, where strip is the C x patch_size x W
+    band data starting at row y. Rows shared with the previous strip (when
+    stride < patch_size) are reused rather than re-read, so each source row is
+    decoded once and memory is bounded to one strip.
+    """
+    h, w = src.height, src.width
+    strip, prev_y = None, None
+    for y in range(0, h - patch_size + 1, stride):
+        overlap = 0 if prev_y is None else max(0, prev_y + patch_size - y)
+        new = src.read(window=Window(0, y + overlap, w, patch_size - overlap))
+        strip = np.concatenate([strip[:, -overlap:], new], axis=1) if overlap else new
+        prev_y = y
+        yield y, strip
+
+def window_sums(strip: np.ndarray):
+    """
+    Summed-area table over the strip's columns for the two emptiness tests.
+
+    Returns prefix sums (length W + 1) of per-column counts of non-zero and of
+    non-NaN values across all bands; the counts for the window starting at x
+    are prefix[x + patch_size] - prefix[x], an O(1) lookup per window.
+    """
+    nonzero = (strip != 0).sum(axis=(0, 1), dtype=np.int64)
+    notnan = (~np.isnan(strip)).sum(axis=(0, 1), dtype=np.int64)
+    return (
+        np.concatenate([[0], np.cumsum(nonzero)]),
+        np.concatenate([[0], np.cumsum(notnan)]),
+    )
+
+def iter_patches(src, patch_size: int, stride: int):
+    """Yield (y, x, patch) for every non-empty window, in row-strip order."""
+    w = src.width
+    for y, strip in iter_strips(src, patch_size, stride):
+        nonzero, notnan = window_sums(strip)
+        for x in range(0, w - patch_size + 1, stride):
+            # Filter out empty patches (e.g., all zeros or NaNs)
+            if nonzero[x + patch_size] == nonzero[x] or notnan[x + patch_size] == notnan[x]:
+                continue
+            yield y, x, strip[:, :, x:x+patch_size]
+
+def extract_patches(
+    tif_path: str,
+    out_dir: str,
+    patch_size: int = 256,
+    stride: int = 128,
+    fmt: str = "shards",
+    shard_size: int = 4096,
+):
+    """
+    Extract sliding-window patches from a GeoTIFF.
+
+    The raster is read in row-strip order and empty windows (all zeros or all
+    NaN) are rejected from the strip's summed-area table before any patch is
+    sliced, instead of scanning every pixel of every overlapping window.
+
+    fmt="shards" appends patches to memory-mappable .npy shards with an
+    index.csv (see patch_store.py); fmt="npz" writes the legacy one
+    compressed file per patch.
+    """
+    if fmt not in PATCH_FORMATS:
+        raise ValueError(f"Unknown patch format {fmt!r}; use one of {PATCH_FORMATS}")
     out_path = Path(out_dir)
     out_path.mkdir(parents=True, exist_ok=True)
-    
+
     with rasterio.open(tif_path) as src:
-        data = src.read()
-        c, h, w = data.shape
-        
         count = 0
-        for y in range(0, h - patch_size + 1, stride):
-            for x in range(0, w - patch_size + 1, stride):
-                patch = data[:, y:y+patch_size, x:x+patch_size]
-                
-                # Filter out empty patches (e.g., all zeros or NaNs)
-                if np.all(patch == 0) or np.all(np.isnan(patch)):
-                    continue
-                
+        if fmt == "shards":
+            with PatchShardWriter(out_path, shard_size=shard_size) as writer:
+                for y, x, patch in iter_patches(src, patch_size, stride):
+                    writer.add(patch, y, x, tif_path)
+                    count += 1
+        else:
+            for y, x, patch in iter_patches(src, patch_size, stride):
                 patch_name = f"patch_{y}_{x}.npz"
                 np.savez_compressed(out_path / patch_name, patch=patch)
                 count += 1
-                
+
         logger.info(f"Extracted {count} patches from {tif_path}")
+        return count
+
+# Per-scene indices of completed scenes; their presence is the resume checkpoint
+PARTS_DIR = "_parts"
+
+def scene_prefix(tif_path: str) -> str:
+    """Deterministic shard prefix for a scene: file stem plus a hash of its absolute path."""
+    digest = hashlib.sha1(str(Path(tif_path).resolve()).encode()).hexdigest()[:8]
+    return f"{Path(tif_path).stem}-{digest}"
+
+def resolve_scenes(patterns: Optional[Iterable[str]] = None, scene_list: Optional[str] = None) -> List[str]:
+    """
+    Collect scene GeoTIFFs from glob patterns and/or a scene list file (one
+    path per line, '#' comments allowed), de-duplicated and sorted so the
+    scene order never depends on filesystem listing order.
+    """
+    scenes = set()
+    for pattern in patterns or []:
+        scenes.update(glob.glob(pattern, recursive=True))
+    if scene_list:
+        with open(scene_list) as f:
+            scenes.update(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    return sorted(scenes)
+
+def _extract_scene(job):
+    """Process-pool task: shard one scene and write its part index (the checkpoint)."""
+    tif_path, out_dir, patch_size, stride, shard_size = job
+    out_path = Path(out_dir)
+    writer = PatchShardWriter(out_path, shard_size=shard_size, prefix=scene_prefix(tif_path))
+    with rasterio.open(tif_path) as src:
+        for y, x, patch in iter_patches(src, patch_size, stride):
+            writer.add(patch, y, x, tif_path)
+    # The part index only lands once every shard of the scene is complete
+    index = writer.close(write_index=False)
+    part = out_path / PARTS_DIR / f"{scene_prefix(tif_path)}.csv"
+    tmp = part.with_name(f".{part.name}.tmp")
+    index.to_csv(tmp, index=False)
+    tmp.replace(part)
+    return tif_path, len(index)
+
+def extract_patches_multi(
+    tif_paths: Iterable[str],
+    out_dir: str,
+    patch_size: int = 256,
+    stride: int = 128,
+    workers: int = 1,
+    shard_size: int = 4096,
+) -> int:
+    """
+    Extract patches from many scenes into one sharded store.
+
+    Scenes are distributed over a process pool; each scene is written by a
+    single worker to its own `<stem>-<hash>-NNNNN.npy` shards, so output
+    names and contents do not depend on scheduling. A scene whose part
+    index exists under `_parts/` is complete and is skipped on rerun, which
+    makes a crashed run resumable. The consolidated index.csv is assembled
+    from the parts in sorted scene order at the end.
+    """
+    scenes = sorted(set(tif_paths))
+    out_path = Path(out_dir)
+    (out_path / PARTS_DIR).mkdir(parents=True, exist_ok=True)
+
+    todo = [p for p in scenes if not (out_path / PARTS_DIR / f"{scene_prefix(p)}.csv").exists()]
+    if len(todo) < len(scenes):
+        logger.info(f"Resuming: {len(scenes) - len(todo)} of {len(scenes)} scenes already done")
+
+    jobs = [(p, str(out_path), patch_size, stride, shard_size) for p in todo]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for tif_path, n in pool.map(_extract_scene, jobs):
+                logger.info(f"Extracted {n} patches from {tif_path}")
+    else:
+        for job in jobs:
+            tif_path, n = _extract_scene(job)
+            logger.info(f"Extracted {n} patches from {tif_path}")
+
+    parts = [pd.read_csv(out_path / PARTS_DIR / f"{scene_prefix(p)}.csv") for p in scenes]
+    index = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=INDEX_COLUMNS)
+    write_index_file(out_path, index)
+    logger.info(f"Indexed {len(index)} patches from {len(scenes)} scenes in {out_path}")
+    return len(index)
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument("--tif", required=True, help="Input GeoTIFF")
+    parser.add_argument("--tif", help="Input GeoTIFF")
+    parser.add_argument("--tifs", nargs="+", help="Glob pattern(s) of input GeoTIFFs (multi-scene mode)")
+    parser.add_argument("--scene-list", help="File listing input GeoTIFFs, one per line (multi-scene mode)")
     parser.add_argument("--out", required=True, help="Output directory for patches")
     parser.add_argument("--patch", type=int, default=256, help="Patch size")
     parser.add_argument("--stride", type=int, default=128, help="Stride size")
+    parser.add_argument("--format", default="shards", choices=PATCH_FORMATS,
+                        help="Patch output format (multi-scene mode writes shards only)")
+    parser.add_argument("--shard-size", type=int, default=4096, help="Patches per .npy shard")
+    parser.add_argument("--workers", type=int, default=1, help="Scene extraction processes (multi-scene mode)")
     args = parser.parse_args()
-    extract_patches(args.tif, args.out, args.patch, args.stride)
+    if (args.tifs or args.scene_list) and args.format != "shards":
+        parser.error(f"--format {args.format} is only supported with --tif; multi-scene mode writes shards")
+    if args.tifs or args.scene_list:
+        extract_patches_multi(resolve_scenes(args.tifs, args.scene_list), args.out, args.patch, args.stride,
+                              workers=args.workers, shard_size=args.shard_size)
+    elif args.tif:
+        extract_patches(args.tif, args.out, args.patch, args.stride, fmt=args.format, shard_size=args.shard_size)
+    else:
+        parser.error("one of --tif, --tifs or --scene-list is required")
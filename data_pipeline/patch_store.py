@@ -0,0 +1,135 @@
+"""
+Sharded patch store: fixed-shape patches are appended to large uncompressed
+`.npy` shards, with one index of (shard, offset, y, x, source) per store.
+Shards are memory-mappable, so readers slice patches zero-copy instead of
+opening and inflating one `.npz` file per patch.
+"""
+import os
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.csv"
+INDEX_COLUMNS = ["shard", "offset", "y", "x", "source"]
+
+
+class PatchShardWriter:
+    """
+    Appends patches into `<prefix>-NNNNN.npy` shards of `shard_size` patches.
+
+    Each shard is preallocated as a memory-mapped .npy and filled in place;
+    the final, partially filled shard is trimmed to its real length on close.
+    """
+
+    def __init__(self, out_dir: str, shard_size: int = 4096, prefix: str = "shard"):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_size = shard_size
+        self.prefix = prefix
+        self.records: List[Tuple[str, int, int, int, str]] = []
+        self._shard: Optional[np.memmap] = None
+        self._shard_name: Optional[str] = None
+        self._fill = 0
+        self._n_shards = 0
+
+    def _open_shard(self, patch: np.ndarray) -> None:
+        self._shard_name = f"{self.prefix}-{self._n_shards:05d}.npy"
+        self._shard = np.lib.format.open_memmap(
+            self.out_dir / self._shard_name,
+            mode="w+",
+            dtype=patch.dtype,
+            shape=(self.shard_size,) + patch.shape,
+        )
+        self._n_shards += 1
+        self._fill = 0
+
+    def _close_shard(self) -> None:
+        if self._shard is None:
+            return
+        self._shard.flush()
+        if self._fill < self.shard_size:
+            path = self.out_dir / self._shard_name
+            tmp = path.with_name(f".{path.name}.tmp")
+            with open(tmp, "wb") as f:
+                np.lib.format.write_array(f, np.asarray(self._shard[:self._fill]))
+            del self._shard
+            os.replace(tmp, path)
+        self._shard = None
+
+    def add(self, patch: np.ndarray, y: int, x: int, source: str) -> None:
+        if self._shard is None:
+            self._open_shard(patch)
+        elif patch.shape != self._shard.shape[1:] or patch.dtype != self._shard.dtype:
+            raise ValueError(
+                f"Patch {patch.shape}/{patch.dtype} does not match store "
+                f"{self._shard.shape[1:]}/{self._shard.dtype}"
+            )
+        self._shard[self._fill] = patch
+        self.records.append((self._shard_name, self._fill, int(y), int(x), str(source)))
+        self._fill += 1
+        if self._fill == self.shard_size:
+            self._close_shard()
+
+    def close(self, write_index: bool = True) -> pd.DataFrame:
+        """Finish the last shard and (optionally) write this writer's index."""
+        self._close_shard()
+        index = pd.DataFrame(self.records, columns=INDEX_COLUMNS)
+        if write_index:
+            write_index_file(self.out_dir, index)
+        return index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(write_index=exc_type is None)
+
+
+def write_index_file(store_dir: str, index: pd.DataFrame) -> Path:
+    path = Path(store_dir) / INDEX_NAME
+    tmp = path.with_name(f".{path.name}.tmp")
+    index.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+class PatchStore:
+    """
+    Read side of a sharded patch store. Shards are memory-mapped lazily on
+    first access in each process, so an instance can be handed to DataLoader
+    workers before any file is opened.
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = Path(store_dir)
+        self.index = pd.read_csv(self.store_dir / INDEX_NAME)
+        self._shards: Dict[str, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def shard(self, name: str) -> np.ndarray:
+        mm = self._shards.get(name)
+        if mm is None:
+            mm = np.load(self.store_dir / name, mmap_mode="r")
+            self._shards[name] = mm
+        return mm
+
+    def get(self, shard: str, offset: int) -> np.ndarray:
+        """Zero-copy (read-only memmap) view of one patch."""
+        return self.shard(shard)[offset]
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        row = self.index.iloc[i]
+        return self.get(row["shard"], int(row["offset"]))
+
+    def __getstate__(self):
+        # Open memmaps are not carried across pickling (e.g. to spawned workers)
+        state = dict(self.__dict__)
+        state["_shards"] = {}
+        return state
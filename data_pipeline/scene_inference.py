@@ -0,0 +1,185 @@
+"""
+Scene-level inference: run a per-pixel regressor (UNetRegressor) over a
+whole GeoTIFF in overlapping windows and stream the blended prediction into
+a georeferenced raster.
+
+Windows are taken row by row; each window row is read as one strip (on a
+prefetch thread, so decoding overlaps the forward passes), cut into
+windows, and batched batch_size at a time through the model. Predictions
+are accumulated with a smooth weight map that falls off towards window
+edges, where a fully convolutional model is least reliable, and divided by
+the accumulated weight. Rows no later window can touch are written out
+immediately, so memory is bounded by a window-high strip of the scene
+width rather than the scene size.
+"""
+import queue
+import threading
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+try:
+    from .cog import open_cog_writer, tiled_profile
+except ImportError:  # run as a script
+    from cog import open_cog_writer, tiled_profile
+
+logger = logging.getLogger(__name__)
+
+BLEND_MODES = ("cosine", "gaussian", "none")
+
+
+def blend_weights(window: int, mode: str = "cosine") -> np.ndarray:
+    """
+    window x window float32 weight map, largest at the centre. Weights are
+    floored slightly above zero so scene-edge pixels covered by a single
+    window still normalise.
+    """
+    if mode not in BLEND_MODES:
+        raise ValueError(f"Unknown blend mode {mode!r}; use one of {BLEND_MODES}")
+    t = (np.arange(window, dtype=np.float64) + 0.5) / window
+    if mode == "cosine":
+        w1 = 0.5 - 0.5 * np.cos(2.0 * np.pi * t)
+    elif mode == "gaussian":
+        w1 = np.exp(-0.5 * ((t - 0.5) / 0.25) ** 2)
+    else:
+        w1 = np.ones(window)
+    w = np.outer(w1, w1)
+    return np.maximum(w / w.max(), 1e-3).astype(np.float32)
+
+
+def window_origins(length: int, window: int, stride: int) -> List[int]:
+    """Window start offsets covering [0, length); the last window is shifted back to end flush."""
+    if length <= window:
+        return [0]
+    origins = list(range(0, length - window + 1, stride))
+    if origins[-1] + window < length:
+        origins.append(length - window)
+    return origins
+
+
+def _prefetch(iterator: Iterator, depth: int = 2) -> Iterator:
+    """Run an iterator on a background thread, keeping up to `depth` items ready."""
+    q: "queue.Queue" = queue.Queue(maxsize=depth)
+    done = object()
+
+    def worker():
+        try:
+            for item in iterator:
+                q.put(item)
+        except BaseException as e:  # surfaced in the consumer
+            q.put(e)
+        q.put(done)
+
+    threading.Thread(target=worker, daemon=True).start()
+    while True:
+        item = q.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def predict_scene(
+    model: Callable,
+    src_path: str,
+    out_path: str,
+    window: int = 256,
+    overlap: int = 64,
+    batch_size: int = 8,
+    blend: str = "cosine",
+    bands: Optional[Sequence[int]] = None,
+    scale: float = 10000.0,
+    cog: bool = False,
+    compress: str = "deflate",
+    prefetch: bool = True,
+    tags: Optional[dict] = None,
+) -> Tuple[int, int]:
+    """
+    Predict a single-band float32 raster on the source grid from
+    overlapping window x window tiles of src_path.
+
+    model maps an (N, C, window, window) float tensor to (N, window, window)
+    (or (N, 1, window, window)); inputs are divided by `scale` as in
+    training. Pixels outside the source's valid mask are written as NaN.
+    tags are added to the output band's metadata. Returns (windows predicted, forward passes).
+    """
+    import torch
+
+    if not 0 <= overlap < window:
+        raise ValueError(f"overlap must be in [0, window), got {overlap}")
+    stride = window - overlap
+    weights = blend_weights(window, blend)
+
+    with rasterio.open(src_path) as src:
+        height, width = src.height, src.width
+        bands = list(bands) if bands is not None else list(range(1, src.count + 1))
+        ys = window_origins(height, window, stride)
+        xs = window_origins(width, window, stride)
+        # Scenes smaller than a window are padded up to it
+        win_h, win_w = min(window, height), min(window, width)
+
+        profile = dict(src.profile)
+        profile.update(count=1, dtype="float32", nodata=np.nan)
+        if cog:
+            writer = open_cog_writer(out_path, profile, compress=compress)
+        else:
+            profile = tiled_profile(profile)
+            profile.update(compress=compress, predictor=3)
+            writer = rasterio.open(out_path, "w", **profile)
+
+        def strips():
+            for y in ys:
+                w = Window(0, y, width, win_h)
+                data = np.nan_to_num(src.read(bands, window=w).astype(np.float32)) / scale
+                yield y, data, src.dataset_mask(window=w) > 0
+
+        # Rows of the current window row: everything above it has been written
+        acc = np.zeros((win_h, width), dtype=np.float32)
+        norm = np.zeros_like(acc)
+        dst_mask = np.zeros(acc.shape, dtype=bool)
+        acc_top = 0      # scene row of acc[0]
+        n_windows = n_passes = 0
+
+        with writer as dst, torch.no_grad():
+            def flush(until: int):
+                """Normalise and write scene rows [acc_top, until), then shift the accumulators."""
+                nonlocal acc_top
+                n = until - acc_top
+                if n <= 0:
+                    return
+                out = acc[:n] / np.maximum(norm[:n], 1e-12)
+                valid = dst_mask[:n]
+                out[~valid] = np.nan
+                dst.write(out.astype(np.float32), 1, window=Window(0, acc_top, width, n))
+                acc[:-n], norm[:-n], dst_mask[:-n] = acc[n:], norm[n:], dst_mask[n:]
+                acc[-n:], norm[-n:], dst_mask[-n:] = 0.0, 0.0, False
+                acc_top = until
+
+            rows = _prefetch(strips()) if prefetch else strips()
+            for i, (y, strip, mask) in enumerate(rows):
+                off = y - acc_top
+                dst_mask[off:off + win_h] |= mask
+                for b in range(0, len(xs), batch_size):
+                    batch_xs = xs[b:b + batch_size]
+                    stack = np.zeros((len(batch_xs), len(bands), window, window), dtype=np.float32)
+                    for j, x in enumerate(batch_xs):
+                        tile = strip[:, :, x:x + win_w]
+                        stack[j] = np.pad(tile, ((0, 0), (0, window - win_h), (0, window - win_w)), mode="edge")
+                    preds = model(torch.from_numpy(stack))
+                    preds = preds.reshape(len(batch_xs), window, window).float().numpy()
+                    n_passes += 1
+                    n_windows += len(batch_xs)
+                    for x, pred in zip(batch_xs, preds):
+                        wts = weights[:win_h, :win_w]
+                        acc[off:off + win_h, x:x + win_w] += pred[:win_h, :win_w] * wts
+                        norm[off:off + win_h, x:x + win_w] += wts
+                # Rows above the next window row are final
+                flush(ys[i + 1] if i + 1 < len(ys) else height)
+            dst.update_tags(1, window=window, overlap=overlap, blend=blend, **(tags or {}))
+
+    logger.info(f"Predicted {n_windows} windows in {n_passes} forward passes: {out_path}")
+    return n_windows, n_passes
@@ -0,0 +1,257 @@
+"""
+Spatial index over the drone image catalog.
+
+Capture points are bucketed into a uniform lat/lon grid (default ~100 m
+cells) and stored sorted by cell id, so a bbox query is a handful of
+binary searches per grid row instead of a scan of every catalog row. The
+index is persisted as an uncompressed `.npz` next to the catalog.
+"""
+import math
+import logging
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DateLike = Union[str, date]
+# (min_lon, min_lat, max_lon, max_lat), same order as rasterio bounds
+BBox = Tuple[float, float, float, float]
+
+EARTH_RADIUS_M = 6371008.8
+# Shortest ground distance spanned by one degree of latitude
+_MIN_M_PER_DEG_LAT = 110574.0
+
+
+def index_path_for(catalog_path: str) -> Path:
+    return Path(f"{catalog_path}.sindex.npz")
+
+
+def _to_day(value) -> np.datetime64:
+    try:
+        return np.datetime64(str(value)[:10], "D")
+    except ValueError:
+        return np.datetime64("NaT", "D")
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres (vectorised over numpy arrays)."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2.0) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    )
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def _points_in_ring(lon, lat, ring) -> np.ndarray:
+    """Even-odd ray casting of points against one closed ring of [lon, lat] pairs."""
+    ring = np.asarray(ring, dtype=np.float64)
+    inside = np.zeros(len(lon), dtype=bool)
+    x1, y1 = ring[:-1, 0], ring[:-1, 1]
+    x2, y2 = ring[1:, 0], ring[1:, 1]
+    for ax, ay, bx, by in zip(x1, y1, x2, y2):
+        crosses = (ay > lat) != (by > lat)
+        if not crosses.any():
+            continue
+        x_at = ax + (lat - ay) * (bx - ax) / ((by - ay) or 1e-300)
+        inside ^= crosses & (lon < x_at)
+    return inside
+
+
+def _polygons(geojson: Dict) -> List[List]:
+    """Normalise a GeoJSON Feature/Polygon/MultiPolygon into a list of ring lists."""
+    if geojson.get("type") == "Feature":
+        geojson = geojson["geometry"]
+    if geojson["type"] == "Polygon":
+        return [geojson["coordinates"]]
+    if geojson["type"] == "MultiPolygon":
+        return list(geojson["coordinates"])
+    raise ValueError(f"Unsupported geometry type: {geojson['type']}")
+
+
+class CatalogSpatialIndex:
+    """Grid index of catalog capture points supporting bbox, polygon and k-nearest queries."""
+
+    def __init__(self, image_path, lat, lon, capture_day, cell_deg: float = 0.001):
+        self.cell_deg = float(cell_deg)
+        self._ncols = int(math.ceil(360.0 / self.cell_deg)) + 1
+
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        keys = self._cell_key(self._row(lat), self._col(lon))
+        order = np.argsort(keys, kind="stable")
+
+        self.keys = keys[order]
+        self.lat = lat[order]
+        self.lon = lon[order]
+        self.capture_day = np.asarray(capture_day, dtype="datetime64[D]")[order]
+        self.image_path = np.asarray(image_path, dtype=str)[order]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _row(self, lat):
+        return np.floor((np.asarray(lat) + 90.0) / self.cell_deg).astype(np.int64)
+
+    def _col(self, lon):
+        return np.floor((np.asarray(lon) + 180.0) / self.cell_deg).astype(np.int64)
+
+    def _cell_key(self, row, col):
+        return row * self._ncols + col
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, cell_deg: float = 0.001) -> "CatalogSpatialIndex":
+        """Build from catalog rows with image_path, lat, lon and capture_date/timestamp."""
+        df = df.dropna(subset=["lat", "lon"])
+        days = [_to_day(d) for d in df.get("capture_date", [None] * len(df))]
+        return cls(df["image_path"].to_numpy(), df["lat"].to_numpy(), df["lon"].to_numpy(),
+                   np.array(days, dtype="datetime64[D]"), cell_deg=cell_deg)
+
+    @classmethod
+    def from_catalog(cls, catalog_path: str, cell_deg: float = 0.001) -> "CatalogSpatialIndex":
+        """Build from a Parquet or CSV catalog, reading only the indexed columns."""
+        try:
+            from .catalog import read_catalog
+        except ImportError:
+            from catalog import read_catalog
+        df = read_catalog(catalog_path, columns=["image_path", "lat", "lon", "capture_date"])
+        return cls.from_frame(df, cell_deg=cell_deg)
+
+    def save(self, path: str) -> None:
+        tmp = Path(path).with_name(Path(path).name + ".tmp.npz")
+        np.savez(
+            tmp,
+            cell_deg=np.float64(self.cell_deg),
+            image_path=self.image_path,
+            lat=self.lat,
+            lon=self.lon,
+            capture_day=self.capture_day,
+        )
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: str) -> "CatalogSpatialIndex":
+        with np.load(path) as z:
+            return cls(z["image_path"], z["lat"], z["lon"], z["capture_day"],
+                       cell_deg=float(z["cell_deg"]))
+
+    def _candidates(self, bbox: BBox) -> np.ndarray:
+        """Row indices in grid cells overlapping bbox (superset of the exact answer)."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        c0, c1 = int(self._col(min_lon)), int(self._col(max_lon))
+        parts = []
+        for row in range(int(self._row(min_lat)), int(self._row(max_lat)) + 1):
+            lo = np.searchsorted(self.keys, self._cell_key(row, c0), side="left")
+            hi = np.searchsorted(self.keys, self._cell_key(row, c1), side="right")
+            if hi > lo:
+                parts.append(np.arange(lo, hi))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def _date_mask(self, idx: np.ndarray, date_range) -> np.ndarray:
+        if date_range is None:
+            return np.ones(len(idx), dtype=bool)
+        start, end = date_range
+        days = self.capture_day[idx]
+        mask = ~np.isnat(days)
+        if start is not None:
+            mask &= days >= _to_day(start)
+        if end is not None:
+            mask &= days <= _to_day(end)
+        return mask
+
+    def _frame(self, idx: np.ndarray, **extra) -> pd.DataFrame:
+        days = self.capture_day[idx]
+        return pd.DataFrame({
+            "image_path": self.image_path[idx],
+            "lat": self.lat[idx],
+            "lon": self.lon[idx],
+            "capture_date": np.where(np.isnat(days), "unknown", days.astype(str)),
+            **extra,
+        })
+
+    def images_in_bbox(
+        self, bbox: BBox, date_range: Optional[Tuple[Optional[DateLike], Optional[DateLike]]] = None
+    ) -> pd.DataFrame:
+        """Images captured inside bbox = (min_lon, min_lat, max_lon, max_lat), optionally within date_range."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        idx = self._candidates(bbox)
+        lat, lon = self.lat[idx], self.lon[idx]
+        mask = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+        mask &= self._date_mask(idx, date_range)
+        return self._frame(idx[mask])
+
+    def images_in_polygon(
+        self, geojson: Dict, date_range: Optional[Tuple[Optional[DateLike], Optional[DateLike]]] = None
+    ) -> pd.DataFrame:
+        """Images inside a GeoJSON (Multi)Polygon, e.g. Paddock.polygon_geojson; holes are respected."""
+        polygons = _polygons(geojson)
+        coords = np.array([pt for poly in polygons for ring in poly for pt in ring], dtype=np.float64)
+        bbox = (coords[:, 0].min(), coords[:, 1].min(), coords[:, 0].max(), coords[:, 1].max())
+        idx = self._candidates(bbox)
+        idx = idx[self._date_mask(idx, date_range)]
+        lat, lon = self.lat[idx], self.lon[idx]
+
+        inside = np.zeros(len(idx), dtype=bool)
+        for rings in polygons:
+            in_poly = np.zeros(len(idx), dtype=bool)
+            for ring in rings:
+                in_poly ^= _points_in_ring(lon, lat, ring)
+            inside |= in_poly
+        return self._frame(idx[inside])
+
+    def nearest_images(
+        self, lat: float, lon: float, k: int = 10,
+        date_range: Optional[Tuple[Optional[DateLike], Optional[DateLike]]] = None,
+    ) -> pd.DataFrame:
+        """
+        The k captures closest to (lat, lon), nearest first, with distance_m.
+
+        The search window grows geometrically around the query cell and stops
+        once k hits are known and no unvisited cell can hold anything closer.
+        """
+        if len(self) == 0 or k <= 0:
+            return self._frame(np.empty(0, dtype=np.int64), distance_m=np.empty(0))
+
+        # Once the window covers every indexed point there is nothing left to find
+        max_radius = int(math.ceil(max(
+            abs(lat - self.lat.min()), abs(lat - self.lat.max()),
+            abs(lon - self.lon.min()), abs(lon - self.lon.max()),
+        ) / self.cell_deg)) + 1
+        radius = 1
+        while True:
+            span = radius * self.cell_deg
+            idx = self._candidates((lon - span, lat - span, lon + span, lat + span))
+            idx = idx[self._date_mask(idx, date_range)]
+            dist = haversine_m(lat, lon, self.lat[idx], self.lon[idx])
+            # Anything outside the window is at least this far away
+            m_per_deg_lon = 111320.0 * math.cos(math.radians(min(89.9, abs(lat) + span)))
+            reach = span * min(_MIN_M_PER_DEG_LAT, m_per_deg_lon)
+            if len(idx) >= k and np.partition(dist, k - 1)[k - 1] <= reach:
+                break
+            if radius >= max_radius:
+                break
+            radius *= 2
+
+        order = np.argsort(dist, kind="stable")[:k]
+        return self._frame(idx[order], distance_m=dist[order])
+
+
+def build_index(catalog_path: str, cell_deg: float = 0.001) -> Path:
+    """Build the spatial index for a catalog and persist it alongside."""
+    index = CatalogSpatialIndex.from_catalog(catalog_path, cell_deg=cell_deg)
+    out = index_path_for(catalog_path)
+    index.save(str(out))
+    logger.info(f"Spatial index over {len(index)} images: {out}")
+    return out
+
+
+def load_index(catalog_path: str) -> CatalogSpatialIndex:
+    """Load the persisted index for a catalog, building it on first use."""
+    path = index_path_for(catalog_path)
+    if not path.exists():
+        build_index(catalog_path)
+    return CatalogSpatialIndex.load(str(path))
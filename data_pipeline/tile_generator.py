@@ -1,13 +1,616 @@
 """
 Tile pyramid generator: orthomosaic → XYZ/MBTiles for web map display.
 Produces TileJSON for Mapbox/MapLibre consumption.
+
+The mosaic is reprojected to Web Mercator once, onto a grid aligned with
+the max-zoom tiles. Max-zoom tiles are cut straight from that raster and
+every lower zoom is built by 2×2 downsampling of the four child tiles, so
+the source is never re-read per tile. Tiles are rendered on a process pool
+and fully-nodata tiles are skipped.
+
+Tiles go either to a {z}/{x}/{y}.png directory tree or, when the output
+path ends in `.mbtiles`, to a single SQLite MBTiles file whose tile images
+are de-duplicated by content hash (blank and constant tiles are common over
+paddocks).
+
+An existing pyramid can be updated in place for a re-flown area: only the
+max-zoom tiles overlapping the changed bounds are re-cut (pixels outside
+the changed bounds are kept from the existing tiles) and the change is
+propagated up through their ancestors.
 """
+import hashlib
 import json
+import math
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+# Half the Web Mercator world width in metres (EPSG:3857)
+WEB_MERCATOR_HALF = 20037508.342789244
+
+Tile = Tuple[int, int]
+
+# Colour ramps for single-band layers as (position, RGB) anchors; expanded to
+# 256-entry lookup tables so rendering is one uint8 fancy-index per tile.
+COLORMAPS: Dict[str, List[Tuple[float, Tuple[int, int, int]]]] = {
+    # Bare ground (brown) through sparse (yellow) to dense pasture (dark green)
+    "biomass": [
+        (0.0, (140, 81, 10)),
+        (0.25, (216, 179, 101)),
+        (0.5, (246, 232, 145)),
+        (0.75, (120, 198, 121)),
+        (1.0, (0, 104, 55)),
+    ],
+    "viridis": [
+        (0.0, (68, 1, 84)),
+        (0.25, (59, 82, 139)),
+        (0.5, (33, 145, 140)),
+        (0.75, (94, 201, 98)),
+        (1.0, (253, 231, 37)),
+    ],
+    "greys": [(0.0, (0, 0, 0)), (1.0, (255, 255, 255))],
+}
+
+
+def tile_span(z: int) -> float:
+    """Width of one tile at zoom z in Web Mercator metres."""
+    return 2.0 * WEB_MERCATOR_HALF / (1 << z)
+
+
+def tile_range(bounds_3857: Sequence[float], z: int) -> Tuple[int, int, int, int]:
+    """Inclusive (x0, y0, x1, y1) XYZ tile range covering Web Mercator bounds."""
+    left, bottom, right, top = bounds_3857
+    span = tile_span(z)
+    n = (1 << z) - 1
+    x0 = min(n, max(0, int(math.floor((left + WEB_MERCATOR_HALF) / span))))
+    x1 = min(n, max(0, int(math.ceil((right + WEB_MERCATOR_HALF) / span)) - 1))
+    y0 = min(n, max(0, int(math.floor((WEB_MERCATOR_HALF - top) / span))))
+    y1 = min(n, max(0, int(math.ceil((WEB_MERCATOR_HALF - bottom) / span)) - 1))
+    return x0, y0, max(x0, x1), max(y0, y1)
+
+
+def tile_path(out_dir, z: int, x: int, y: int) -> Path:
+    return Path(out_dir) / str(z) / str(x) / f"{y}.png"
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    from PIL import Image
+    import io
+
+    buf = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def decode_png(data: bytes) -> np.ndarray:
+    from PIL import Image
+    import io
+
+    with Image.open(io.BytesIO(data)) as im:
+        return np.asarray(im.convert("RGBA"))
+
+
+class DirectoryTileStore:
+    """{z}/{x}/{y}.png files under a directory."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def put(self, z: int, x: int, y: int, data: bytes) -> None:
+        path = tile_path(self.root, z, x, y)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        path = tile_path(self.root, z, x, y)
+        return path.read_bytes() if path.exists() else None
+
+    def delete(self, z: int, x: int, y: int) -> bool:
+        path = tile_path(self.root, z, x, y)
+        if not path.exists():
+            return False
+        path.unlink()
+        return True
+
+    def commit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class MBTilesWriter:
+    """
+    MBTiles 1.3 container with de-duplicated tile images.
+
+    Tile payloads live once in `images` keyed by their SHA-1; `map` points
+    each (zoom, column, TMS row) at an image, and the spec's `tiles` table
+    is a view joining the two, so standard MBTiles readers work unchanged.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS images (tile_id TEXT PRIMARY KEY, tile_data BLOB);
+        CREATE TABLE IF NOT EXISTS map (
+            zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT,
+            PRIMARY KEY (zoom_level, tile_column, tile_row)
+        );
+        CREATE VIEW IF NOT EXISTS tiles AS
+            SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column,
+                   map.tile_row AS tile_row, images.tile_data AS tile_data
+            FROM map JOIN images ON images.tile_id = map.tile_id;
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Updating an existing file can orphan images that tiles no longer reference
+        self._prune_images = self.path.exists()
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def put(self, z: int, x: int, y: int, data: bytes) -> None:
+        tile_id = hashlib.sha1(data).hexdigest()
+        tms_row = (1 << z) - 1 - y
+        self.conn.execute("INSERT OR IGNORE INTO images (tile_id, tile_data) VALUES (?, ?)", (tile_id, data))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id) VALUES (?, ?, ?, ?)",
+            (z, x, tms_row, tile_id),
+        )
+
+    def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        row = self.conn.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+            (z, x, (1 << z) - 1 - y),
+        ).fetchone()
+        return row[0] if row else None
+
+    def delete(self, z: int, x: int, y: int) -> bool:
+        cur = self.conn.execute(
+            "DELETE FROM map WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+            (z, x, (1 << z) - 1 - y),
+        )
+        self._prune_images = True
+        return cur.rowcount > 0
+
+    def set_metadata(self, metadata: Dict) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)",
+            [(k, v if isinstance(v, str) else json.dumps(v) if isinstance(v, (dict, list)) else str(v))
+             for k, v in metadata.items()],
+        )
+
+    def dedup_stats(self) -> Tuple[int, int]:
+        """(tiles, distinct images) currently stored."""
+        n_tiles = self.conn.execute("SELECT COUNT(*) FROM map").fetchone()[0]
+        n_images = self.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        return n_tiles, n_images
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        if self._prune_images:
+            self.conn.execute("DELETE FROM images WHERE tile_id NOT IN (SELECT tile_id FROM map)")
+        self.conn.commit()
+        # Leave a self-contained file that read-only servers can open without a -wal/-shm
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.close()
+
+
+class MBTilesReader:
+    """Read-only MBTiles access for render workers (sees committed levels only)."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+    def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        row = self.conn.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+            (z, x, (1 << z) - 1 - y),
+        ).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def is_mbtiles(output: str) -> bool:
+    return str(output).lower().endswith(".mbtiles")
+
+
+def open_tile_store(output: str, readonly: bool = False):
+    """Directory store, or MBTiles when the output path ends in .mbtiles."""
+    if is_mbtiles(output):
+        return MBTilesReader(output) if readonly else MBTilesWriter(output)
+    return DirectoryTileStore(output)
+
+
+@lru_cache(maxsize=None)
+def colormap_lut(name: str) -> np.ndarray:
+    """256 x 3 uint8 lookup table for a named colour ramp in COLORMAPS."""
+    if name not in COLORMAPS:
+        raise ValueError(f"Unknown colormap {name!r}; use one of {sorted(COLORMAPS)}")
+    positions, colours = zip(*COLORMAPS[name])
+    colours = np.asarray(colours, dtype=np.float64)
+    grid = np.linspace(0.0, 1.0, 256)
+    lut = np.stack([np.interp(grid, positions, colours[:, c]) for c in range(3)], axis=1)
+    lut = np.rint(lut).astype(np.uint8)
+    lut.setflags(write=False)
+    return lut
+
+
+def render_rgba(
+    data: np.ndarray,
+    valid: np.ndarray,
+    stretch: Sequence[Tuple[float, float]],
+    colormap: Optional[str] = None,
+) -> np.ndarray:
+    """
+    Linear-stretch 1 or 3 bands (C x H x W) to uint8 RGBA; invalid pixels
+    are fully transparent. Single-band data renders as greyscale, or through
+    the named colormap's lookup table.
+    """
+    out = np.zeros(data.shape[1:] + (4,), dtype=np.uint8)
+    for i, (band, (lo, hi)) in enumerate(zip(data, stretch)):
+        scaled = (band.astype(np.float32) - lo) * (255.0 / max(hi - lo, 1e-12))
+        out[..., i] = np.clip(np.nan_to_num(scaled), 0, 255).astype(np.uint8)
+    if colormap is not None and data.shape[0] == 1:
+        out[..., :3] = colormap_lut(colormap)[out[..., 0]]
+    elif data.shape[0] == 1:
+        out[..., 1] = out[..., 0]
+        out[..., 2] = out[..., 0]
+    out[..., 3] = np.where(valid, 255, 0).astype(np.uint8)
+    out[~valid, :3] = 0
+    return out
+
+
+def downsample_2x2(children: Dict[Tuple[int, int], np.ndarray], tile_size: int) -> np.ndarray:
+    """
+    Build a parent tile from up to four child RGBA tiles keyed by (dx, dy)
+    offset, averaging each 2×2 block weighted by alpha so transparent
+    pixels don't darken their neighbours.
+    """
+    canvas = np.zeros((2 * tile_size, 2 * tile_size, 4), dtype=np.uint8)
+    for (dx, dy), child in children.items():
+        canvas[dy * tile_size:(dy + 1) * tile_size, dx * tile_size:(dx + 1) * tile_size] = child
+
+    alpha = canvas[..., 3].astype(np.float32)
+    weight = alpha.reshape(tile_size, 2, tile_size, 2).sum(axis=(1, 3))
+    rgb = (canvas[..., :3].astype(np.float32) * alpha[..., None])
+    rgb = rgb.reshape(tile_size, 2, tile_size, 2, 3).sum(axis=(1, 3))
+
+    parent = np.zeros((tile_size, tile_size, 4), dtype=np.uint8)
+    np.divide(rgb, weight[..., None], out=rgb, where=weight[..., None] > 0)
+    parent[..., :3] = np.clip(np.rint(rgb), 0, 255).astype(np.uint8)
+    parent[..., 3] = np.clip(np.rint(weight / 4.0), 0, 255).astype(np.uint8)
+    return parent
+
+
+def reproject_to_mercator(
+    src_path: str,
+    dst_path: str,
+    max_zoom: int,
+    tile_size: int = 256,
+    resampling: str = "bilinear",
+    tiles: Optional[Tuple[int, int, int, int]] = None,
+) -> Tuple[int, int, int, int]:
+    """
+    Warp the mosaic once to EPSG:3857 on a grid aligned with the max-zoom
+    tiles, with an alpha band marking the valid footprint. `tiles` limits
+    the warp to a max-zoom tile range (e.g. the tiles of a changed area).
+    Returns the max-zoom tile range (x0, y0, x1, y1) the output covers.
+    """
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.shutil import copy as rio_copy
+    from rasterio.transform import from_origin
+    from rasterio.vrt import WarpedVRT
+    from rasterio.warp import transform_bounds
+
+    with rasterio.open(src_path) as src:
+        bounds = transform_bounds(src.crs, "EPSG:3857", *src.bounds, densify_pts=21)
+        x0, y0, x1, y1 = tiles if tiles is not None else tile_range(bounds, max_zoom)
+        span = tile_span(max_zoom)
+        transform = from_origin(
+            -WEB_MERCATOR_HALF + x0 * span, WEB_MERCATOR_HALF - y0 * span,
+            span / tile_size, span / tile_size,
+        )
+        with WarpedVRT(
+            src,
+            crs="EPSG:3857",
+            transform=transform,
+            width=(x1 - x0 + 1) * tile_size,
+            height=(y1 - y0 + 1) * tile_size,
+            resampling=Resampling[resampling],
+            add_alpha=True,
+        ) as vrt:
+            rio_copy(vrt, dst_path, driver="GTiff", tiled=True,
+                     blockxsize=tile_size, blockysize=tile_size, BIGTIFF="IF_SAFER")
+    return x0, y0, x1, y1
+
+
+def compute_stretch(
+    mercator_path: str, bands: Sequence[int], percentiles=(2.0, 98.0), sample_size: int = 1024
+) -> List[Tuple[float, float]]:
+    """Per-band (lo, hi) display stretch from a decimated read of valid pixels."""
+    import rasterio
+
+    with rasterio.open(mercator_path) as src:
+        scale = max(1, max(src.width, src.height) // sample_size)
+        shape = (max(1, src.height // scale), max(1, src.width // scale))
+        data = src.read(list(bands), out_shape=(len(bands),) + shape).astype(np.float64)
+        alpha = src.read(src.count, out_shape=shape)
+    valid = (alpha > 0) & np.all(np.isfinite(data), axis=0)
+    stretch = []
+    for band in data:
+        vals = band[valid]
+        if vals.size == 0:
+            stretch.append((0.0, 1.0))
+            continue
+        lo, hi = np.percentile(vals, percentiles)
+        stretch.append((float(lo), float(hi) if hi > lo else float(lo) + 1.0))
+    return stretch
+
+
+def changed_pixel_mask(
+    z: int, x: int, y: int, tile_size: int, changed_3857: Sequence[float]
+) -> np.ndarray:
+    """Boolean tile_size² mask of the pixels of tile z/x/y that intersect a Web Mercator bbox."""
+    left, bottom, right, top = changed_3857
+    span = tile_span(z)
+    res = span / tile_size
+    tile_left = -WEB_MERCATOR_HALF + x * span
+    tile_top = WEB_MERCATOR_HALF - y * span
+    c0 = max(0, int(math.floor((left - tile_left) / res)))
+    c1 = min(tile_size, int(math.ceil((right - tile_left) / res)))
+    r0 = max(0, int(math.floor((tile_top - top) / res)))
+    r1 = min(tile_size, int(math.ceil((tile_top - bottom) / res)))
+    mask = np.zeros((tile_size, tile_size), dtype=bool)
+    mask[r0:r1, c0:c1] = True
+    return mask
+
+
+def _render_base_tiles(job) -> List[Tuple[int, int, Optional[bytes]]]:
+    """
+    Process-pool task: cut and encode max-zoom tiles from the Mercator raster.
+
+    For an update (`changed` = (output, changed bbox in EPSG:3857)) only the
+    pixels inside the changed bbox are taken from the raster; the rest come
+    from the existing tile, and tiles left fully transparent are returned
+    with data None so the writer removes them.
+    """
+    import rasterio
+    from rasterio.windows import Window
+
+    mercator_path, z, origin, tiles, bands, stretch, colormap, tile_size, changed = job
+    x0, y0 = origin
+    store = open_tile_store(changed[0], readonly=True) if changed else None
+    rendered = []
+    try:
+        with rasterio.open(mercator_path) as src:
+            for x, y in tiles:
+                window = Window((x - x0) * tile_size, (y - y0) * tile_size, tile_size, tile_size)
+                alpha = src.read(src.count, window=window)
+                rgba = None
+                if alpha.any():
+                    data = src.read(list(bands), window=window)
+                    valid = (alpha > 0) & np.all(np.isfinite(data), axis=0)
+                    if valid.any():
+                        rgba = render_rgba(data, valid, stretch, colormap)
+                if store is not None:
+                    old = store.get(z, x, y)
+                    if old is None and rgba is None:
+                        continue
+                    merged = decode_png(old).copy() if old is not None else np.zeros((tile_size, tile_size, 4), np.uint8)
+                    mask = changed_pixel_mask(z, x, y, tile_size, changed[1])
+                    merged[mask] = rgba[mask] if rgba is not None else 0
+                    rgba = merged if merged[..., 3].any() else None
+                    if rgba is None:
+                        rendered.append((x, y, None))
+                        continue
+                if rgba is not None:
+                    rendered.append((x, y, encode_png(rgba)))
+    finally:
+        if store is not None:
+            store.close()
+    return rendered
+
+
+def _render_parent_tiles(job) -> List[Tuple[int, int, Optional[bytes]]]:
+    """
+    Process-pool task: build zoom z tiles from their (committed) zoom z+1
+    children. With `prune`, tiles that end up empty are returned with data
+    None so a stale parent is removed.
+    """
+    output, z, tiles, tile_size, prune = job
+    store = open_tile_store(output, readonly=True)
+    rendered = []
+    try:
+        for x, y in tiles:
+            children = {}
+            for dy in (0, 1):
+                for dx in (0, 1):
+                    child = store.get(z + 1, 2 * x + dx, 2 * y + dy)
+                    if child is not None:
+                        children[(dx, dy)] = decode_png(child)
+            parent = downsample_2x2(children, tile_size) if children else None
+            if parent is None or not parent[..., 3].any():
+                if prune:
+                    rendered.append((x, y, None))
+                continue
+            rendered.append((x, y, encode_png(parent)))
+    finally:
+        store.close()
+    return rendered
+
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _run(func, jobs: List, workers: int, store, z: int) -> List[Tile]:
+    """
+    Render jobs (in parallel when workers > 1); the calling process is the
+    only writer. Returns the tiles written or removed.
+    """
+    written: List[Tile] = []
+
+    def _store(results):
+        for x, y, data in results:
+            if data is None:
+                if not store.delete(z, x, y):
+                    continue
+            else:
+                store.put(z, x, y, data)
+            written.append((x, y))
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for results in pool.map(func, jobs):
+                _store(results)
+    else:
+        for job in jobs:
+            _store(func(job))
+    store.commit()
+    return written
+
+
+def build_pyramid(
+    mercator_path: str,
+    output: str,
+    base_range: Tuple[int, int, int, int],
+    min_zoom: int,
+    max_zoom: int,
+    bands: Sequence[int],
+    stretch: Sequence[Tuple[float, float]],
+    tile_size: int = 256,
+    workers: int = 1,
+    chunk_tiles: int = 64,
+    changed_3857: Optional[Sequence[float]] = None,
+    colormap: Optional[str] = None,
+) -> Dict[int, List[Tile]]:
+    """
+    Render max-zoom tiles in base_range, then each lower zoom from its
+    children, into a tile directory or .mbtiles file. Returns
+    {z: [(x, y), ...]} for every tile written (or removed).
+
+    With changed_3857 the pyramid is updated in place: only pixels inside
+    that Web Mercator bbox are replaced, and only ancestors of touched
+    tiles are rebuilt.
+    """
+    x0, y0, x1, y1 = base_range
+    store = open_tile_store(str(output))
+    try:
+        base = [(x, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+        changed = (str(output), tuple(changed_3857)) if changed_3857 is not None else None
+        jobs = [
+            (mercator_path, max_zoom, (x0, y0), chunk, tuple(bands), list(stretch), colormap, tile_size, changed)
+            for chunk in _chunks(base, chunk_tiles)
+        ]
+        written = {max_zoom: _run(_render_base_tiles, jobs, workers, store, max_zoom)}
+
+        for z in range(max_zoom - 1, min_zoom - 1, -1):
+            parents = sorted({(x // 2, y // 2) for x, y in written[z + 1]}, key=lambda t: (t[1], t[0]))
+            jobs = [(str(output), z, chunk, tile_size, changed is not None) for chunk in _chunks(parents, chunk_tiles)]
+            written[z] = _run(_render_parent_tiles, jobs, workers, store, z)
+            logger.info(f"Zoom {z}: {len(written[z])} tiles")
+        if isinstance(store, MBTilesWriter):
+            n_tiles, n_images = store.dedup_stats()
+            logger.info(f"MBTiles: {n_tiles} tiles stored as {n_images} distinct images")
+    finally:
+        store.close()
+    return written
+
+
+def _lonlat_bounds(mercator_path: str) -> List[float]:
+    import rasterio
+    from rasterio.warp import transform_bounds
+
+    with rasterio.open(mercator_path) as src:
+        return [round(v, 7) for v in transform_bounds(src.crs, "EPSG:4326", *src.bounds)]
+
+
+def diff_bounds(old_path: str, new_path: str, rows_per_chunk: int = 512) -> Optional[List[float]]:
+    """
+    Lon/lat bbox (west, south, east, north) of the pixels that differ
+    between two mosaics, or None if they are identical. Mosaics on different
+    grids are compared by footprint: the union of both bounds.
+    """
+    import rasterio
+    from rasterio.warp import transform_bounds
+    from rasterio.windows import Window, bounds as window_bounds
+
+    with rasterio.open(old_path) as a, rasterio.open(new_path) as b:
+        if (a.crs, a.transform, a.width, a.height, a.count) != (b.crs, b.transform, b.width, b.height, b.count):
+            ba = transform_bounds(a.crs, "EPSG:4326", *a.bounds)
+            bb = transform_bounds(b.crs, "EPSG:4326", *b.bounds)
+            return [min(ba[0], bb[0]), min(ba[1], bb[1]), max(ba[2], bb[2]), max(ba[3], bb[3])]
+
+        r0 = c0 = None
+        for row in range(0, b.height, rows_per_chunk):
+            window = Window(0, row, b.width, min(rows_per_chunk, b.height - row))
+            da, db = a.read(window=window), b.read(window=window)
+            differ = da != db
+            if np.issubdtype(db.dtype, np.floating):
+                differ &= ~(np.isnan(da) & np.isnan(db))
+            rr, cc = np.nonzero(differ.any(axis=0))
+            if rr.size == 0:
+                continue
+            lo_r, hi_r = row + rr.min(), row + rr.max()
+            r0, r1 = (lo_r, hi_r) if r0 is None else (min(r0, lo_r), max(r1, hi_r))
+            c0, c1 = (cc.min(), cc.max()) if c0 is None else (min(c0, cc.min()), max(c1, cc.max()))
+        if r0 is None:
+            return None
+        changed = window_bounds(Window(c0, r0, c1 - c0 + 1, r1 - r0 + 1), b.transform)
+        return list(transform_bounds(b.crs, "EPSG:4326", *changed))
+
+
+def _write_tile_metadata(out_path: Path, tilejson: Dict) -> Path:
+    """Write TileJSON (next to an .mbtiles file, or into a tile directory) and MBTiles metadata."""
+    mbtiles = is_mbtiles(out_path)
+    tilejson_path = out_path.with_suffix(".tilejson.json") if mbtiles else out_path / "tilejson.json"
+    with open(tilejson_path, "w") as f:
+        json.dump(tilejson, f, indent=2)
+    if mbtiles:
+        store = MBTilesWriter(str(out_path))
+        try:
+            store.set_metadata({
+                "name": tilejson["name"],
+                "format": "png",
+                "type": "overlay",
+                "version": "1.3",
+                "minzoom": tilejson["minzoom"],
+                "maxzoom": tilejson["maxzoom"],
+                "bounds": ",".join(str(b) for b in tilejson["bounds"]),
+                "center": ",".join(str(c) for c in tilejson["center"]),
+            })
+        finally:
+            store.close()
+    logger.info(f"TileJSON: {tilejson_path}")
+    return tilejson_path
+
+
+def _center(bounds: Sequence[float], min_zoom: int, max_zoom: int) -> List[float]:
+    return [
+        round((bounds[0] + bounds[2]) / 2, 7),
+        round((bounds[1] + bounds[3]) / 2, 7),
+        min(max_zoom, max(min_zoom, 14)),
+    ]
+
 
 def generate_xyz_tiles(
     ortho_path: str,
@@ -15,40 +618,126 @@ def generate_xyz_tiles(
     min_zoom: int = 10,
     max_zoom: int = 16,
     tile_size: int = 256,
+    bands: Optional[Sequence[int]] = None,
+    workers: int = 1,
+    resampling: str = "bilinear",
+    changed_bounds: Optional[Sequence[float]] = None,
+    previous_ortho: Optional[str] = None,
+    colormap: Optional[str] = None,
+    value_range: Optional[Tuple[float, float]] = None,
+    name: str = "pasture-biomass",
 ) -> str:
     """
     Generate XYZ tile pyramid from GeoTIFF.
-    Uses rasterio + rio-tiler or gdal2tiles.py in production.
+
+    bands selects the 1-based source bands rendered as RGB (default 3,2,1,
+    i.e. R,G,B for Blue/Green/Red/NIR mosaics; single-band rasters render
+    greyscale, or through `colormap`). value_range fixes the (min, max)
+    mapped onto the colour scale for every band instead of a 2–98%
+    stretch, so tiles are comparable across flights. Tiles are written
+    as {z}/{x}/{y}.png under output_dir, or
+    into a single de-duplicated MBTiles file when output_dir ends in
+    `.mbtiles` (TileJSON is then written next to it as
+    `<name>.tilejson.json` and mirrored into the MBTiles metadata table).
+
+    Passing changed_bounds (lon/lat west, south, east, north) or
+    previous_ortho (the mosaic the existing tiles were built from, diffed
+    against ortho_path) updates an existing pyramid in place instead of
+    rebuilding it. The update reuses the zoom range, bands, colour
+    stretch and colormap recorded in its TileJSON so refreshed tiles match
+    their neighbours.
     """
     try:
         import rasterio
-        from rasterio.warp import calculate_default_transform, reproject, Resampling
+        from rasterio.warp import transform_bounds
 
         out_path = Path(output_dir)
-        out_path.mkdir(parents=True, exist_ok=True)
+        mbtiles = is_mbtiles(output_dir)
+        work_dir = out_path.parent if mbtiles else out_path
+        work_dir.mkdir(parents=True, exist_ok=True)
+        tilejson_path = out_path.with_suffix(".tilejson.json") if mbtiles else out_path / "tilejson.json"
 
+        update = changed_bounds is not None or previous_ortho is not None
+        previous = None
+        if update:
+            if not tilejson_path.exists():
+                raise ValueError(f"No existing tile pyramid at {out_path} to update")
+            previous = json.loads(tilejson_path.read_text())
+            if "render" not in previous:
+                raise ValueError(f"{tilejson_path} has no render settings; rebuild the pyramid once")
+            if changed_bounds is None:
+                changed_bounds = diff_bounds(previous_ortho, ortho_path)
+                if changed_bounds is None:
+                    logger.info(f"{ortho_path} matches {previous_ortho}; tiles are up to date")
+                    return str(tilejson_path)
+            min_zoom, max_zoom = previous["minzoom"], previous["maxzoom"]
+            render = previous["render"]
+            bands, stretch, tile_size = tuple(render["bands"]), render["stretch"], render["tile_size"]
+            colormap = render.get("colormap")
+        elif colormap is not None:
+            colormap_lut(colormap)  # fail on a bad name before any work is done
+        if not update and mbtiles:
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{out_path}{suffix}").unlink(missing_ok=True)
+
+        changed_3857, change_range = None, None
         with rasterio.open(ortho_path) as src:
-            # Simplified: write one zoom level as placeholder
-            z = 14
-            (out_path / str(z) / "0" / "0").mkdir(parents=True, exist_ok=True)
-            # In production: use gdal2tiles or rio-tiler
-            # For demo: create TileJSON only
-            pass
-
-        tilejson_path = out_path / "tilejson.json"
+            if bands is None:
+                bands = (3, 2, 1) if src.count >= 3 else (1,)
+            if update:
+                mosaic = transform_bounds(src.crs, "EPSG:3857", *src.bounds, densify_pts=21)
+                changed = transform_bounds("EPSG:4326", "EPSG:3857", *changed_bounds, densify_pts=21)
+                # Never blank tiles outside the new mosaic's footprint
+                changed_3857 = (max(mosaic[0], changed[0]), max(mosaic[1], changed[1]),
+                                min(mosaic[2], changed[2]), min(mosaic[3], changed[3]))
+                if changed_3857[0] >= changed_3857[2] or changed_3857[1] >= changed_3857[3]:
+                    logger.info("Changed bounds do not overlap the mosaic; nothing to update")
+                    return str(tilejson_path)
+                change_range = tile_range(changed_3857, max_zoom)
+
+        mercator_path = work_dir / f".{out_path.stem}.mercator.tif" if mbtiles else work_dir / ".mercator.tif"
+        try:
+            base_range = reproject_to_mercator(
+                ortho_path, str(mercator_path), max_zoom, tile_size, resampling, tiles=change_range
+            )
+            if not update:
+                if value_range is not None:
+                    stretch = [tuple(map(float, value_range))] * len(bands)
+                else:
+                    stretch = compute_stretch(str(mercator_path), bands)
+            written = build_pyramid(
+                str(mercator_path), str(out_path), base_range, min_zoom, max_zoom,
+                bands, stretch, tile_size=tile_size, workers=workers, changed_3857=changed_3857,
+                colormap=colormap,
+            )
+            bounds = _lonlat_bounds(str(mercator_path))
+        finally:
+            mercator_path.unlink(missing_ok=True)
+        verb = "Updated" if update else "Wrote"
+        logger.info(f"{verb} {sum(len(t) for t in written.values())} tiles in {out_path}")
+
+        if previous is not None:
+            old = previous["bounds"]
+            bounds = [min(old[0], bounds[0]), min(old[1], bounds[1]), max(old[2], bounds[2]), max(old[3], bounds[3])]
         base_url = f"/api/v1/tiles/{{pasture_id}}/{{z}}/{{x}}/{{y}}.png"
         tilejson = {
             "tilejson": "2.2.0",
-            "name": "pasture-biomass",
+            "name": previous["name"] if previous is not None else name,
             "tiles": [base_url],
             "minzoom": min_zoom,
             "maxzoom": max_zoom,
             "format": "png",
+            "bounds": bounds,
+            "center": _center(bounds, min_zoom, max_zoom),
+            # Needed to update the pyramid in place with matching colours
+            "render": {
+                "bands": list(bands),
+                "stretch": [list(s) for s in stretch],
+                "colormap": colormap,
+                "tile_size": tile_size,
+            },
         }
-        with open(tilejson_path, "w") as f:
-            json.dump(tilejson, f, indent=2)
-        logger.info(f"TileJSON: {tilejson_path}")
-        return str(tilejson_path)
+        return str(_write_tile_metadata(out_path, tilejson))
     except ImportError:
         logger.warning("rasterio not installed")
         return ""
@@ -77,6 +766,18 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--ortho", required=True, help="Input orthomosaic GeoTIFF")
-    parser.add_argument("--out", required=True, help="Output tiles directory")
+    parser.add_argument("--out", required=True, help="Output tiles directory, or a .mbtiles file")
+    parser.add_argument("--min-zoom", type=int, default=10, help="Lowest zoom level")
+    parser.add_argument("--max-zoom", type=int, default=16, help="Highest (native) zoom level")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Rendering processes")
+    parser.add_argument("--changed-bounds", type=float, nargs=4, metavar=("WEST", "SOUTH", "EAST", "NORTH"),
+                        help="Update existing tiles in place for this lon/lat area only")
+    parser.add_argument("--previous-ortho", help="Update existing tiles where --ortho differs from this mosaic")
+    parser.add_argument("--colormap", choices=sorted(COLORMAPS), help="Colour-map a single-band raster")
+    parser.add_argument("--value-range", type=float, nargs=2, metavar=("MIN", "MAX"),
+                        help="Fixed value range mapped onto the colour scale (default: 2-98%% stretch)")
     args = parser.parse_args()
-    generate_xyz_tiles(args.ortho, args.out)
+    generate_xyz_tiles(args.ortho, args.out, args.min_zoom, args.max_zoom, workers=args.workers,
+                       bands=(1,) if args.colormap else None,
+                       changed_bounds=args.changed_bounds, previous_ortho=args.previous_ortho,
+                       colormap=args.colormap, value_range=args.value_range)
@@ -0,0 +1,137 @@
+"""
+Dynamic micro-batching for model inference.
+
+Concurrent single-tile requests are queued and coalesced: a batch is closed
+when it reaches max_batch_size or max_wait_ms after its first request
+arrived, whichever comes first, then run as one batched forward pass and
+the per-tile outputs are handed back through futures. Under load this
+trades at most max_wait_ms of latency for far fewer, larger forwards; a
+lone request waits no longer than max_wait_ms.
+
+Batches are run by a fixed set of model worker threads. PyTorch's intra-op
+thread count is process-wide, so it is set to threads_per_worker so that
+workers x threads_per_worker matches the cores instead of every concurrent
+forward trying to use all of them.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+
+class MicroBatcher:
+    """Coalesces submitted C x H x W inputs into batched calls of model_getter()."""
+
+    def __init__(
+        self,
+        model_getter: Callable,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        workers: int = 1,
+        threads_per_worker: Optional[int] = None,
+    ):
+        self.model_getter = model_getter
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.workers = max(1, int(workers))
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            torch.set_num_threads(self.threads_per_worker)
+            self._threads = [
+                threading.Thread(target=self._loop, name=f"model-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def backlog(self) -> int:
+        """Inputs queued and not yet picked up by a worker."""
+        return self._queue.qsize()
+
+    def submit(self, x: np.ndarray, model=None) -> Future:
+        """
+        Queue one input for `model` (default: model_getter() at run time);
+        the future resolves to its H x W prediction. Only inputs for the
+        same model are batched together.
+        """
+        self.start()
+        fut: Future = Future()
+        self._queue.put((x, model, fut))
+        return fut
+
+    def _collect(self, first) -> Tuple[List, bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _loop(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            self._run(batch)
+
+    def _run(self, batch: List) -> None:
+        # Edge tiles can differ in shape; each (model, shape) is one forward pass
+        groups: Dict[Tuple, List] = {}
+        models = {}
+        for x, model, fut in batch:
+            if fut.set_running_or_notify_cancel():
+                models[id(model)] = model
+                groups.setdefault((id(model), x.shape), []).append((x, fut))
+        for (model_id, _), items in groups.items():
+            model = models[model_id] if models[model_id] is not None else self.model_getter()
+            try:
+                with torch.no_grad():
+                    out = model(torch.from_numpy(np.stack([x for x, _ in items])))
+                out = out.reshape(len(items), *items[0][0].shape[-2:]).numpy()
+            except Exception as e:
+                for _, fut in items:
+                    fut.set_exception(e)
+                continue
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(items)
+            for (_, fut), pred in zip(items, out):
+                fut.set_result(pred)
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
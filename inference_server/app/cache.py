@@ -0,0 +1,149 @@
+"""
+Size-bounded LRU cache with optional on-disk spillover.
+
+Entries are evicted least-recently-used first once the summed size of the
+cached values exceeds max_bytes. With a spill directory, evicted entries
+are pickled there (itself bounded by spill_max_bytes) and promoted back
+into memory on their next hit, so a restart-free working set larger than
+RAM still avoids recomputation.
+"""
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class ByteLRUCache:
+    def __init__(
+        self,
+        max_bytes: int,
+        sizeof: Callable[[Any], int],
+        spill_dir: Optional[str] = None,
+        spill_max_bytes: int = 0,
+    ):
+        self.max_bytes = int(max_bytes)
+        self.sizeof = sizeof
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.spill_max_bytes = int(spill_max_bytes)
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._spilled: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.spill_bytes = 0
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _spill_path(self, key: Hashable) -> Path:
+        return self.spill_dir / f"{hashlib.sha1(repr(key).encode()).hexdigest()}.pkl"
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            spilled = key in self._spilled
+            if not spilled:
+                self.misses += 1
+                return None
+            self.spill_bytes -= self._spilled.pop(key)
+        try:
+            path = self._spill_path(key)
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            path.unlink(missing_ok=True)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.spill_hits += 1
+        self.put(key, value)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._sizes[key]
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                old_key, old_value = self._entries.popitem(last=False)
+                self.bytes -= self._sizes.pop(old_key)
+                self.evictions += 1
+                evicted.append((old_key, old_value))
+        if self.spill_dir is not None:
+            for old_key, old_value in evicted:
+                self._spill(old_key, old_value)
+
+    def _spill(self, key: Hashable, value: Any) -> None:
+        path = self._spill_path(key)
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        size = path.stat().st_size
+        drop = []
+        with self._lock:
+            self._spilled[key] = size
+            self.spill_bytes += size
+            while self.spill_bytes > self.spill_max_bytes and self._spilled:
+                old_key, old_size = self._spilled.popitem(last=False)
+                self.spill_bytes -= old_size
+                drop.append(old_key)
+        for old_key in drop:
+            self._spill_path(old_key).unlink(missing_ok=True)
+
+    def evict_if(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry (in memory or spilled) whose key matches; returns how many."""
+        with self._lock:
+            keys = [k for k in self._entries if predicate(k)]
+            for k in keys:
+                del self._entries[k]
+                self.bytes -= self._sizes.pop(k)
+            spilled = [k for k in self._spilled if predicate(k)]
+            for k in spilled:
+                self.spill_bytes -= self._spilled.pop(k)
+        for k in spilled:
+            self._spill_path(k).unlink(missing_ok=True)
+        return len(keys) + len(spilled)
+
+    def clear(self) -> None:
+        with self._lock:
+            spilled = list(self._spilled)
+            self._entries.clear()
+            self._sizes.clear()
+            self._spilled.clear()
+            self.bytes = self.spill_bytes = 0
+        for key in spilled:
+            self._spill_path(key).unlink(missing_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        return {
+            "hits": self.hits,
+            "spill_hits": self.spill_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "spilled_entries": len(self._spilled),
+            "spill_bytes": self.spill_bytes,
+        }
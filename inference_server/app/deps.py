@@ -1,7 +1,77 @@
 """
 Dependency injection for FastAPI.
 """
+import os
 from pathlib import Path
 
 def get_model_path() -> str:
-    return "runs/biomass_model_ts.pt"
+    return os.environ.get("PASTURE_MODEL_PATH", "runs/biomass_model_ts.pt")
+
+
+def get_model_backend() -> str:
+    """PASTURE_MODEL_BACKEND: torchscript or onnx; empty infers it from the model file suffix."""
+    return os.environ.get("PASTURE_MODEL_BACKEND", "")
+
+
+def get_model_optimize_settings() -> dict:
+    """
+    TorchScript load-time preparation: channels-last memory format
+    (PASTURE_MODEL_CHANNELS_LAST, on by default) and
+    torch.jit.optimize_for_inference (PASTURE_MODEL_OPTIMIZE, off by default).
+    """
+    return {
+        "channels_last": os.environ.get("PASTURE_MODEL_CHANNELS_LAST", "1") != "0",
+        "optimize": os.environ.get("PASTURE_MODEL_OPTIMIZE", "0") == "1",
+    }
+
+
+def get_default_model_version() -> str:
+    """Version name the startup model is served (and reported) as."""
+    return os.environ.get("PASTURE_MODEL_VERSION", "v3.2-ts")
+
+
+def get_model_watch_settings() -> dict:
+    """File-watch hot-swap of the startup model; off unless PASTURE_MODEL_WATCH_S is set."""
+    interval = os.environ.get("PASTURE_MODEL_WATCH_S")
+    return {"enabled": bool(interval), "interval_s": float(interval or 5)}
+
+
+def get_admin_token() -> str:
+    """Shared secret for /api/v1/admin endpoints (X-Admin-Token); unset disables those endpoints."""
+    return os.environ.get("PASTURE_ADMIN_TOKEN", "")
+
+
+def get_tiles_dir() -> str:
+    return os.environ.get("PASTURE_TILES_DIR", "/data/tiles")
+
+
+def get_orthos_dir() -> str:
+    return os.environ.get("PASTURE_ORTHOS_DIR", "/data/orthos")
+
+
+def get_executor_settings() -> dict:
+    threads = os.environ.get("PASTURE_THREADS_PER_WORKER")
+    return {
+        "workers": int(os.environ.get("PASTURE_MODEL_WORKERS", "1")),
+        "threads_per_worker": int(threads) if threads else None,
+        "io_workers": int(os.environ.get("PASTURE_IO_WORKERS", "4")),
+        "max_batch_size": int(os.environ.get("PASTURE_BATCH_MAX_SIZE", "16")),
+        "max_wait_ms": float(os.environ.get("PASTURE_BATCH_MAX_WAIT_MS", "5")),
+        "max_pending": int(os.environ.get("PASTURE_MAX_PENDING", "64")),
+        "retry_after_s": int(os.environ.get("PASTURE_RETRY_AFTER_S", "1")),
+    }
+
+
+def get_prediction_cache_settings() -> dict:
+    return {
+        "max_bytes": int(float(os.environ.get("PASTURE_PREDICTION_CACHE_MB", "64")) * 2**20),
+        "spill_dir": os.environ.get("PASTURE_PREDICTION_CACHE_SPILL_DIR") or None,
+        "spill_max_bytes": int(float(os.environ.get("PASTURE_PREDICTION_CACHE_SPILL_MB", "512")) * 2**20),
+    }
+
+
+def get_tile_read_settings() -> dict:
+    return {
+        "max_open": int(os.environ.get("PASTURE_DATASET_POOL_SIZE", "32")),
+        "cache_bytes": int(float(os.environ.get("PASTURE_TILE_CACHE_MB", "256")) * 2**20),
+    }
@@ -0,0 +1,143 @@
+"""
+Dedicated inference executor: bounded admission in front of tile I/O and
+batched model inference.
+
+Tile reads run on their own small thread pool and forwards on the
+MicroBatcher's model workers, so neither competes with the event loop or
+with FastAPI's general threadpool. At most max_pending requests are
+admitted at once; beyond that requests fail fast with Overloaded (served as
+503 + Retry-After) instead of queueing until every request times out.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .batcher import MicroBatcher
+
+
+class Overloaded(Exception):
+    """Raised when the admission queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    def __init__(
+        self,
+        model_getter: Callable,
+        workers: int = 1,
+        threads_per_worker: Optional[int] = None,
+        io_workers: int = 4,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        max_pending: int = 64,
+        retry_after_s: int = 1,
+    ):
+        self.batcher = MicroBatcher(
+            model_getter, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+            workers=workers, threads_per_worker=threads_per_worker,
+        )
+        self.io_workers = max(1, int(io_workers))
+        self._io: Optional[ThreadPoolExecutor] = None
+        self.max_pending = max(1, int(max_pending))
+        self.retry_after_s = int(retry_after_s)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+
+    def _io_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._io is None:
+                self._io = ThreadPoolExecutor(self.io_workers, thread_name_prefix="tile-io")
+            return self._io
+
+    @contextmanager
+    def admit(self, n: int = 1):
+        """
+        Hold n admission slots (one per model input) for the duration of a
+        request, or raise Overloaded. n is capped at max_pending so a large
+        batch can still run on an otherwise idle server.
+        """
+        n = min(max(0, int(n)), self.max_pending)
+        with self._lock:
+            if n and self.pending + n > self.max_pending:
+                self.rejected += 1
+                raise Overloaded(self.retry_after_s)
+            self.pending += n
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.pending -= n
+
+    async def run_io(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io_pool(), fn, *args)
+
+    async def infer(self, x: np.ndarray, model=None) -> np.ndarray:
+        return await asyncio.wrap_future(self.batcher.submit(x, model))
+
+    async def predict(self, load_fn: Callable, *args, model=None) -> np.ndarray:
+        """Admit, load the model input with load_fn(*args) on the I/O pool, then run it batched."""
+        with self.admit():
+            x = await self.run_io(load_fn, *args)
+            return await self.infer(x, model)
+
+    async def _predict_one(self, load_fn: Callable, args: Tuple, model):
+        try:
+            x = await self.run_io(load_fn, *args)
+            return await self.infer(x, model)
+        except Exception as e:  # reported per item, the rest of the batch goes on
+            return e
+
+    async def predict_many(
+        self, load_fn: Callable, jobs: Sequence[Tuple], model=None, chunk_size: Optional[int] = None
+    ) -> AsyncIterator[List[Tuple]]:
+        """
+        Predict many inputs (e.g. a viewport's tiles), yielding [(args,
+        prediction or exception), ...] one chunk at a time, in order.
+
+        A chunk is max_batch_size jobs whose reads run concurrently on the
+        I/O pool and whose inputs reach the batcher together, so each chunk
+        is one forward pass. The next chunk's reads are already running
+        while the current one is inferred. Admission is the caller's job
+        (admit(len(jobs)), taken before any output).
+        """
+        size = chunk_size or self.batcher.max_batch_size
+        chunks = [list(jobs[i:i + size]) for i in range(0, len(jobs), size)]
+
+        def start(chunk):
+            return asyncio.ensure_future(asyncio.gather(*(self._predict_one(load_fn, a, model) for a in chunk)))
+
+        ahead = start(chunks[0]) if chunks else None
+        try:
+            for i, chunk in enumerate(chunks):
+                current = ahead
+                ahead = start(chunks[i + 1]) if i + 1 < len(chunks) else None
+                yield list(zip(chunk, await current))
+        finally:
+            # Client gone mid-stream: don't leave the prefetched chunk running
+            if ahead is not None:
+                ahead.cancel()
+
+    def shutdown(self) -> None:
+        self.batcher.stop()
+        with self._lock:
+            io, self._io = self._io, None
+        if io is not None:
+            io.shutdown(wait=True)
+
+    def stats(self) -> Dict:
+        return {
+            **self.batcher.stats(),
+            "workers": self.batcher.workers,
+            "threads_per_worker": self.batcher.threads_per_worker,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+        }
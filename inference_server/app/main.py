@@ -1,21 +1,66 @@
 """
 PastureAI Inference API: predict, tiles, simulate, audit.
 """
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
-from pydantic import BaseModel
+import hmac
+import json
+from contextlib import ExitStack
+from typing import List, Optional
+
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
 from pathlib import Path
 
-from .predict import predict_patch, load_model, get_model
-from .deps import get_model_path
+from .executor import InferenceExecutor, Overloaded
+from .predict import (
+    MAX_ZOOM, bbox_tile_count, cache_predictions, cached_predictions, dataset_pool, is_valid_tile, load_model,
+    get_model, get_registry, get_served_model, load_tile_input, mock_prediction, prediction_cache,
+    summarize_prediction, tile_cache, tiles_in_bbox,
+)
+from .deps import (
+    get_admin_token, get_default_model_version, get_executor_settings, get_model_backend, get_model_path,
+    get_model_watch_settings, get_tiles_dir,
+)
+from .registry import ModelWatcher
+from .tiles import get_pool
 
 app = FastAPI(title="PastureAI Inference")
+executor = InferenceExecutor(get_model, **get_executor_settings())
+# ONNX sessions get the same per-worker thread budget as TorchScript forwards
+get_registry().threads = executor.batcher.threads_per_worker
+watcher: Optional[ModelWatcher] = None
+
+# Upper bound on tiles per /api/v1/predict/batch request (a large viewport is ~60)
+MAX_BATCH_TILES = 256
 
 
 @app.on_event("startup")
 def startup():
+    global watcher
     path = get_model_path()
     load_model(path)
+    watch = get_model_watch_settings()
+    if watch["enabled"]:
+        watcher = ModelWatcher(get_registry(), path, get_default_model_version(), watch["interval_s"],
+                               backend=get_model_backend() or None)
+        watcher.start()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    if watcher is not None:
+        watcher.stop()
+    executor.shutdown()
+    dataset_pool.close()
+
+
+@app.exception_handler(Overloaded)
+def overloaded(request: Request, exc: Overloaded):
+    return JSONResponse(
+        {"detail": str(exc)}, status_code=503, headers={"Retry-After": str(exc.retry_after)}
+    )
 
 
 class PredictRequest(BaseModel):
@@ -24,36 +69,211 @@ class PredictRequest(BaseModel):
     tile_x: int
     tile_y: int
     sources: list = ["satellite"]
+    # Served model version; the default version when omitted
+    model_version: Optional[str] = None
 
 
 @app.post("/api/v1/predict")
-def predict(req: PredictRequest):
-    model = get_model()
+async def predict(req: PredictRequest):
+    tile = (req.pasture_id, req.tile_z, req.tile_x, req.tile_y)
+    # Resolved once, so a hot-swap mid-request cannot mix model versions
+    served = get_served_model(req.model_version)
+    if served is None and req.model_version is not None:
+        raise HTTPException(404, f"Model version {req.model_version!r} is not loaded")
     try:
-        result = predict_patch(
-            model,
-            req.pasture_id,
-            req.tile_z,
-            req.tile_x,
-            req.tile_y,
-            req.sources,
-        )
+        if served is None:
+            return JSONResponse(mock_prediction(*tile))
+        # Cache key (source stat) and cache I/O, tile I/O and the (batched)
+        # forward pass all run on the inference executor, not the event loop
+        [(key, result)] = await executor.run_io(cached_predictions, [tile], served.version_id)
+        if result is None:
+            pred = await executor.predict(load_tile_input, *tile, model=served.model)
+            result = summarize_prediction(pred, *tile, served.name)
+            await executor.run_io(cache_predictions, [(key, result)])
         return JSONResponse(result)
+    except Overloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class BatchPredictRequest(BaseModel):
+    pasture_id: str
+    # [[z, x, y], ...]; or bbox + zoom
+    tiles: Optional[List[List[int]]] = None
+    # [west, south, east, north] in lon/lat
+    bbox: Optional[List[float]] = None
+    zoom: Optional[int] = Field(None, ge=0, le=MAX_ZOOM)
+    model_version: Optional[str] = None
+
+
+def _ndjson(result: dict) -> str:
+    return json.dumps(result) + "\n"
+
+
+@app.post("/api/v1/predict/batch")
+async def predict_batch(req: BatchPredictRequest):
+    """
+    Predict many tiles of one pasture (e.g. a map viewport) in one request.
+
+    Results are streamed as NDJSON, one /api/v1/predict result per line:
+    cached tiles first, then each batched forward pass's tiles as soon as it
+    finishes. A tile that fails yields {"pastureId", "tile", "error"}
+    instead of aborting the stream. Every uncached tile takes an admission
+    slot, so a saturated server answers 503 before streaming starts.
+    """
+    # Sized before any tile list is built, so an oversized bbox is cheap to refuse
+    if req.tiles is not None:
+        count = len(req.tiles)
+    elif req.bbox is not None and req.zoom is not None:
+        if len(req.bbox) != 4:
+            raise HTTPException(422, "bbox must be [west, south, east, north]")
+        count = bbox_tile_count(req.bbox, req.zoom)
+    else:
+        raise HTTPException(422, "Provide tiles, or bbox and zoom")
+    if count > MAX_BATCH_TILES:
+        raise HTTPException(413, f"{count} tiles requested; at most {MAX_BATCH_TILES} per request")
+    if req.tiles is not None:
+        if any(len(t) != 3 or not is_valid_tile(*t) for t in req.tiles):
+            raise HTTPException(422, f"tiles must be [z, x, y] with 0 <= z <= {MAX_ZOOM} and 0 <= x, y < 2**z")
+        tiles = [tuple(t) for t in req.tiles]
+    else:
+        tiles = tiles_in_bbox(req.bbox, req.zoom)
+    served = get_served_model(req.model_version)
+    if served is None and req.model_version is not None:
+        raise HTTPException(404, f"Model version {req.model_version!r} is not loaded")
+    jobs = [(req.pasture_id, *tile) for tile in tiles]
+
+    if served is None:
+        return StreamingResponse((_ndjson(mock_prediction(*job)) for job in jobs), media_type="application/x-ndjson")
+
+    lookups = await executor.run_io(cached_predictions, jobs, served.version_id)
+    misses = [(job, key) for job, (key, result) in zip(jobs, lookups) if result is None]
+    slot = ExitStack()
+    slot.enter_context(executor.admit(len(misses)))  # Overloaded -> 503 before any output
+
+    async def stream():
+        with slot:
+            for _, result in lookups:
+                if result is not None:
+                    yield _ndjson(result)
+            keys = iter(key for _, key in misses)  # chunks come back in job order
+            async for chunk in executor.predict_many(load_tile_input, [job for job, _ in misses], model=served.model):
+                lines, fresh = [], []
+                for job, pred in chunk:
+                    key = next(keys)
+                    if isinstance(pred, Exception):
+                        pasture_id, z, x, y = job
+                        lines.append(_ndjson({"pastureId": pasture_id, "tile": {"z": z, "x": x, "y": y},
+                                              "error": str(pred)}))
+                        continue
+                    result = summarize_prediction(pred, *job, served.name)
+                    fresh.append((key, result))
+                    lines.append(_ndjson(result))
+                await executor.run_io(cache_predictions, fresh)
+                yield "".join(lines)
+
+    # Also release the slot if the stream is never consumed
+    return StreamingResponse(stream(), media_type="application/x-ndjson", background=BackgroundTask(slot.close))
+
+
+class LoadModelRequest(BaseModel):
+    path: str
+    version: str
+    # Make this the version served to requests without model_version
+    default: bool = False
+    # torchscript or onnx; inferred from the file suffix when omitted
+    backend: Optional[str] = None
+
+
+def _check_admin(token: Optional[str]) -> None:
+    expected = get_admin_token()
+    if not expected:
+        raise HTTPException(403, "Admin endpoints are disabled (PASTURE_ADMIN_TOKEN is not set)")
+    if token is None or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(403, "Invalid admin token")
+
+
+@app.get("/api/v1/admin/models")
+def list_models(x_admin_token: Optional[str] = Header(None)):
+    _check_admin(x_admin_token)
+    registry = get_registry()
+    return {"default": registry.default, "models": registry.versions()}
+
+
+@app.post("/api/v1/admin/models")
+async def load_model_version(req: LoadModelRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Load (or replace) a model version: the file is loaded and warmed up off
+    the event loop while the current versions keep serving, then switched
+    in atomically.
+    """
+    _check_admin(x_admin_token)
+    if not Path(req.path).exists():
+        raise HTTPException(404, f"Model file not found: {req.path}")
+    registry = get_registry()
+    try:
+        served = await run_in_threadpool(registry.load, req.path, req.version, req.default, backend=req.backend)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Failed to load model: {e}")
+    return {"version": served.name, "version_id": served.version_id, "backend": served.backend,
+            "default": registry.default == served.name}
+
+
+@app.delete("/api/v1/admin/models/{version}")
+def unload_model_version(version: str, x_admin_token: Optional[str] = Header(None)):
+    _check_admin(x_admin_token)
+    try:
+        removed = get_registry().remove(version)
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+    if not removed:
+        raise HTTPException(404, f"Model version {version!r} is not loaded")
+    return {"removed": version}
+
+
 @app.get("/api/v1/tiles/{pasture_id}/{z}/{x}/{y}.tif")
 def get_tile(pasture_id: str, z: int, x: int, y: int):
-    path = Path(f"/data/tiles/{pasture_id}/{z}/{x}/{y}.tif")
+    path = Path(get_tiles_dir()) / pasture_id / str(z) / str(x) / f"{y}.tif"
     if not path.exists():
         raise HTTPException(404, "Tile not found")
     return FileResponse(path)
 
 
+@app.get("/api/v1/tiles/{pasture_id}/{z}/{x}/{y}.png")
+def get_png_tile(pasture_id: str, z: int, x: int, y: int, request: Request):
+    """
+    Rendered map tile, served from <tiles_dir>/<pasture_id>.mbtiles when
+    present, otherwise from a <tiles_dir>/<pasture_id>/{z}/{x}/{y}.png tree.
+    """
+    tiles_dir = Path(get_tiles_dir())
+    pool = get_pool(str(tiles_dir / f"{pasture_id}.mbtiles"))
+    if pool is None:
+        path = tiles_dir / pasture_id / str(z) / str(x) / f"{y}.png"
+        if not path.exists():
+            raise HTTPException(404, "Tile not found")
+        return FileResponse(path, media_type="image/png")
+
+    tile = pool.get_tile(z, x, y)
+    if tile is None:
+        raise HTTPException(404, "Tile not found")
+    data, etag = tile
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "public, max-age=3600"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="image/png", headers=headers)
+
+
 @app.get("/api/v1/health")
 def health():
-    return {"status": "ok", "model_loaded": get_model() is not None}
+    return {
+        "status": "ok",
+        "model_loaded": get_model() is not None,
+        "models": get_registry().versions(),
+        "inference": executor.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "tile_reads": {"datasets": dataset_pool.stats(), "cache": tile_cache.stats()},
+    }
 
 
 if __name__ == "__main__":
@@ -1,65 +1,194 @@
 """
 Image2Biomass inference: TorchScript model prediction per tile.
 """
+import json
+import math
 import torch
 import numpy as np
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
 
-_MODEL: Optional[torch.ScriptModule] = None
+from .cache import ByteLRUCache
+from .deps import (
+    get_default_model_version, get_model_backend, get_model_optimize_settings, get_orthos_dir,
+    get_prediction_cache_settings, get_tile_read_settings,
+)
+from .rasters import DatasetPool
+from .registry import ModelRegistry, ServedModel
 
+# Tile responses keyed by tile, source file state and model version
+prediction_cache = ByteLRUCache(
+    sizeof=lambda result: len(json.dumps(result)), **get_prediction_cache_settings()
+)
 
-def load_model(path: str) -> torch.ScriptModule:
-    global _MODEL
+
+def _retire(old: ServedModel) -> None:
+    """Drop cached predictions of a model version that has been replaced or removed."""
+    prediction_cache.evict_if(lambda key: key[-1] == old.version_id)
+
+
+# Model versions being served; the default answers requests without model_version
+registry = ModelRegistry(on_retire=_retire, **get_model_optimize_settings())
+
+_tile_read = get_tile_read_settings()
+# Open source GeoTIFFs, and their decoded (read-only) arrays keyed by path and file state
+dataset_pool = DatasetPool(max_open=_tile_read["max_open"])
+tile_cache = ByteLRUCache(max_bytes=_tile_read["cache_bytes"], sizeof=lambda entry: entry[0].nbytes)
+
+
+def load_model(
+    path: str, name: Optional[str] = None, make_default: bool = True, backend: Optional[str] = None
+) -> torch.ScriptModule:
+    """
+    Load (and warm up) the model at path as version `name` (default:
+    PASTURE_MODEL_VERSION) and switch to it atomically. backend is
+    "torchscript" or "onnx" (ONNX Runtime); by default PASTURE_MODEL_BACKEND,
+    else inferred from the file suffix.
+    """
     p = Path(path)
     if not p.exists():
         return None
-    _MODEL = torch.jit.load(str(p), map_location="cpu")
-    _MODEL.eval()
-    return _MODEL
+    served = registry.load(str(p), name or get_default_model_version(), make_default=make_default,
+                           backend=backend or get_model_backend() or None)
+    return served.model
+
+
+def get_registry() -> ModelRegistry:
+    return registry
+
+
+def get_served_model(name: Optional[str] = None) -> Optional[ServedModel]:
+    return registry.get(name)
+
+
+def get_model(name: Optional[str] = None):
+    served = registry.get(name)
+    return served.model if served is not None else None
+
+
+def get_model_version(name: Optional[str] = None) -> Optional[str]:
+    served = registry.get(name)
+    return served.version_id if served is not None else None
+
+
+# Deepest web-mercator zoom accepted from clients
+MAX_ZOOM = 24
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    """Whether z/x/y is a tile of the web-mercator grid (0 <= z <= MAX_ZOOM, 0 <= x, y < 2**z)."""
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def bbox_tile_range(bbox: Sequence[float], zoom: int) -> Tuple[int, int, int, int]:
+    """Inclusive (x0, y0, x1, y1) XYZ tile range covering a (west, south, east, north) lon/lat bbox."""
+    west, south, east, north = bbox
+    n = 2 ** zoom
+
+    def tile_xy(lon, lat):
+        lat = max(min(lat, 85.0511287798), -85.0511287798)
+        x = (lon + 180.0) / 360.0 * n
+        y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+        return min(max(int(x), 0), n - 1), min(max(int(y), 0), n - 1)
+
+    x0, y0 = tile_xy(west, north)
+    x1, y1 = tile_xy(east, south)
+    return x0, y0, x1, y1
+
+
+def bbox_tile_count(bbox: Sequence[float], zoom: int) -> int:
+    """Number of tiles tiles_in_bbox would return, without building the list."""
+    x0, y0, x1, y1 = bbox_tile_range(bbox, zoom)
+    return max(0, x1 - x0 + 1) * max(0, y1 - y0 + 1)
+
+
+def tiles_in_bbox(bbox: Sequence[float], zoom: int) -> List[Tuple[int, int, int]]:
+    """XYZ (z, x, y) tiles of the web-mercator grid intersecting a (west, south, east, north) lon/lat bbox."""
+    x0, y0, x1, y1 = bbox_tile_range(bbox, zoom)
+    return [(zoom, x, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+
+def tile_source_path(pasture_id: str, z: int, x: int, y: int) -> Path:
+    return Path(get_orthos_dir()) / pasture_id / str(z) / str(x) / f"{y}.tif"
+
+
+def source_signature(path: Path) -> Tuple:
+    """(mtime_ns, size) of a tile source, or ('synthetic',) when it does not exist."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return ("synthetic",)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def prediction_key(pasture_id: str, z: int, x: int, y: int, version_id: str) -> Hashable:
+    """Cache key for a tile prediction; changes when the source file or the model changes."""
+    return (pasture_id, z, x, y, source_signature(tile_source_path(pasture_id, z, x, y)), version_id)
+
 
+def cached_predictions(jobs: Sequence[Tuple], version_id: str) -> List[Tuple[Hashable, Optional[Dict]]]:
+    """
+    (cache key, cached result or None) for each (pasture_id, z, x, y) job.
+    Stats the tile sources and may unpickle spilled entries from disk, so
+    callers on the event loop run it on the I/O pool.
+    """
+    return [(key, prediction_cache.get(key)) for key in (prediction_key(*job, version_id) for job in jobs)]
 
-def get_model():
-    return _MODEL
+
+def cache_predictions(entries: Sequence[Tuple[Hashable, Dict]]) -> None:
+    """Store (cache key, result) pairs; may spill to disk, so keep it off the event loop."""
+    for key, result in entries:
+        prediction_cache.put(key, result)
 
 
 def read_tile_image(pasture_id: str, z: int, x: int, y: int):
-    """Load tile GeoTIFF from local storage or S3. Placeholder for demo."""
-    tile_path = Path(f"/data/orthos/{pasture_id}/{z}/{x}/{y}.tif")
-    if not tile_path.exists():
+    """
+    Load tile GeoTIFF from local storage or S3. Placeholder for demo.
+
+    Decoded tiles are served from tile_cache while the file is unchanged;
+    misses read through a pooled, already-open dataset handle. The returned
+    array is shared and read-only.
+    """
+    tile_path = tile_source_path(pasture_id, z, x, y)
+    signature = source_signature(tile_path)
+    if signature == ("synthetic",):
         # Fallback: synthetic for demo
         arr = np.random.rand(4, 256, 256).astype("float32") * 8000
         return arr, None
-    import rasterio
-    with rasterio.open(tile_path) as src:
-        arr = src.read()
+    key = (str(tile_path), signature)
+    cached = tile_cache.get(key)
+    if cached is not None:
+        return cached
+    with dataset_pool.borrow(str(tile_path), signature) as src:
+        arr = src.read().astype("float32")
         transform = src.transform
-    return arr.astype("float32"), transform
+    arr.setflags(write=False)
+    tile_cache.put(key, (arr, transform))
+    return arr, transform
 
 
-def predict_patch(
-    model, pasture_id: str, z: int, x: int, y: int, sources: list = None
-) -> Dict:
-    if model is None:
-        # Mock response when model not loaded
-        mean = 2.5 + np.random.randn() * 0.5
-        std = 0.3
-        return {
-            "pastureId": pasture_id,
-            "tile": {"z": z, "x": x, "y": y},
-            "biomass_mean_t_ha": round(mean, 2),
-            "biomass_std_t_ha": round(std, 2),
-            "model_version": "mock",
-        }
-
-    img, transform = read_tile_image(pasture_id, z, x, y)
-    img = img / 10000.0
-    t = torch.from_numpy(img).unsqueeze(0)
+def load_tile_input(pasture_id: str, z: int, x: int, y: int) -> np.ndarray:
+    """Model input for a tile: C x H x W reflectance (DN / 10000) as float32."""
+    img, _ = read_tile_image(pasture_id, z, x, y)
+    return (img / 10000.0).astype("float32")
+
+
+def mock_prediction(pasture_id: str, z: int, x: int, y: int) -> Dict:
+    mean = 2.5 + np.random.randn() * 0.5
+    std = 0.3
+    return {
+        "pastureId": pasture_id,
+        "tile": {"z": z, "x": x, "y": y},
+        "biomass_mean_t_ha": round(mean, 2),
+        "biomass_std_t_ha": round(std, 2),
+        "model_version": "mock",
+    }
 
-    with torch.no_grad():
-        pred = model(t)
-        pred = pred.squeeze(0).numpy()
 
+def summarize_prediction(
+    pred: np.ndarray, pasture_id: str, z: int, x: int, y: int, model_version: str = "v3.2-ts"
+) -> Dict:
+    """API response for one tile's H x W biomass prediction."""
     mean = float(np.mean(pred))
     std = float(np.std(pred))
     return {
@@ -67,5 +196,21 @@ def predict_patch(
         "tile": {"z": z, "x": x, "y": y},
         "biomass_mean_t_ha": round(mean, 2),
         "biomass_std_t_ha": round(std, 2),
-        "model_version": "v3.2-ts",
+        "model_version": model_version,
     }
+
+
+def predict_patch(
+    model, pasture_id: str, z: int, x: int, y: int, sources: list = None
+) -> Dict:
+    if model is None:
+        # Mock response when model not loaded
+        return mock_prediction(pasture_id, z, x, y)
+
+    t = torch.from_numpy(load_tile_input(pasture_id, z, x, y)).unsqueeze(0)
+
+    with torch.no_grad():
+        pred = model(t)
+        pred = pred.squeeze(0).numpy()
+
+    return summarize_prediction(pred, pasture_id, z, x, y, get_default_model_version())
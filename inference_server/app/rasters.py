@@ -0,0 +1,76 @@
+"""
+Pooled rasterio dataset handles for tile reads.
+
+Opening a GeoTIFF (GDAL driver probing, header and IFD parsing) costs more
+than decoding a small tile, so open handles are kept and reused. A handle
+is borrowed by one thread at a time (rasterio datasets are not safe for
+concurrent use) and returned afterwards; idle handles beyond max_open are
+closed least-recently-used first. Handles are keyed by the file's
+(mtime, size) as well as its path, so a rewritten file is reopened.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Hashable, List, Tuple
+
+
+class DatasetPool:
+    def __init__(self, max_open: int = 32):
+        self.max_open = max(1, int(max_open))
+        self._idle: "OrderedDict[Tuple[str, Hashable], List]" = OrderedDict()
+        self._n_idle = 0
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    @contextmanager
+    def borrow(self, path: str, signature: Hashable = None):
+        """Exclusive use of an open dataset for path (opened if no idle handle exists)."""
+        import rasterio
+
+        key = (path, signature)
+        ds = None
+        with self._lock:
+            handles = self._idle.get(key)
+            if handles:
+                ds = handles.pop()
+                self._n_idle -= 1
+                if not handles:
+                    del self._idle[key]
+                self.reused += 1
+        if ds is None:
+            ds = rasterio.open(path)
+            with self._lock:
+                self.opened += 1
+        try:
+            yield ds
+        except BaseException:
+            ds.close()
+            raise
+        self._release(key, ds)
+
+    def _release(self, key, ds) -> None:
+        to_close = []
+        with self._lock:
+            self._idle.setdefault(key, []).append(ds)
+            self._idle.move_to_end(key)
+            self._n_idle += 1
+            while self._n_idle > self.max_open:
+                old_key, handles = next(iter(self._idle.items()))
+                to_close.append(handles.pop(0))
+                self._n_idle -= 1
+                if not handles:
+                    del self._idle[old_key]
+        for old in to_close:
+            old.close()
+
+    def close(self) -> None:
+        with self._lock:
+            handles = [ds for group in self._idle.values() for ds in group]
+            self._idle.clear()
+            self._n_idle = 0
+        for ds in handles:
+            ds.close()
+
+    def stats(self) -> Dict:
+        return {"open_idle": self._n_idle, "max_open": self.max_open, "opened": self.opened, "reused": self.reused}
@@ -0,0 +1,251 @@
+"""
+Served model versions: background loading, warm-up and atomic switching.
+
+Each version is a named TorchScript module. Loading a version (new or a
+replacement) happens entirely off to the side — load, eval, warm-up
+forwards — and only then is the registry entry swapped under a lock.
+Requests resolve their ServedModel once and keep that reference, so
+in-flight work finishes on the model it started with and nothing is
+dropped during a rollout. One version is the default; others can be
+requested explicitly (e.g. to shadow-test a candidate).
+
+A version is either a TorchScript module or an ONNX model (fp32 or int8,
+see models/export_onnx.py) run by an ONNX Runtime session behind the same
+tensor-in/tensor-out call. TorchScript modules are prepared for inference
+on load (channels-last, frozen so Conv/BatchNorm pairs fold; optionally
+optimize_for_inference), which also covers files exported before
+models/inference_prep.py existed.
+"""
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+BACKENDS = ("torchscript", "onnx")
+
+
+class ServedModel(NamedTuple):
+    name: str
+    model: torch.nn.Module
+    # Version name + file name + mtime of the loaded weights; identifies cached results
+    version_id: str
+    path: str
+    backend: str = "torchscript"
+
+
+class OnnxModel:
+    """ONNX Runtime session called like the TorchScript model: (N, C, H, W) tensor -> (N, H, W) tensor."""
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("onnxruntime is required to serve .onnx models") from e
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        x = x.detach().cpu().numpy().astype("float32", copy=False)
+        return torch.from_numpy(self.session.run(None, {self.input_name: x})[0])
+
+    def eval(self) -> "OnnxModel":
+        return self
+
+
+def resolve_backend(path: str, backend: Optional[str] = None) -> str:
+    """Explicit backend, else inferred from the file: .onnx -> onnx, anything else -> torchscript."""
+    backend = backend or ("onnx" if Path(path).suffix == ".onnx" else "torchscript")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend {backend!r}; use one of {BACKENDS}")
+    return backend
+
+
+def prepare_script_module(model, channels_last: bool = True, optimize: bool = False):
+    """
+    Channels-last + torch.jit.freeze (+ optimize_for_inference) for a loaded
+    TorchScript module; modules that cannot be prepared are served as loaded.
+    """
+    model.eval()
+    try:
+        if channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        model = torch.jit.freeze(model)
+        if optimize:
+            model = torch.jit.optimize_for_inference(model)
+    except Exception:
+        logger.warning("Could not freeze the TorchScript model; serving it unoptimised", exc_info=True)
+    return model
+
+
+def load_module(
+    path: str,
+    backend: Optional[str] = None,
+    channels_last: bool = True,
+    optimize: bool = False,
+    threads: Optional[int] = None,
+):
+    """
+    Load the model file at path for CPU inference with the given (or
+    inferred) backend. threads caps ONNX Runtime's intra-op threads
+    (TorchScript threads are set per model worker by the MicroBatcher).
+    """
+    if resolve_backend(path, backend) == "onnx":
+        return OnnxModel(path, threads=threads)
+    model = torch.jit.load(str(path), map_location="cpu")
+    return prepare_script_module(model, channels_last=channels_last, optimize=optimize)
+
+
+def warm_up(model, input_shape: Tuple[int, ...] = (1, 4, 256, 256), runs: int = 2) -> None:
+    """Run dummy forwards so TorchScript's profiling/optimisation passes happen before real traffic."""
+    x = torch.zeros(input_shape)
+    with torch.no_grad():
+        for _ in range(runs):
+            model(x)
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        on_retire: Optional[Callable[[ServedModel], None]] = None,
+        channels_last: bool = True,
+        optimize: bool = False,
+        threads: Optional[int] = None,
+    ):
+        self._models: Dict[str, ServedModel] = {}
+        self._default: Optional[str] = None
+        self._lock = threading.Lock()
+        self.on_retire = on_retire
+        # TorchScript preparation applied on load (prepare_script_module)
+        self.channels_last = channels_last
+        self.optimize = optimize
+        # Intra-op threads per ONNX session, matching the executor's threads_per_worker
+        self.threads = threads
+
+    def load(
+        self,
+        path: str,
+        name: str,
+        make_default: bool = True,
+        warmup_shape: Optional[Tuple[int, ...]] = (1, 4, 256, 256),
+        backend: Optional[str] = None,
+    ) -> ServedModel:
+        """Load, warm up and then atomically publish the model at path as version `name`."""
+        p = Path(path)
+        backend = resolve_backend(str(p), backend)
+        model = load_module(str(p), backend, channels_last=self.channels_last, optimize=self.optimize,
+                            threads=self.threads)
+        if warmup_shape is not None:
+            warm_up(model, warmup_shape)
+        served = ServedModel(name, model, f"{name}:{p.name}@{p.stat().st_mtime_ns}", str(p), backend)
+        self.add(served, make_default=make_default)
+        logger.info(f"Serving model {name} ({served.version_id}){' as default' if make_default else ''}")
+        return served
+
+    def add(self, served: ServedModel, make_default: bool = True) -> None:
+        with self._lock:
+            old = self._models.get(served.name)
+            self._models[served.name] = served
+            if make_default or self._default is None:
+                self._default = served.name
+        if old is not None and old.version_id != served.version_id and self.on_retire:
+            self.on_retire(old)
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            if name == self._default:
+                raise ValueError(f"Cannot remove the default model {name!r}")
+            old = self._models.pop(name, None)
+        if old is not None and self.on_retire:
+            self.on_retire(old)
+        return old is not None
+
+    def get(self, name: Optional[str] = None) -> Optional[ServedModel]:
+        """The named version, or the default when name is None."""
+        with self._lock:
+            return self._models.get(name if name is not None else self._default)
+
+    @property
+    def default(self) -> Optional[str]:
+        return self._default
+
+    def versions(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {"name": m.name, "version_id": m.version_id, "path": m.path, "backend": m.backend,
+                 "default": m.name == self._default}
+                for m in self._models.values()
+            ]
+
+
+class ModelWatcher:
+    """
+    Polls a model file and hot-swaps it into the registry when it changes.
+
+    A change is only loaded once the file's (mtime, size) has been stable
+    for one full poll interval, so a copy still in progress is not read;
+    a failed load keeps the current model serving.
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        path: str,
+        name: str,
+        interval_s: float = 5.0,
+        backend: Optional[str] = None,
+    ):
+        self.registry = registry
+        self.path = path
+        self.name = name
+        self.backend = backend
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        served = registry.get(name)
+        self._loaded = file_signature(path) if served is not None and served.path == str(Path(path)) else None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def poll(self, last_seen: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+        """One check: returns the signature seen now; loads when it has been stable since last_seen."""
+        sig = file_signature(self.path)
+        if sig is not None and sig != self._loaded and sig == last_seen:
+            try:
+                self.registry.load(self.path, self.name, make_default=self.registry.default in (None, self.name),
+                                   backend=self.backend)
+                self._loaded = sig
+            except Exception:
+                logger.exception(f"Failed to hot-swap {self.path}; keeping the current model")
+                self._loaded = sig
+        return sig
+
+    def _run(self) -> None:
+        last_seen = file_signature(self.path)
+        while not self._stop.wait(self.interval_s):
+            last_seen = self.poll(last_seen)
@@ -0,0 +1,109 @@
+"""
+Tile serving from MBTiles files produced by data_pipeline/tile_generator.py.
+
+Each MBTiles file gets a small pool of read-only SQLite connections that
+request threads borrow and return, so a tile request is one indexed lookup
+instead of a connect/parse/close cycle. A pool is rebuilt when its file is
+replaced on disk (regenerated pyramid).
+"""
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+POOL_SIZE = 8
+
+_TILE_QUERY = (
+    "SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?"
+)
+
+
+class MBTilesPool:
+    """Bounded pool of read-only connections to one MBTiles file."""
+
+    def __init__(self, path: str, size: int = POOL_SIZE):
+        self.path = path
+        st = os.stat(path)
+        self.signature = (st.st_ino, st.st_mtime_ns)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._has_map = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        if self._has_map is None:
+            row = conn.execute("SELECT 1 FROM sqlite_master WHERE name='map' AND type='table'").fetchone()
+            self._has_map = row is not None
+        return conn
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                with self._lock:
+                    if self._closed:
+                        # Borrowed across a file swap: nothing will reuse it
+                        conn.close()
+                    else:
+                        self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def get_tile(self, z: int, x: int, y: int) -> Optional[Tuple[bytes, str]]:
+        """(png bytes, etag) for XYZ tile z/x/y, or None if absent."""
+        tms_row = (1 << z) - 1 - y
+        with self.connection() as conn:
+            if self._has_map:
+                # De-duplicated layout: the image id is already a content hash
+                row = conn.execute(
+                    "SELECT images.tile_data, images.tile_id FROM map JOIN images "
+                    "ON images.tile_id = map.tile_id "
+                    "WHERE map.zoom_level=? AND map.tile_column=? AND map.tile_row=?",
+                    (z, x, tms_row),
+                ).fetchone()
+                return (row[0], row[1]) if row else None
+            row = conn.execute(_TILE_QUERY, (z, x, tms_row)).fetchone()
+        if row is None:
+            return None
+        return row[0], hashlib.sha1(row[0]).hexdigest()
+
+    def close(self) -> None:
+        """Close idle connections now, and borrowed ones as they are returned."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_POOLS: Dict[str, MBTilesPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(path: str) -> Optional[MBTilesPool]:
+    """Shared pool for an MBTiles file, or None if the file does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    with _POOLS_LOCK:
+        pool = _POOLS.get(path)
+        if pool is None or pool.signature != (st.st_ino, st.st_mtime_ns):
+            if pool is not None:
+                pool.close()
+            pool = _POOLS[path] = MBTilesPool(path)
+        return pool
@@ -0,0 +1,117 @@
+"""
+CPU latency / throughput of UNetRegressor across serving backends:
+fp32 TorchScript (plain trace, and inference-prepared: BatchNorm folded,
+channels-last, frozen, optionally optimize_for_inference), fp32 ONNX
+Runtime and int8 ONNX Runtime.
+
+Latency is single-tile (1 x 4 x size x size) p50/p95; throughput is tiles/s
+at the server's micro-batch size. Uses a trained checkpoint when given,
+otherwise random weights (timings do not depend on the weights).
+"""
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+from export_onnx import INPUT_NAME, export_module_onnx, quantize_onnx
+from inference_prep import prepare_for_inference
+from model import UNetRegressor
+
+
+def time_runs(fn: Callable[[], object], runs: int, warmup: int = 2) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def _ort_runner(path: str, threads: Optional[int]):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+    return lambda x: session.run(None, {INPUT_NAME: x})[0]
+
+
+BACKENDS = ("torchscript-fp32", "torchscript-prepared", "torchscript-prepared-ofi", "ort-fp32", "ort-int8")
+
+
+def _torchscript_runner(module):
+    def run(x):
+        with torch.no_grad():
+            return module(torch.from_numpy(x))
+    return run
+
+
+def benchmark(
+    model_path: Optional[str] = None,
+    size: int = 256,
+    batch_size: int = 16,
+    runs: int = 20,
+    threads: Optional[int] = None,
+    backends: Sequence[str] = BACKENDS,
+) -> Dict[str, Dict[str, float]]:
+    """Returns {backend: {p50_ms, p95_ms, tiles_per_s}}."""
+    if threads:
+        torch.set_num_threads(threads)
+    m = UNetRegressor(in_ch=4)
+    if model_path and Path(model_path).exists():
+        m.load_state_dict(torch.load(model_path, map_location="cpu"))
+    m.eval()
+
+    rng = np.random.default_rng(0)
+    single = rng.uniform(0.02, 0.5, size=(1, 4, size, size)).astype(np.float32)
+    batch = rng.uniform(0.02, 0.5, size=(batch_size, 4, size, size)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Built lazily so a subset of backends skips the others' export/quantization
+        fp32 = lambda: export_module_onnx(m, str(Path(tmp) / "model.onnx"))  # noqa: E731
+        builders = {
+            "torchscript-fp32": lambda: _torchscript_runner(torch.jit.trace(m, torch.from_numpy(single))),
+            "torchscript-prepared": lambda: _torchscript_runner(prepare_for_inference(m, single.shape)),
+            "torchscript-prepared-ofi": lambda: _torchscript_runner(
+                prepare_for_inference(m, single.shape, optimize=True)),
+            "ort-fp32": lambda: _ort_runner(fp32(), threads),
+            "ort-int8": lambda: _ort_runner(
+                quantize_onnx(fp32(), str(Path(tmp) / "model_int8.onnx"), mode="static"), threads),
+        }
+        results = {}
+        for name in backends:
+            run = builders[name]()
+            latency = np.array(time_runs(lambda: run(single), runs)) * 1000.0
+            batched = time_runs(lambda: run(batch), max(3, runs // 4))
+            results[name] = {
+                "p50_ms": float(np.percentile(latency, 50)),
+                "p95_ms": float(np.percentile(latency, 95)),
+                "tiles_per_s": batch_size / float(np.median(batched)),
+            }
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", help="Trained UNetRegressor state dict (random weights if omitted)")
+    parser.add_argument("--size", type=int, default=256, help="Tile size (multiple of 8)")
+    parser.add_argument("--batch-size", type=int, default=16, help="Batch size for the throughput run")
+    parser.add_argument("--runs", type=int, default=20, help="Timed single-tile runs per backend")
+    parser.add_argument("--threads", type=int, help="Intra-op threads (default: runtime default)")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS,
+                        help="Backends to compare; the first is the speedup baseline")
+    args = parser.parse_args()
+    results = benchmark(args.model, args.size, args.batch_size, args.runs, args.threads, args.backends)
+    baseline = results[args.backends[0]]["tiles_per_s"]
+    print(f"{'backend':<26}{'p50 ms':>10}{'p95 ms':>10}{'tiles/s':>10}{'speedup':>9}")
+    for name, r in results.items():
+        print(f"{name:<26}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['tiles_per_s']:>10.1f}"
+              f"{r['tiles_per_s'] / baseline:>8.2f}x")
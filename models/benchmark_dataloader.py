@@ -0,0 +1,80 @@
+"""
+Training data-loader throughput (samples/s) for PatchDataset.
+
+Compares the legacy setup (one .npy file per sample, num_workers=0) with
+memory-mapped shards and multi-worker loading, on synthetic samples. It
+exits non-zero when the best shard configuration falls below
+--min-samples-per-s or its speedup over the legacy baseline below
+--min-speedup (default 1.0: shards must beat per-sample files), so CI can
+gate loader regressions.
+"""
+import sys
+import tempfile
+import time
+from typing import Dict, Sequence
+
+import torch
+from torch.utils.data import DataLoader
+
+from dataset import PatchDataset, loader_kwargs, make_synthetic_samples, pack_samples
+
+
+def loader_throughput(
+    dataset, batch_size: int = 8, num_workers: int = 0, prefetch_factor: int = 2, epochs: int = 2
+) -> float:
+    """
+    Steady-state samples/s of a shuffled DataLoader over dataset: the first
+    epoch (worker start-up, cold page cache) is a warm-up and not timed.
+    """
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=True,
+                        **loader_kwargs(num_workers, "cpu", prefetch_factor))
+    for _ in loader:
+        pass
+    n, t0 = 0, time.perf_counter()
+    for _ in range(epochs):
+        for imgs, _ in loader:
+            n += imgs.shape[0]
+    return n / (time.perf_counter() - t0)
+
+
+def benchmark(
+    n_samples: int = 64, batch_size: int = 8, workers: Sequence[int] = (0, 2), epochs: int = 2
+) -> Dict[str, float]:
+    """Returns {config: samples_per_s}; "files-w0" is the legacy baseline."""
+    torch.manual_seed(0)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        files = make_synthetic_samples(n=n_samples, data_dir=tmp)
+        shards = pack_samples(files, f"{tmp}/shards")
+        results["files-w0"] = loader_throughput(PatchDataset(files), batch_size, 0, epochs=epochs)
+        for w in workers:
+            results[f"shards-w{w}"] = loader_throughput(PatchDataset(shards), batch_size, w, epochs=epochs)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=64, help="Synthetic 4x256x256 samples")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2], help="Worker counts to measure")
+    parser.add_argument("--epochs", type=int, default=2, help="Timed epochs per configuration")
+    parser.add_argument("--min-samples-per-s", type=float, help="Fail if the best configuration is slower")
+    parser.add_argument("--min-speedup", type=float, default=1.0,
+                        help="Fail if the best configuration's speedup over files-w0 is lower")
+    args = parser.parse_args()
+    results = benchmark(args.samples, args.batch_size, args.workers, args.epochs)
+    baseline = results["files-w0"]
+    print(f"{'loader':<12}{'samples/s':>12}{'speedup':>9}")
+    for name, rate in results.items():
+        print(f"{name:<12}{rate:>12.1f}{rate / baseline:>8.2f}x")
+
+    best = max(rate for name, rate in results.items() if name != "files-w0")
+    failed = []
+    if args.min_samples_per_s is not None and best < args.min_samples_per_s:
+        failed.append(f"{best:.1f} samples/s < {args.min_samples_per_s}")
+    if args.min_speedup is not None and best / baseline < args.min_speedup:
+        failed.append(f"speedup {best / baseline:.2f}x < {args.min_speedup}x")
+    if failed:
+        print("Loader throughput regression: " + "; ".join(failed))
+        sys.exit(1)
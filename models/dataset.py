@@ -1,12 +1,29 @@
 """
 Patch-based dataset for Image2Biomass training.
-Expects samples: list of {image_path, label_path}.
+Expects samples: list of {image_path, label_path}, or entries pointing into
+sharded patch stores (data_pipeline/patch_store.py): {image_store,
+image_shard, image_offset, label_store, label_shard, label_offset}.
+
+.npy samples and store shards are memory-mapped (opened lazily, once per
+DataLoader worker) and each sample is materialised with a single
+scale-and-cast copy. pack_samples() converts per-file samples into patch stores,
+and loader_kwargs() holds the DataLoader settings for multi-worker loading.
 """
+import sys
 import torch
 from torch.utils.data import Dataset
 import numpy as np
 from pathlib import Path
 
+try:
+    from data_pipeline.patch_store import PatchShardWriter, PatchStore
+except ImportError:  # run as a script from models/
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from data_pipeline.patch_store import PatchShardWriter, PatchStore
+
+# Mosaic DN to reflectance
+REFLECTANCE_SCALE = 10000.0
+
 
 class PatchDataset(Dataset):
     def __init__(self, samples: list, transforms=None):
@@ -16,33 +33,121 @@ class PatchDataset(Dataset):
         """
         self.samples = samples
         self.transforms = transforms
+        self._stores = {}
 
     def __len__(self):
         return len(self.samples)
 
+    def __getstate__(self):
+        # Stores (and their memmaps) are reopened lazily in each DataLoader worker
+        state = dict(self.__dict__)
+        state["_stores"] = {}
+        return state
+
+    def _store(self, store_dir):
+        store = self._stores.get(store_dir)
+        if store is None:
+            store = PatchStore(store_dir)
+            self._stores[store_dir] = store
+        return store
+
     def __getitem__(self, idx):
+        return self._finish(*self.read_raw(idx))
+
+    def read_raw(self, idx):
+        """(image DN, label) of a sample as stored; memmap views for shards and .npy files."""
         s = self.samples[idx]
+        if "image_shard" in s:
+            # Zero-copy memmap slices; _finish's scale-and-cast is the only copy
+            img = self._store(s["image_store"]).get(s["image_shard"], int(s["image_offset"]))
+            label = self._store(s["label_store"]).get(s["label_shard"], int(s["label_offset"]))
+            if label.ndim == 3:
+                label = label[0]
+            return img, label
+
         imp = Path(s["image_path"])
         labp = Path(s["label_path"])
 
         if imp.suffix == ".npy":
-            img = np.load(imp).astype("float32")
-            label = np.load(labp).astype("float32")
+            img = np.load(imp, mmap_mode="r")
+            label = np.load(labp, mmap_mode="r")
         else:
             import rasterio
             with rasterio.open(s["image_path"]) as src:
                 img = src.read()  # C x H x W
             with rasterio.open(s["label_path"]) as lab:
                 label = lab.read(1)  # H x W
-            img = img.astype("float32")
-            label = label.astype("float32")
+        return img, label
 
-        img = img / 10000.0
+    def _finish(self, img, label):
+        # One copy each, straight out of the (memory-mapped) source into owned float32 arrays
+        img = np.divide(img, REFLECTANCE_SCALE, dtype=np.float32)
+        label = np.array(label, dtype=np.float32)
         if self.transforms:
             img, label = self.transforms(img, label)
-        return torch.tensor(img, dtype=torch.float32), torch.tensor(
-            label, dtype=torch.float32
-        )
+        return torch.from_numpy(np.ascontiguousarray(img)), torch.from_numpy(np.ascontiguousarray(label))
+
+
+def _patch_index(store_dir):
+    """{(source stem, y, x): (shard, offset)} of a patch store."""
+    index = PatchStore(store_dir).index
+    return {
+        (Path(r.source).stem, int(r.y), int(r.x)): (r.shard, int(r.offset))
+        for r in index.itertuples()
+    }
+
+
+def samples_from_patch_stores(image_store, label_store):
+    """
+    Pair image and label patches from two sharded patch stores (as written by
+    data_pipeline/patch_sampler.py) on (source file stem, y, x), so label
+    rasters must share their scene's file name.
+    """
+    images = _patch_index(image_store)
+    labels = _patch_index(label_store)
+    samples = []
+    for key in sorted(images.keys() & labels.keys()):
+        (img_shard, img_off), (lab_shard, lab_off) = images[key], labels[key]
+        samples.append({
+            "image_store": str(image_store), "image_shard": img_shard, "image_offset": img_off,
+            "label_store": str(label_store), "label_shard": lab_shard, "label_offset": lab_off,
+        })
+    return samples
+
+
+def pack_samples(samples: list, out_dir, shard_size: int = 1024) -> list:
+    """
+    Copy per-file samples (.npy or GeoTIFF) into sharded patch stores
+    out_dir/image and out_dir/label (the data_pipeline/patch_store.py
+    format, so samples_from_patch_stores can pair them again) and return the
+    equivalent shard samples, in order. Images keep their dtype (DN); all
+    samples must share shapes.
+    """
+    out = Path(out_dir)
+    reader = PatchDataset(samples)
+    writers = {kind: PatchShardWriter(str(out / kind), shard_size, prefix=kind) for kind in ("image", "label")}
+    for i, s in enumerate(samples):
+        img, label = reader.read_raw(i)
+        # Both stores record the image file as source, so patches pair on (stem, 0, 0)
+        writers["image"].add(np.asarray(img), 0, 0, s["image_path"])
+        writers["label"].add(np.asarray(label), 0, 0, s["image_path"])
+    images, labels = (writers[kind].close() for kind in ("image", "label"))
+    return [
+        {"image_store": str(out / "image"), "image_shard": img.shard, "image_offset": int(img.offset),
+         "label_store": str(out / "label"), "label_shard": lab.shard, "label_offset": int(lab.offset)}
+        for img, lab in zip(images.itertuples(), labels.itertuples())
+    ]
+
+
+def loader_kwargs(num_workers: int = 0, device: str = "cpu", prefetch_factor: int = 2) -> dict:
+    """
+    DataLoader settings: worker processes with persistent workers and
+    prefetching, and pinned host memory when training on CUDA.
+    """
+    kwargs = {"num_workers": num_workers, "pin_memory": str(device).startswith("cuda")}
+    if num_workers > 0:
+        kwargs.update(persistent_workers=True, prefetch_factor=prefetch_factor)
+    return kwargs
 
 
 def make_synthetic_samples(n=16, data_dir="runs/synthetic"):
@@ -0,0 +1,164 @@
+"""
+Export trained UNetRegressor to ONNX (fp32 and int8) for ONNX Runtime serving.
+
+The graph has dynamic batch, height and width axes, so the inference
+server's micro-batches and scene windows of any size (a multiple of 8, the
+U-Net's total downsampling) run on one model file. The int8 variant is
+quantized statically by default: activation ranges are calibrated on
+sample inputs and Conv layers run as QDQ int8 kernels. Dynamic quantization
+is available but only quantizes weights, and ORT's ConvInteger path is
+slower than fp32 on CPU for this model.
+"""
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from model import UNetRegressor
+
+INPUT_NAME = "image"
+OUTPUT_NAME = "biomass"
+QUANT_MODES = ("static", "dynamic")
+
+
+def export_module_onnx(model: torch.nn.Module, out_path: str, in_ch: int = 4, opset: int = 17) -> str:
+    """Export an eval-mode model to ONNX with dynamic batch and spatial axes."""
+    model.eval()
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    torch.onnx.export(
+        model,
+        (torch.randn(1, in_ch, 256, 256),),
+        str(out_path),
+        input_names=[INPUT_NAME],
+        output_names=[OUTPUT_NAME],
+        dynamic_axes={
+            INPUT_NAME: {0: "batch", 2: "height", 3: "width"},
+            OUTPUT_NAME: {0: "batch", 1: "height", 2: "width"},
+        },
+        opset_version=opset,
+        do_constant_folding=True,
+        # The torch.export-based exporter needs onnxscript; the TorchScript one handles this model
+        dynamo=False,
+    )
+    return str(out_path)
+
+
+def synthetic_calibration(n: int = 16, in_ch: int = 4, size: int = 256, seed: int = 0) -> np.ndarray:
+    """Reflectance-range (0.02-0.5) random inputs, for when no real patches are given."""
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0.02, 0.5, size=(n, in_ch, size, size)).astype(np.float32)
+
+
+class _CalibrationReader:
+    """Feeds calibration inputs one at a time to onnxruntime's quantize_static."""
+
+    def __init__(self, inputs: Iterable[np.ndarray]):
+        self._it = iter(inputs)
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        x = next(self._it, None)
+        return None if x is None else {INPUT_NAME: np.ascontiguousarray(x[None], dtype=np.float32)}
+
+
+def quantize_onnx(
+    fp32_path: str,
+    out_path: str,
+    mode: str = "static",
+    calibration: Optional[np.ndarray] = None,
+) -> str:
+    """
+    Write an int8 variant of the fp32 ONNX model.
+
+    calibration: (N, C, H, W) reflectance inputs (DN / 10000) for static
+    quantization, e.g. patches from the training set; synthetic inputs are
+    used when omitted.
+    """
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    if mode not in QUANT_MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}; use one of {QUANT_MODES}")
+    out = Path(out_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    # Fold/fuse before quantizing; symbolic shape inference can't resolve the dynamic spatial axes
+    prepped = out.with_name(f".{out.stem}.pre.onnx")
+    quant_pre_process(str(fp32_path), str(prepped), skip_symbolic_shape=True)
+    try:
+        if mode == "static":
+            if calibration is None:
+                calibration = synthetic_calibration()
+            quantize_static(
+                str(prepped), str(out), _CalibrationReader(calibration),
+                quant_format=QuantFormat.QDQ, per_channel=True,
+                activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+            )
+        else:
+            quantize_dynamic(str(prepped), str(out), weight_type=QuantType.QInt8)
+    finally:
+        prepped.unlink(missing_ok=True)
+    return str(out)
+
+
+def check_parity(
+    model: torch.nn.Module,
+    onnx_path: str,
+    shapes: Sequence[Tuple[int, int, int, int]] = ((1, 4, 256, 256), (3, 4, 128, 192)),
+    seed: int = 0,
+) -> Dict[Tuple[int, ...], float]:
+    """Max absolute difference between the PyTorch model and the ONNX model per input shape."""
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(str(onnx_path), providers=["CPUExecutionProvider"])
+    rng = np.random.default_rng(seed)
+    model.eval()
+    errors = {}
+    for shape in shapes:
+        x = rng.uniform(0.02, 0.5, size=shape).astype(np.float32)
+        with torch.no_grad():
+            expected = model(torch.from_numpy(x)).numpy()
+        got = session.run(None, {INPUT_NAME: x})[0]
+        errors[tuple(shape)] = float(np.abs(got - expected).max())
+    return errors
+
+
+def export(
+    model_path="runs/best_model.pth",
+    out_path="runs/biomass_model.onnx",
+    int8_path="runs/biomass_model_int8.onnx",
+    quantize: Optional[str] = "static",
+    calibration: Optional[str] = None,
+    atol: float = 1e-4,
+):
+    device = "cpu"
+    m = UNetRegressor(in_ch=4)
+    pth = Path(model_path)
+    if not pth.exists():
+        print(f"Model not found at {model_path}. Skipping export.")
+        return
+    m.load_state_dict(torch.load(pth, map_location=device))
+    m.eval()
+
+    export_module_onnx(m, out_path)
+    errors = check_parity(m, out_path)
+    print(f"Saved ONNX model: {out_path} (max |onnx - torch| {max(errors.values()):.2e})")
+    if max(errors.values()) > atol:
+        raise RuntimeError(f"ONNX export does not match PyTorch: {errors}")
+
+    if quantize:
+        calib = np.load(calibration, mmap_mode="r") if calibration else None
+        quantize_onnx(out_path, int8_path, mode=quantize, calibration=calib)
+        errors = check_parity(m, int8_path)
+        print(f"Saved int8 ONNX model ({quantize}): {int8_path} (max |int8 - torch| {max(errors.values()):.3f})")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="runs/best_model.pth", help="Trained UNetRegressor state dict")
+    parser.add_argument("--out", default="runs/biomass_model.onnx", help="Output fp32 ONNX model")
+    parser.add_argument("--int8-out", default="runs/biomass_model_int8.onnx", help="Output int8 ONNX model")
+    parser.add_argument("--quantize", default="static", choices=QUANT_MODES + ("none",), help="int8 quantization")
+    parser.add_argument("--calibration", help=".npy of (N, 4, H, W) reflectance patches for static quantization")
+    args = parser.parse_args()
+    export(args.model, args.out, args.int8_out, None if args.quantize == "none" else args.quantize, args.calibration)
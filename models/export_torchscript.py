@@ -1,9 +1,13 @@
 """
 Export trained UNetRegressor to TorchScript for inference server.
+
+The exported module is inference-prepared (BatchNorm folded, channels-last,
+frozen; see inference_prep.py).
 """
 import torch
 from pathlib import Path
 from model import UNetRegressor
+from inference_prep import prepare_for_inference
 
 
 def export(model_path="runs/best_model.pth", out_path="runs/biomass_model_ts.pt"):
@@ -16,10 +20,9 @@ def export(model_path="runs/best_model.pth", out_path="runs/biomass_model_ts.pt"
     m.load_state_dict(torch.load(pth, map_location=device))
     m.eval()
 
-    example = torch.randn(1, 4, 256, 256)
-    traced = torch.jit.trace(m, example)
+    prepared = prepare_for_inference(m, example_shape=(1, 4, 256, 256))
     Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    traced.save(out_path)
+    prepared.save(out_path)
     print(f"Saved TorchScript model: {out_path}")
 
 
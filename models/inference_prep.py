@@ -0,0 +1,59 @@
+"""
+Inference-time graph preparation for UNetRegressor.
+
+Every ConvBlock runs Conv -> BatchNorm -> ReLU; at inference BatchNorm is a
+fixed per-channel affine, so it is folded into the preceding conv's weights
+and bias. The folded model is converted to channels-last (NHWC) memory
+format, which oneDNN's CPU convolutions run considerably faster, traced and
+frozen (parameters inlined as constants).
+
+torch.jit.optimize_for_inference (oneDNN-prepacked weights) is opt-in: the
+result cannot be saved and reloaded, and on CPU it does not beat
+channels-last, so exported files stop at the frozen module and the server
+decides at load time (see inference_server/app/registry.py).
+"""
+import copy
+from typing import Tuple
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+
+def fold_batchnorm(model: nn.Module) -> nn.Module:
+    """Eval-mode copy of model with every Conv2d -> BatchNorm2d pair in an nn.Sequential fused into one Conv2d."""
+    model = copy.deepcopy(model).eval()
+    for module in model.modules():
+        if not isinstance(module, nn.Sequential):
+            continue
+        for i in range(len(module) - 1):
+            conv, bn = module[i], module[i + 1]
+            if isinstance(conv, nn.Conv2d) and isinstance(bn, nn.BatchNorm2d):
+                module[i] = fuse_conv_bn_eval(conv, bn)
+                module[i + 1] = nn.Identity()
+    return model
+
+
+def prepare_for_inference(
+    model: nn.Module,
+    example_shape: Tuple[int, ...] = (1, 4, 256, 256),
+    channels_last: bool = True,
+    optimize: bool = False,
+) -> torch.jit.ScriptModule:
+    """
+    Fold BatchNorm, convert to channels-last, trace and freeze. The traced
+    module accepts any batch size and spatial size (a multiple of 8), in
+    either memory format. optimize=True also applies
+    torch.jit.optimize_for_inference (not serialisable).
+    """
+    model = fold_batchnorm(model)
+    example = torch.randn(example_shape)
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+        example = example.contiguous(memory_format=torch.channels_last)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    frozen = torch.jit.freeze(traced)
+    if optimize:
+        frozen = torch.jit.optimize_for_inference(frozen)
+    return frozen
@@ -1,54 +1,115 @@
 """
 Image2Biomass training loop: patch-based U-Net regression.
+
+Optional speed-ups, all off by default:
+- AMP autocast: bf16 on CPU; on CUDA, bf16 where supported, else fp16 with a
+  GradScaler.
+- Gradient accumulation, for a larger effective batch than fits per step.
+- torch.compile.
+
+Each epoch logs its wall time and training samples/s, so configurations can
+be compared.
 """
+import time
+from contextlib import nullcontext
+
 import torch
 from torch.utils.data import DataLoader
 from pathlib import Path
 
 from model import UNetRegressor
-from dataset import PatchDataset, make_synthetic_samples
+from dataset import PatchDataset, loader_kwargs, make_synthetic_samples, pack_samples, samples_from_patch_stores
 from metrics import rmse
 import torch.optim as optim
 
+AMP_MODES = ("off", "auto", "bf16", "fp16")
+
+
+def resolve_amp_dtype(amp: str, device: str):
+    """Autocast dtype for an AMP mode on a device, or None for full fp32."""
+    if amp not in AMP_MODES:
+        raise ValueError(f"Unknown AMP mode {amp!r}; use one of {AMP_MODES}")
+    device_type = torch.device(device).type
+    if amp == "off":
+        return None
+    if amp == "auto":
+        if device_type == "cuda" and not torch.cuda.is_bf16_supported():
+            return torch.float16
+        return torch.bfloat16
+    if amp == "fp16" and device_type == "cpu":
+        raise ValueError("fp16 autocast is not supported for CPU training; use bf16")
+    return torch.bfloat16 if amp == "bf16" else torch.float16
+
 
 def train_loop(
-    train_ds, val_ds, out_dir="runs", epochs=30, device="cuda"
+    train_ds, val_ds, out_dir="runs", epochs=30, device="cuda",
+    batch_size=8, num_workers=0, prefetch_factor=2,
+    amp="off", accum_steps=1, compile_model=False,
 ):
+    """
+    Train UNetRegressor, saving the best validation checkpoint to
+    out_dir/best_model.pth. The effective batch size is batch_size *
+    accum_steps; the last, partial accumulation group of an epoch is
+    stepped as well.
+    """
     model = UNetRegressor(in_ch=4).to(device)
+    # The compiled wrapper shares parameters with model; checkpoints come from model
+    net = torch.compile(model) if compile_model else model
+    device_type = torch.device(device).type
+    amp_dtype = resolve_amp_dtype(amp, device)
+    autocast = (lambda: torch.autocast(device_type, dtype=amp_dtype)) if amp_dtype is not None else nullcontext
+    # fp16 gradients underflow without loss scaling; bf16 has fp32's range
+    scaler = torch.amp.GradScaler(device_type, enabled=amp_dtype == torch.float16)
+    accum_steps = max(1, int(accum_steps))
     opt = optim.Adam(model.parameters(), lr=1e-3)
     loss_fn = torch.nn.L1Loss()
     best_val = 1e9
     Path(out_dir).mkdir(parents=True, exist_ok=True)
 
-    train_loader = DataLoader(
-        train_ds, batch_size=8, shuffle=True, num_workers=0
-    )
-    val_loader = DataLoader(val_ds, batch_size=4, shuffle=False, num_workers=0)
+    loader_opts = loader_kwargs(num_workers, device, prefetch_factor)
+    train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=True, **loader_opts)
+    val_loader = DataLoader(val_ds, batch_size=max(1, batch_size // 2), shuffle=False, **loader_opts)
+    # Pinned batches can be copied to the GPU asynchronously
+    non_blocking = loader_opts["pin_memory"]
 
+    n_batches = len(train_loader)
     for epoch in range(epochs):
-        model.train()
+        t0 = time.perf_counter()
+        net.train()
         train_loss = 0.0
-        for imgs, labs in train_loader:
-            imgs = imgs.to(device)
-            labs = labs.to(device)
-            preds = model(imgs)
-            loss = loss_fn(preds, labs)
-            opt.zero_grad()
-            loss.backward()
-            opt.step()
+        n_samples = 0
+        opt.zero_grad(set_to_none=True)
+        for i, (imgs, labs) in enumerate(train_loader):
+            imgs = imgs.to(device, non_blocking=non_blocking)
+            labs = labs.to(device, non_blocking=non_blocking)
+            with autocast():
+                preds = net(imgs)
+            loss = loss_fn(preds.float(), labs)
+            # Average over the micro-batches of this accumulation group
+            group = min(accum_steps, n_batches - (i // accum_steps) * accum_steps)
+            scaler.scale(loss / group).backward()
+            if (i + 1) % accum_steps == 0 or i + 1 == n_batches:
+                scaler.step(opt)
+                scaler.update()
+                opt.zero_grad(set_to_none=True)
             train_loss += loss.item()
+            n_samples += imgs.shape[0]
+        train_time = time.perf_counter() - t0
 
-        model.eval()
+        net.eval()
         val_loss = 0.0
         with torch.no_grad():
             for imgs, labs in val_loader:
-                imgs = imgs.to(device)
-                labs = labs.to(device)
-                preds = model(imgs)
-                val_loss += loss_fn(preds, labs).item()
+                imgs = imgs.to(device, non_blocking=non_blocking)
+                labs = labs.to(device, non_blocking=non_blocking)
+                with autocast():
+                    preds = net(imgs)
+                val_loss += loss_fn(preds.float(), labs).item()
         val_loss /= len(val_loader)
-        train_loss /= len(train_loader)
-        print(f"Epoch {epoch} train {train_loss:.4f} val {val_loss:.4f}")
+        train_loss /= n_batches
+        epoch_time = time.perf_counter() - t0
+        print(f"Epoch {epoch} train {train_loss:.4f} val {val_loss:.4f} "
+              f"time {epoch_time:.1f}s {n_samples / train_time:.1f} samples/s")
 
         if val_loss < best_val:
             best_val = val_loss
@@ -58,8 +119,30 @@ def train_loop(
 
 
 if __name__ == "__main__":
-    # Synthetic dataset for local demo
-    samples = make_synthetic_samples(n=24, data_dir="runs/synthetic")
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image-store", help="Sharded image patch store (data_pipeline/patch_sampler.py)")
+    parser.add_argument("--label-store", help="Sharded label patch store matching --image-store")
+    parser.add_argument("--synthetic", type=int, default=24, help="Synthetic samples when no stores are given")
+    parser.add_argument("--pack", action="store_true", help="Pack per-file samples into memory-mapped shards first")
+    parser.add_argument("--out", default="runs", help="Output directory for best_model.pth")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument("--prefetch", type=int, default=2, help="Batches prefetched per worker")
+    parser.add_argument("--amp", default="off", choices=AMP_MODES,
+                        help="Autocast mixed precision (auto: bf16; fp16 on CUDA without bf16)")
+    parser.add_argument("--accum-steps", type=int, default=1, help="Micro-batches per optimizer step")
+    parser.add_argument("--compile", action="store_true", help="torch.compile the model")
+    args = parser.parse_args()
+
+    if args.image_store and args.label_store:
+        samples = samples_from_patch_stores(args.image_store, args.label_store)
+    else:
+        # Synthetic dataset for local demo
+        samples = make_synthetic_samples(n=args.synthetic, data_dir="runs/synthetic")
+        if args.pack:
+            samples = pack_samples(samples, "runs/synthetic/shards")
     n_val = max(1, len(samples) // 4)
     train_samples = samples[n_val:]
     val_samples = samples[:n_val]
@@ -67,4 +150,6 @@ if __name__ == "__main__":
     val_ds = PatchDataset(val_samples)
 
     device = "cuda" if torch.cuda.is_available() else "cpu"
-    train_loop(train_ds, val_ds, out_dir="runs", epochs=5, device=device)
+    train_loop(train_ds, val_ds, out_dir=args.out, epochs=args.epochs, device=device,
+               batch_size=args.batch_size, num_workers=args.workers, prefetch_factor=args.prefetch,
+               amp=args.amp, accum_steps=args.accum_steps, compile_model=args.compile)
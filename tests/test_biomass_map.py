@@ -0,0 +1,83 @@
+# tests/test_biomass_map.py
+"""Tests for the biomass map layer (UNet raster + colour-mapped tiles)."""
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import rasterio
+import torch
+from rasterio.transform import from_bounds
+
+from data_pipeline.biomass_map import predict_biomass_raster, render_biomass_tiles
+from data_pipeline.tile_generator import MBTilesReader, colormap_lut, decode_png, render_rgba, tile_range
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "models"))
+from model import UNetRegressor  # noqa: E402
+
+BOUNDS = (150.87, -34.42, 150.89, -34.40)
+
+
+def _export_model(path):
+    torch.manual_seed(0)
+    model = UNetRegressor(in_ch=4, base=4).eval()
+    torch.jit.trace(model, torch.randn(1, 4, 64, 64)).save(str(path))
+    return model
+
+
+def _write_mosaic(path, height=300, width=260):
+    rng = np.random.default_rng(1)
+    arr = rng.uniform(300, 4000, size=(4, height, width)).astype("uint16")
+    arr[:, :, :40] = 0  # outside the flight footprint
+    with rasterio.open(
+        path, "w", driver="GTiff", height=height, width=width, count=4, dtype="uint16",
+        crs="EPSG:4326", transform=from_bounds(*BOUNDS, width, height), nodata=0,
+    ) as dst:
+        dst.write(arr)
+    return arr
+
+
+def test_colormap_lut_render():
+    lut = colormap_lut("biomass")
+    assert lut.shape == (256, 3) and lut.dtype == np.uint8
+    assert tuple(lut[0]) == (140, 81, 10) and tuple(lut[-1]) == (0, 104, 55)
+
+    values = np.linspace(-1.0, 9.0, 64 * 64, dtype=np.float32).reshape(1, 64, 64)
+    valid = np.ones((64, 64), dtype=bool)
+    valid[:4] = False
+    rgba = render_rgba(values, valid, [(0.0, 8.0)], colormap="biomass")
+    index = np.clip((values[0] - 0.0) * (255.0 / 8.0), 0, 255).astype(np.uint8)
+    np.testing.assert_array_equal(rgba[4:, :, :3], lut[index][4:])
+    assert (rgba[:4] == 0).all() and (rgba[4:, :, 3] == 255).all()
+
+
+def test_biomass_raster_and_tiles(tmp_path):
+    mosaic, model_path = tmp_path / "mosaic.tif", tmp_path / "model.pt"
+    arr = _write_mosaic(mosaic)
+    model = _export_model(model_path)
+
+    raster = predict_biomass_raster(str(mosaic), str(model_path), str(tmp_path / "biomass.tif"),
+                                    window=128, overlap=0, batch_size=3)
+    with rasterio.open(raster) as src, rasterio.open(mosaic) as ref:
+        assert src.dtypes == ("float32",) and src.transform == ref.transform and src.crs == ref.crs
+        pred = src.read(1)
+
+    # Pixels covered only by the first window match a direct forward pass; the footprint mask is NaN
+    with torch.no_grad():
+        expected = model(torch.from_numpy(arr[None, :, :128, :128].astype("float32") / 10000.0))[0].numpy()
+    np.testing.assert_allclose(pred[:128, 40:128], expected[:, 40:], rtol=1e-4, atol=1e-5)
+    assert np.isnan(pred[:, :40]).all() and np.isfinite(pred[:, 40:]).all()
+
+    tilejson = render_biomass_tiles(raster, str(tmp_path / "biomass.mbtiles"), min_zoom=14, max_zoom=15)
+    meta = json.loads(open(tilejson).read())
+    assert meta["render"]["colormap"] == "biomass" and meta["render"]["stretch"] == [[0.0, 8.0]]
+
+    from rasterio.warp import transform_bounds
+    x0, y0, x1, y1 = tile_range(transform_bounds("EPSG:4326", "EPSG:3857", *BOUNDS), 15)
+    lut = {tuple(c) for c in colormap_lut("biomass")}
+    reader = MBTilesReader(str(tmp_path / "biomass.mbtiles"))
+    data = next(d for d in (reader.get(15, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)) if d)
+    reader.close()
+    rgba = decode_png(data)
+    opaque = rgba[rgba[..., 3] == 255][:, :3]
+    assert len(opaque) and {tuple(c) for c in np.unique(opaque, axis=0)} <= lut
@@ -0,0 +1,112 @@
+# tests/test_compute_indices.py
+"""Tests for vegetation index rasters."""
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_bounds
+
+from data_pipeline.compute_indices import (
+    calculate_evi,
+    calculate_gndvi,
+    calculate_ndvi,
+    calculate_savi,
+    process_geotiff,
+)
+
+
+def _write_scene(path, height=300, width=200, tiled=True):
+    rng = np.random.default_rng(42)
+    # Surface-reflectance ranges for blue, green, red, NIR over pasture
+    lo = np.array([0.02, 0.05, 0.03, 0.2])[:, None, None]
+    hi = np.array([0.08, 0.15, 0.12, 0.6])[:, None, None]
+    arr = rng.uniform(lo, hi, size=(4, height, width)).astype("float32")
+    profile = dict(
+        driver="GTiff", height=height, width=width, count=4, dtype="float32",
+        crs="EPSG:4326", transform=from_bounds(150.87, -34.42, 150.89, -34.40, width, height),
+    )
+    if tiled:
+        profile.update(tiled=True, blockxsize=64, blockysize=64)
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(arr)
+    return arr.astype("float64")
+
+
+def _read(path):
+    with rasterio.open(path) as src:
+        return src.read(1)
+
+
+def test_windowed_indices_match_full_scene(tmp_path):
+    for tiled in (True, False):
+        tif = tmp_path / f"scene_{tiled}.tif"
+        blue, green, red, nir = _write_scene(tif, tiled=tiled)
+        out = tmp_path / f"out_{tiled}"
+        process_geotiff(str(tif), str(out))
+
+        np.testing.assert_allclose(_read(out / "ndvi.tif"), calculate_ndvi(red, nir), rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(_read(out / "gndvi.tif"), calculate_gndvi(green, nir), rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(_read(out / "evi.tif"), calculate_evi(blue, red, nir), rtol=1e-4, atol=1e-5)
+
+
+def test_multiband_output_reads_only_needed_bands(tmp_path):
+    tif = tmp_path / "scene.tif"
+    blue, green, red, nir = _write_scene(tif)
+    out = tmp_path / "out"
+    process_geotiff(str(tif), str(out), indices=("savi", "ndvi"), multiband=True)
+
+    with rasterio.open(out / "indices.tif") as src:
+        assert src.count == 2
+        assert src.descriptions == ("savi", "ndvi")
+        savi, ndvi = src.read()
+    np.testing.assert_allclose(savi, calculate_savi(red, nir), rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(ndvi, calculate_ndvi(red, nir), rtol=1e-5, atol=1e-6)
+    assert not (out / "gndvi.tif").exists()
+
+
+def test_ndre_requires_rededge_band(tmp_path):
+    tif = tmp_path / "scene.tif"
+    _write_scene(tif)
+    with pytest.raises(ValueError, match="rededge"):
+        process_geotiff(str(tif), str(tmp_path / "out"), indices=("ndre",))
+
+    # Same file described as a 4-band red-edge sensor
+    process_geotiff(str(tif), str(tmp_path / "out"), indices=("ndre",),
+                    band_order=("green", "red", "rededge", "nir"))
+    assert (tmp_path / "out" / "ndre.tif").exists()
+
+
+def test_threaded_windows_match_serial(tmp_path):
+    tif = tmp_path / "scene.tif"
+    _write_scene(tif, height=512, width=384)
+    process_geotiff(str(tif), str(tmp_path / "serial"), indices=("ndvi", "evi"), multiband=True)
+    process_geotiff(str(tif), str(tmp_path / "threaded"), indices=("ndvi", "evi"), multiband=True, workers=4)
+
+    with rasterio.open(tmp_path / "serial" / "indices.tif") as a, \
+            rasterio.open(tmp_path / "threaded" / "indices.tif") as b:
+        np.testing.assert_array_equal(a.read(), b.read())
+
+
+def test_cog_output_is_tiled_compressed_with_overviews(tmp_path):
+    tif = tmp_path / "scene.tif"
+    _write_scene(tif, height=1024, width=1024, tiled=False)
+    process_geotiff(str(tif), str(tmp_path / "plain"), indices=("ndvi",))
+    process_geotiff(str(tif), str(tmp_path / "cog"), indices=("ndvi", "gndvi"), multiband=True,
+                    cog=True, compress="zstd")
+
+    with rasterio.open(tmp_path / "cog" / "indices.tif") as src, \
+            rasterio.open(tmp_path / "plain" / "ndvi.tif") as ref:
+        assert src.profile["tiled"] and src.block_shapes[0] == (512, 512)
+        assert src.compression.name.lower() == "zstd"
+        assert src.overviews(1) == [2]
+        assert src.descriptions == ("ndvi", "gndvi")
+        np.testing.assert_array_equal(src.read(1), ref.read(1))
+    assert sorted(p.name for p in (tmp_path / "cog").iterdir()) == ["indices.tif"]
+
+
+def test_placeholder_ortho_cog(tmp_path):
+    from data_pipeline.orthomosaic import run_placeholder_ortho
+
+    out = run_placeholder_ortho(str(tmp_path), str(tmp_path / "ortho.tif"), cog=True)
+    with rasterio.open(out) as src:
+        assert src.count == 4 and src.profile["tiled"]
+        assert src.overviews(1)
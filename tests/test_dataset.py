@@ -0,0 +1,48 @@
+# tests/test_dataset.py
+"""Tests for PatchDataset memory-mapped loading and multi-worker DataLoader settings."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "models"))
+from benchmark_dataloader import loader_throughput  # noqa: E402
+from dataset import (  # noqa: E402
+    PatchDataset, loader_kwargs, make_synthetic_samples, pack_samples, samples_from_patch_stores,
+)
+
+
+def test_packed_shards_match_files(tmp_path):
+    files = make_synthetic_samples(n=5, data_dir=str(tmp_path / "files"))
+    shards = pack_samples(files, tmp_path / "shards", shard_size=2)
+    assert len({s["image_shard"] for s in shards}) == 3
+    # Packed output is a pair of regular patch stores
+    assert len(samples_from_patch_stores(tmp_path / "shards" / "image", tmp_path / "shards" / "label")) == 5
+    by_file, by_shard = PatchDataset(files), PatchDataset(shards)
+    for i in range(5):
+        (img_a, lab_a), (img_b, lab_b) = by_file[i], by_shard[i]
+        assert img_a.dtype == torch.float32 and img_a.is_contiguous()
+        torch.testing.assert_close(img_a, img_b, rtol=0, atol=0)
+        torch.testing.assert_close(lab_a, lab_b, rtol=0, atol=0)
+    expected = np.load(files[3]["image_path"]) / 10000.0
+    np.testing.assert_allclose(by_shard[3][0].numpy(), expected, rtol=1e-6)
+    # Samples own their memory: writable, not views into the memmap
+    img, _ = by_shard[0]
+    img += 1.0
+
+
+def test_multi_worker_loader(tmp_path):
+    shards = pack_samples(make_synthetic_samples(n=12, data_dir=str(tmp_path)), tmp_path / "shards")
+    ds = PatchDataset(shards)
+    assert loader_kwargs(0) == {"num_workers": 0, "pin_memory": False}
+    assert loader_kwargs(2, "cuda", 4) == {"num_workers": 2, "pin_memory": True,
+                                            "persistent_workers": True, "prefetch_factor": 4}
+
+    serial = [b for b, _ in DataLoader(ds, batch_size=4, **loader_kwargs(0))]
+    parallel = [b for b, _ in DataLoader(ds, batch_size=4, **loader_kwargs(2))]
+    assert len(serial) == len(parallel) == 3
+    for a, b in zip(serial, parallel):
+        torch.testing.assert_close(a, b, rtol=0, atol=0)
+    assert loader_throughput(ds, batch_size=4, epochs=1) > 0
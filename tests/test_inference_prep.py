@@ -0,0 +1,59 @@
+# tests/test_inference_prep.py
+"""Tests for UNetRegressor inference preparation (BatchNorm folding, channels-last, freezing)."""
+import sys
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "models"))
+from export_torchscript import export  # noqa: E402
+from inference_prep import fold_batchnorm, prepare_for_inference  # noqa: E402
+from model import UNetRegressor  # noqa: E402
+
+
+def _trained_like_model():
+    """UNetRegressor with non-trivial BatchNorm statistics, as after training."""
+    torch.manual_seed(0)
+    model = UNetRegressor(in_ch=4, base=4)
+    for m in model.modules():
+        if isinstance(m, torch.nn.BatchNorm2d):
+            m.running_mean.uniform_(-0.5, 0.5)
+            m.running_var.uniform_(0.5, 2.0)
+            m.weight.data.uniform_(0.5, 1.5)
+            m.bias.data.uniform_(-0.2, 0.2)
+    return model.eval()
+
+
+def test_fold_batchnorm_matches_unfused():
+    model = _trained_like_model()
+    folded = fold_batchnorm(model)
+    assert not any(isinstance(m, torch.nn.BatchNorm2d) for m in folded.modules())
+    assert any(isinstance(m, torch.nn.BatchNorm2d) for m in model.modules())  # original untouched
+
+    x = torch.rand(2, 4, 64, 64) * 0.5
+    with torch.no_grad():
+        torch.testing.assert_close(folded(x), model(x), rtol=1e-4, atol=1e-5)
+
+
+def test_prepared_module_is_frozen_and_shape_generic(tmp_path):
+    model = _trained_like_model()
+    prepared = prepare_for_inference(model, example_shape=(1, 4, 64, 64))
+    graph = str(prepared.graph)
+    assert "batch_norm" not in graph and "prim::GetAttr" not in graph
+
+    with torch.no_grad():
+        for shape in [(1, 4, 64, 64), (3, 4, 128, 96)]:
+            x = torch.rand(shape) * 0.5
+            torch.testing.assert_close(prepared(x), model(x), rtol=1e-4, atol=1e-5)
+            torch.testing.assert_close(prepared(x.contiguous(memory_format=torch.channels_last)), model(x),
+                                       rtol=1e-4, atol=1e-5)
+
+    # export() (default-width model) writes the prepared module; it survives a save/load round trip
+    big = UNetRegressor(in_ch=4).eval()
+    torch.save(big.state_dict(), tmp_path / "best_model.pth")
+    export(str(tmp_path / "best_model.pth"), str(tmp_path / "model_ts.pt"))
+    loaded = torch.jit.load(str(tmp_path / "model_ts.pt"))
+    x = torch.rand(1, 4, 64, 64) * 0.5
+    with torch.no_grad():
+        torch.testing.assert_close(loaded(x), big(x), rtol=1e-4, atol=1e-5)
+    assert "batch_norm" not in str(loaded.graph)
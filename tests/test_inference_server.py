@@ -1,5 +1,9 @@
 """Tests for Image2Biomass inference server."""
+import os
+import sqlite3
 import sys
+
+import pytest
 from pathlib import Path
 
 # Add inference_server to path so app can be imported
@@ -12,6 +16,16 @@ from app.main import app
 client = TestClient(app)
 
 
+def _use_model(monkeypatch, model, version, name="v3.2-ts"):
+    from app import predict
+    from app.registry import ModelRegistry, ServedModel
+
+    registry = ModelRegistry(on_retire=predict._retire)
+    registry.add(ServedModel(name, model, version, ""))
+    monkeypatch.setattr(predict, "registry", registry)
+    return registry
+
+
 def test_health():
     r = client.get("/api/v1/health")
     assert r.status_code == 200
@@ -37,3 +51,402 @@ def test_predict_json_schema():
     assert "biomass_mean_t_ha" in data
     assert "biomass_std_t_ha" in data
     assert "tile" in data
+
+
+def test_png_tile_served_from_mbtiles(tmp_path, monkeypatch):
+    monkeypatch.setenv("PASTURE_TILES_DIR", str(tmp_path))
+    conn = sqlite3.connect(str(tmp_path / "demo.mbtiles"))
+    conn.executescript(
+        "CREATE TABLE metadata (name TEXT, value TEXT);"
+        "CREATE TABLE images (tile_id TEXT PRIMARY KEY, tile_data BLOB);"
+        "CREATE TABLE map (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT);"
+        "CREATE VIEW tiles AS SELECT zoom_level, tile_column, tile_row, tile_data "
+        "FROM map JOIN images ON images.tile_id = map.tile_id;"
+    )
+    conn.execute("INSERT INTO images VALUES ('abc', ?)", (b"\x89PNG-tile",))
+    # XYZ y=1 at z=2 is TMS row 2
+    conn.execute("INSERT INTO map VALUES (2, 3, 2, 'abc')")
+    conn.commit()
+    conn.close()
+
+    r = client.get("/api/v1/tiles/demo/2/3/1.png")
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "image/png"
+    assert r.content == b"\x89PNG-tile"
+    assert r.headers["etag"] == '"abc"'
+
+    r = client.get("/api/v1/tiles/demo/2/3/1.png", headers={"If-None-Match": '"abc"'})
+    assert r.status_code == 304
+    assert client.get("/api/v1/tiles/demo/2/3/2.png").status_code == 404
+    assert client.get("/api/v1/tiles/missing/2/3/1.png").status_code == 404
+
+    # A connection borrowed while the file is swapped is closed when returned, not pooled
+    from app.tiles import get_pool
+    path = str(tmp_path / "demo.mbtiles")
+    old = get_pool(path)
+    with old.connection() as borrowed:
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+        assert get_pool(path) is not old
+    assert old._idle.empty()
+    with pytest.raises(sqlite3.ProgrammingError):
+        borrowed.execute("SELECT 1")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_micro_batcher_coalesces_concurrent_requests(workers):
+    import numpy as np
+    from app.batcher import MicroBatcher
+
+    calls = []
+
+    def model(t):
+        calls.append(tuple(t.shape))
+        return t[:, 0] * 2
+
+    batcher = MicroBatcher(lambda: model, max_batch_size=8, max_wait_ms=50, workers=workers, threads_per_worker=1)
+    inputs = [np.full((4, 8, 8), i, dtype=np.float32) for i in range(20)]
+    inputs.append(np.ones((4, 8, 5), dtype=np.float32))  # edge tile: own forward pass
+    futures = [batcher.submit(x) for x in inputs]
+    results = [f.result(timeout=5) for f in futures]
+    batcher.stop()
+
+    for i, pred in enumerate(results[:20]):
+        assert pred.shape == (8, 8) and (pred == 2 * i).all()
+    assert results[20].shape == (8, 5)
+    assert sum(shape[0] for shape in calls) == 21
+    assert max(shape[0] for shape in calls) <= 8
+    assert len(calls) < 10
+    assert batcher.stats()["items"] == 21
+
+
+def test_predict_batches_concurrent_requests(monkeypatch):
+    import torch
+    from concurrent.futures import ThreadPoolExecutor
+    from app import main, predict
+
+    class Model(torch.nn.Module):
+        def forward(self, x):
+            return x.mean(dim=1) * 0 + 1.5
+
+    _use_model(monkeypatch, Model(), "batching")
+    predict.prediction_cache.clear()
+    # A generous window (like PASTURE_BATCH_MAX_WAIT_MS) so concurrent requests meet in the batcher
+    monkeypatch.setattr(main.executor.batcher, "max_wait", 0.2)
+    before = main.executor.stats()
+    bodies = [{"pasture_id": "demo", "tile_z": 14, "tile_x": 8500 + i, "tile_y": 5500} for i in range(16)]
+    with ThreadPoolExecutor(8) as pool:
+        responses = list(pool.map(lambda body: client.post("/api/v1/predict", json=body), bodies))
+    assert all(r.status_code == 200 for r in responses)
+    assert {r.json()["biomass_mean_t_ha"] for r in responses} == {1.5}
+    after = main.executor.stats()
+    batches, items = after["batches"] - before["batches"], after["items"] - before["items"]
+    assert items == 16 and batches < items  # concurrent requests shared forward passes
+    assert client.get("/api/v1/health").json()["inference"]["items"] >= 16
+
+
+def test_predict_returns_503_with_retry_after_when_saturated(monkeypatch):
+    import torch
+    from app import main
+
+    class Model(torch.nn.Module):
+        def forward(self, x):
+            return x.mean(dim=1)
+
+    _use_model(monkeypatch, Model(), "admission")
+    monkeypatch.setattr(main.executor, "max_pending", 1)
+    body = {"pasture_id": "demo", "tile_z": 14, "tile_x": 8500, "tile_y": 5500}
+    with main.executor.admit():  # one request already in flight
+        r = client.post("/api/v1/predict", json=body)
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == str(main.executor.retry_after_s)
+    assert client.post("/api/v1/predict", json=body).status_code == 200
+    assert client.get("/api/v1/health").json()["inference"]["rejected"] >= 1
+
+
+def test_prediction_cache_keyed_by_source_and_model(tmp_path, monkeypatch):
+    import numpy as np
+    import rasterio
+    import torch
+    from app import predict
+
+    monkeypatch.setenv("PASTURE_ORTHOS_DIR", str(tmp_path))
+    calls = []
+
+    class Model(torch.nn.Module):
+        def forward(self, x):
+            calls.append(x.shape[0])
+            return x.mean(dim=1)
+
+    def write_tile(value):
+        path = tmp_path / "cached" / "14" / "1" / "2.tif"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with rasterio.open(path, "w", driver="GTiff", height=16, width=16, count=4, dtype="uint16") as dst:
+            dst.write(np.full((4, 16, 16), value, dtype="uint16"))
+        return path
+
+    path = write_tile(2000)
+    _use_model(monkeypatch, Model(), "m1")
+    predict.prediction_cache.clear()
+    body = {"pasture_id": "cached", "tile_z": 14, "tile_x": 1, "tile_y": 2}
+
+    first = client.post("/api/v1/predict", json=body).json()
+    assert client.post("/api/v1/predict", json=body).json() == first
+    assert len(calls) == 1 and first["biomass_mean_t_ha"] == 0.2
+    stats = client.get("/api/v1/health").json()["prediction_cache"]
+    assert stats["hits"] >= 1 and stats["entries"] == 1
+
+    # A rewritten source tile is a new key
+    os.utime(write_tile(3000), ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 10**9))
+    assert client.post("/api/v1/predict", json=body).json()["biomass_mean_t_ha"] == 0.3
+    assert len(calls) == 2
+
+    # load_model swapping the version drops everything cached for the old weights
+    model_path = tmp_path / "model.pt"
+    torch.jit.trace(torch.nn.Conv2d(4, 1, 1), torch.zeros(1, 4, 8, 8)).save(str(model_path))
+    predict.load_model(str(model_path))
+    assert len(predict.prediction_cache) == 0
+    assert predict.get_model_version().startswith(f"{predict.get_registry().default}:model.pt@")
+
+
+def test_byte_lru_cache_evicts_by_size_and_spills(tmp_path):
+    from app.cache import ByteLRUCache
+
+    cache = ByteLRUCache(max_bytes=10, sizeof=len, spill_dir=str(tmp_path), spill_max_bytes=10**6)
+    cache.put("a", b"1234")
+    cache.put("b", b"5678")
+    assert cache.get("a") == b"1234"  # a is now most recent
+    cache.put("c", b"90ab")           # over 10 bytes: evicts b to disk
+    assert cache.stats()["evictions"] == 1 and cache.stats()["spilled_entries"] == 1
+    assert cache.get("b") == b"5678"  # promoted back from disk
+    assert cache.stats()["spill_hits"] == 1
+    cache.put("big", b"x" * 11)       # larger than the cache: not stored
+    assert cache.get("big") is None
+    cache.clear()
+    assert len(cache) == 0 and not list(tmp_path.glob("*.pkl"))
+
+
+def test_read_tile_image_reuses_handles_and_decoded_tiles(tmp_path, monkeypatch):
+    import numpy as np
+    import rasterio
+    from app import predict
+    from app.rasters import DatasetPool
+
+    monkeypatch.setenv("PASTURE_ORTHOS_DIR", str(tmp_path))
+    monkeypatch.setattr(predict, "dataset_pool", DatasetPool(max_open=2))
+    predict.tile_cache.clear()
+    for x in range(3):
+        path = tmp_path / "p" / "15" / str(x) / "7.tif"
+        path.parent.mkdir(parents=True)
+        with rasterio.open(path, "w", driver="GTiff", height=8, width=8, count=4, dtype="uint16") as dst:
+            dst.write(np.full((4, 8, 8), 100 * (x + 1), dtype="uint16"))
+
+    arr, _ = predict.read_tile_image("p", 15, 0, 7)
+    assert arr.dtype == np.float32 and (arr == 100).all() and not arr.flags.writeable
+    again, _ = predict.read_tile_image("p", 15, 0, 7)
+    assert again is arr                       # decoded tile served from the cache
+    assert predict.dataset_pool.stats()["opened"] == 1
+
+    # Without the decoded cache, repeat reads reuse the open handle
+    predict.tile_cache.clear()
+    predict.read_tile_image("p", 15, 0, 7)
+    assert predict.dataset_pool.stats() == {"open_idle": 1, "max_open": 2, "opened": 1, "reused": 1}
+
+    # The pool stays bounded
+    for x in range(3):
+        predict.read_tile_image("p", 15, x, 7)
+    assert predict.dataset_pool.stats()["open_idle"] == 2
+    predict.dataset_pool.close()
+
+
+def test_predict_batch_streams_ndjson(monkeypatch):
+    import json
+    import numpy as np
+    import torch
+    from app import main, predict
+
+    calls = []
+
+    class Model(torch.nn.Module):
+        def forward(self, x):
+            calls.append(x.shape[0])
+            return x.mean(dim=1) * 0 + 1.5
+
+    def load(pasture_id, z, x, y):
+        if x == 13:
+            raise OSError("corrupt tile")
+        return np.zeros((4, 8, 8), dtype=np.float32)
+
+    _use_model(monkeypatch, Model(), "batch")
+    monkeypatch.setattr(main, "load_tile_input", load)
+    monkeypatch.setattr(main.executor.batcher, "max_batch_size", 8)
+    predict.prediction_cache.clear()
+    client.post("/api/v1/predict/batch", json={"pasture_id": "vp", "tiles": [[14, 0, 0]]})
+    calls.clear()
+
+    tiles = [[14, x, 0] for x in range(20)]
+    r = client.post("/api/v1/predict/batch", json={"pasture_id": "vp", "tiles": tiles})
+    assert r.status_code == 200 and r.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[0]["tile"] == {"z": 14, "x": 0, "y": 0}  # cached, streamed first
+    assert sorted(line["tile"]["x"] for line in lines) == list(range(20))
+    assert [line["error"] for line in lines if "error" in line] == ["corrupt tile"]
+    assert {line["biomass_mean_t_ha"] for line in lines if "error" not in line} == {1.5}
+    assert sum(calls) == 18 and len(calls) <= 6 and max(calls) <= 8
+
+    # bbox + zoom covers the tiles under it
+    assert predict.tiles_in_bbox([150.87, -34.42, 150.89, -34.40], 14) == [
+        (14, 15058, 9861), (14, 15059, 9861), (14, 15058, 9862), (14, 15059, 9862)]
+    r = client.post("/api/v1/predict/batch", json={"pasture_id": "vp", "bbox": [150.87, -34.42, 150.89, -34.40],
+                                                    "zoom": 14})
+    assert len(r.text.splitlines()) == 4
+    assert client.post("/api/v1/predict/batch", json={"pasture_id": "vp"}).status_code == 422
+
+    # Oversized viewports are refused from their size alone, before any tile list is built
+    world = [-180.0, -90.0, 180.0, 90.0]
+    assert predict.bbox_tile_count(world, 24) == 2 ** 48
+    r = client.post("/api/v1/predict/batch", json={"pasture_id": "vp", "bbox": world, "zoom": 24})
+    assert r.status_code == 413
+    for zoom in (-1, 25):
+        assert client.post("/api/v1/predict/batch",
+                           json={"pasture_id": "vp", "bbox": world, "zoom": zoom}).status_code == 422
+    for bad in ([14, -5, 0], [14, 0, 2 ** 14], [25, 0, 0], [-1, 0, 0]):
+        assert client.post("/api/v1/predict/batch", json={"pasture_id": "vp", "tiles": [bad]}).status_code == 422
+
+    monkeypatch.setattr(main.executor, "max_pending", 1)
+    with main.executor.admit():
+        assert client.post("/api/v1/predict/batch", json={"pasture_id": "vp", "tiles": tiles}).status_code == 503
+    assert main.executor.pending == 0
+
+    # Each uncached tile takes a slot (capped at max_pending); cache hits need none
+    predict.prediction_cache.clear()
+    monkeypatch.setattr(main.executor, "max_pending", 4)
+    with main.executor.admit():
+        assert client.post("/api/v1/predict/batch", json={"pasture_id": "vp", "tiles": tiles}).status_code == 503
+    assert client.post("/api/v1/predict/batch", json={"pasture_id": "vp", "tiles": tiles}).status_code == 200
+    readable = [t for t in tiles if t[1] != 13]
+    with main.executor.admit(4):
+        r = client.post("/api/v1/predict/batch", json={"pasture_id": "vp", "tiles": readable})
+        assert r.status_code == 200 and len(r.text.splitlines()) == 19
+    assert main.executor.pending == 0
+
+
+def test_model_hot_swap_and_versioned_requests(tmp_path, monkeypatch):
+    import torch
+    from app import main, predict
+
+    class Constant(torch.nn.Module):
+        def __init__(self, value):
+            super().__init__()
+            self.value = value
+
+        def forward(self, x):
+            return x[:, 0] * 0 + self.value
+
+    def export(value, name):
+        path = tmp_path / name
+        torch.jit.trace(Constant(value), torch.zeros(1, 4, 8, 8)).save(str(path))
+        return path
+
+    registry = _use_model(monkeypatch, Constant(1.0), "initial")
+    predict.prediction_cache.clear()
+    # Admin endpoints stay closed until a token is configured
+    monkeypatch.delenv("PASTURE_ADMIN_TOKEN", raising=False)
+    assert client.get("/api/v1/admin/models", headers={"X-Admin-Token": ""}).status_code == 403
+    monkeypatch.setenv("PASTURE_ADMIN_TOKEN", "s3cret")
+    headers = {"X-Admin-Token": "s3cret"}
+    assert client.get("/api/v1/admin/models", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    body = {"pasture_id": "swap", "tile_z": 14, "tile_x": 1, "tile_y": 1}
+    assert client.post("/api/v1/predict", json=body).json()["biomass_mean_t_ha"] == 1.0
+
+    # A candidate version is served side by side, only when asked for
+    candidate = export(2.0, "candidate.pt")
+    assert client.post("/api/v1/admin/models", json={"path": str(candidate), "version": "v4"}).status_code == 403
+    r = client.post("/api/v1/admin/models", json={"path": str(candidate), "version": "v4"}, headers=headers)
+    assert r.status_code == 200 and r.json()["default"] is False
+    assert client.post("/api/v1/predict", json=body).json()["biomass_mean_t_ha"] == 1.0
+    shadow = client.post("/api/v1/predict", json={**body, "model_version": "v4"}).json()
+    assert shadow["biomass_mean_t_ha"] == 2.0 and shadow["model_version"] == "v4"
+    assert client.post("/api/v1/predict", json={**body, "model_version": "nope"}).status_code == 404
+
+    # Promote it: default traffic switches, old cached results are retired
+    r = client.post("/api/v1/admin/models", json={"path": str(candidate), "version": "v3.2-ts", "default": True},
+                    headers=headers)
+    assert r.status_code == 200
+    assert client.post("/api/v1/predict", json=body).json()["biomass_mean_t_ha"] == 2.0
+    assert not any(k[-1] == "initial" for k in predict.prediction_cache._entries)
+    versions = client.get("/api/v1/admin/models", headers=headers).json()
+    assert versions["default"] == "v3.2-ts" and {m["name"] for m in versions["models"]} == {"v3.2-ts", "v4"}
+    # Both versions come from candidate.pt; retiring v4 keeps the default's cached results
+    live = registry.get("v3.2-ts").version_id
+    assert live != registry.get("v4").version_id
+    assert client.delete("/api/v1/admin/models/v4", headers=headers).status_code == 200
+    assert any(k[-1] == live for k in predict.prediction_cache._entries)
+    assert client.delete("/api/v1/admin/models/v3.2-ts", headers=headers).status_code == 409
+
+
+def test_model_watcher_swaps_changed_file_once_stable(tmp_path):
+    import torch
+    from app.registry import ModelRegistry, ModelWatcher
+
+    path = tmp_path / "model.pt"
+    torch.jit.trace(torch.nn.Conv2d(4, 1, 1), torch.zeros(1, 4, 8, 8)).save(str(path))
+    registry = ModelRegistry()
+    registry.load(str(path), "live", warmup_shape=(1, 4, 8, 8))
+    first = registry.get()
+    watcher = ModelWatcher(registry, str(path), "live")
+
+    torch.jit.trace(torch.nn.Conv2d(4, 1, 3, padding=1), torch.zeros(1, 4, 8, 8)).save(str(path))
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 10**9))
+    seen = watcher.poll(None)        # change noticed, not yet stable
+    assert registry.get() is first
+    watcher.poll(seen)               # unchanged since last poll: swap
+    assert registry.get() is not first and registry.get().version_id != first.version_id
+
+
+def test_registry_serves_onnx_models(tmp_path):
+    import torch
+    pytest.importorskip("onnxruntime")
+    sys.path.insert(0, str(Path(__file__).parent.parent / "models"))
+    from export_onnx import export_module_onnx, quantize_onnx, synthetic_calibration
+    from model import UNetRegressor
+    from app.registry import ModelRegistry
+
+    torch.manual_seed(0)
+    model = UNetRegressor(in_ch=4, base=4).eval()
+    fp32 = export_module_onnx(model, str(tmp_path / "model.onnx"))
+    int8 = quantize_onnx(fp32, str(tmp_path / "model_int8.onnx"), calibration=synthetic_calibration(n=2, size=32))
+
+    registry = ModelRegistry(threads=2)
+    served = registry.load(fp32, "onnx-fp32", warmup_shape=(1, 4, 64, 64))
+    assert served.backend == "onnx" and registry.versions()[0]["backend"] == "onnx"
+    # Sessions use the executor's threads_per_worker, not every core
+    assert served.model.session.get_session_options().intra_op_num_threads == 2
+    registry.load(int8, "onnx-int8", make_default=False, warmup_shape=None)
+
+    x = torch.rand(3, 4, 64, 64) * 0.5
+    with torch.no_grad():
+        expected = model(x)
+    out = served.model(x)
+    assert isinstance(out, torch.Tensor) and out.shape == (3, 64, 64)
+    torch.testing.assert_close(out, expected, rtol=1e-4, atol=1e-4)
+    assert registry.get("onnx-int8").model(x).shape == (3, 64, 64)
+    with pytest.raises(ValueError):
+        registry.load(fp32, "bad", backend="tensorrt")
+
+
+def test_registry_prepares_torchscript_models(tmp_path):
+    import torch
+    sys.path.insert(0, str(Path(__file__).parent.parent / "models"))
+    from model import UNetRegressor
+    from app.registry import ModelRegistry
+
+    # A plain trace, as exported before inference preparation existed
+    torch.manual_seed(0)
+    model = UNetRegressor(in_ch=4, base=4).eval()
+    torch.jit.trace(model, torch.zeros(1, 4, 64, 64)).save(str(tmp_path / "model.pt"))
+
+    served = ModelRegistry().load(str(tmp_path / "model.pt"), "prepared", warmup_shape=(1, 4, 64, 64))
+    assert "prim::GetAttr" not in str(served.model.graph)  # frozen
+    x = torch.rand(2, 4, 64, 96) * 0.5
+    with torch.no_grad():
+        torch.testing.assert_close(served.model(x), model(x), rtol=1e-4, atol=1e-5)
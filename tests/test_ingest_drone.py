@@ -0,0 +1,171 @@
+# tests/test_ingest_drone.py
+"""Tests for drone image ingestion and catalog building."""
+import os
+
+from data_pipeline.ingest_drone import ingest_directory, scan_images
+
+
+def _touch(path, payload=b"not-a-real-jpeg"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(payload)
+
+
+def test_scan_images_single_pass_mixed_extensions(tmp_path):
+    _touch(tmp_path / "a.jpg")
+    _touch(tmp_path / "flight1" / "b.JPG")
+    _touch(tmp_path / "flight1" / "nested" / "c.tif")
+    _touch(tmp_path / "flight2" / "d.DNG")
+    _touch(tmp_path / "notes.txt")
+
+    found = {os.path.basename(p) for p, _, _ in scan_images(str(tmp_path))}
+    assert found == {"a.jpg", "b.JPG", "c.tif", "d.DNG"}
+
+
+def test_ingest_parallel_matches_serial(tmp_path):
+    src = tmp_path / "src"
+    for i in range(6):
+        _touch(src / f"img_{i}.jpg")
+
+    serial = ingest_directory(str(src), str(tmp_path / "serial.csv"), workers=1, incremental=False)
+    parallel = ingest_directory(str(src), str(tmp_path / "parallel.csv"), workers=2, incremental=False)
+    assert sorted(serial["image_path"]) == sorted(parallel["image_path"])
+
+
+def test_ingest_incremental_only_reads_changed(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    out = tmp_path / "catalog.csv"
+    _touch(src / "a.jpg")
+    _touch(src / "b.jpg")
+    ingest_directory(str(src), str(out))
+
+    import data_pipeline.ingest_drone as ingest
+
+    seen = []
+    original = ingest.extract_metadata
+    monkeypatch.setattr(ingest, "extract_metadata", lambda p: seen.append(p.name) or original(p))
+
+    _touch(src / "c.jpg")
+    _touch(src / "b.jpg", b"re-flown-with-different-size")
+    (src / "a.jpg").unlink()
+    df = ingest_directory(str(src), str(out))
+
+    assert sorted(seen) == ["b.jpg", "c.jpg"]
+    assert sorted(os.path.basename(p) for p in df["image_path"]) == ["b.jpg", "c.jpg"]
+
+
+def test_ingest_rereads_everything_when_catalog_is_missing(tmp_path):
+    src = tmp_path / "src"
+    out = tmp_path / "catalog.csv"
+    for name in ("a.jpg", "b.jpg", "c.jpg"):
+        _touch(src / name)
+    ingest_directory(str(src), str(out))
+
+    # The manifest survives, the catalog does not
+    out.unlink()
+    df = ingest_directory(str(src), str(out))
+    assert sorted(os.path.basename(p) for p in df["image_path"]) == ["a.jpg", "b.jpg", "c.jpg"]
+
+    out.write_text("")  # unreadable
+    df = ingest_directory(str(src), str(out))
+    assert len(df) == 3
+
+
+def test_ingest_empty_directory(tmp_path):
+    (tmp_path / "src").mkdir()
+    assert len(ingest_directory(str(tmp_path / "src"), str(tmp_path / "catalog.csv"))) == 0
+    assert len(ingest_directory(str(tmp_path / "src"), str(tmp_path / "catalog.parquet"))) == 0
+
+
+def test_ingest_parquet_incremental(tmp_path):
+    from data_pipeline.catalog import read_catalog
+
+    src = tmp_path / "src"
+    out = tmp_path / "catalog.parquet"
+    _touch(src / "a.jpg")
+    _touch(src / "b.jpg")
+    assert len(ingest_directory(str(src), str(out))) == 2
+
+    _touch(src / "b.jpg", b"re-flown-with-different-size")
+    (src / "a.jpg").unlink()
+    df = ingest_directory(str(src), str(out))
+    assert [os.path.basename(p) for p in df["image_path"]] == ["b.jpg"]
+
+    df = read_catalog(str(out))
+    assert [os.path.basename(p) for p in df["image_path"]] == ["b.jpg"]
+
+    # Manifest without its catalog: everything is read again
+    import shutil
+    shutil.rmtree(out)
+    _touch(src / "c.jpg")
+    df = ingest_directory(str(src), str(out))
+    assert sorted(os.path.basename(p) for p in df["image_path"]) == ["b.jpg", "c.jpg"]
+
+
+def test_read_catalog_pushes_down_date_and_bbox(tmp_path):
+    from data_pipeline.catalog import ParquetCatalogWriter, read_catalog
+
+    rows = [
+        {"image_path": "a", "timestamp": "2026:01:02 10:00:00", "camera_model": "M3M", "lat": -34.41, "lon": 150.88},
+        {"image_path": "b", "timestamp": "2026:01:09 10:00:00", "camera_model": "M3M", "lat": -34.41, "lon": 150.88},
+        {"image_path": "c", "timestamp": "2026:01:09 11:00:00", "camera_model": "P4 Multi/RTK", "lat": -30.0, "lon": 140.0},
+        {"image_path": "d", "timestamp": "unknown", "camera_model": "unknown", "lat": None, "lon": None},
+    ]
+    with ParquetCatalogWriter(str(tmp_path / "cat"), batch_size=2) as writer:
+        for row in rows:
+            writer.add(row)
+
+    assert len(read_catalog(str(tmp_path / "cat"))) == 4
+    in_range = read_catalog(str(tmp_path / "cat"), start_date="2026-01-05", end_date="2026-01-31")
+    assert sorted(in_range["image_path"]) == ["b", "c"]
+    assert set(in_range["camera_model"]) == {"M3M", "P4 Multi/RTK"}
+    in_bbox = read_catalog(
+        str(tmp_path / "cat"), start_date="2026-01-05", bbox=(150.87, -34.42, 150.89, -34.40)
+    )
+    assert list(in_bbox["image_path"]) == ["b"]
+
+
+def _grid_index(tmp_path):
+    import numpy as np
+    import pandas as pd
+    from data_pipeline.spatial_index import CatalogSpatialIndex
+
+    rng = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame({
+        "image_path": [f"img_{i}.jpg" for i in range(n)],
+        "lat": rng.uniform(-34.45, -34.35, n),
+        "lon": rng.uniform(150.80, 150.95, n),
+        "capture_date": np.where(np.arange(n) % 2 == 0, "2026-01-02", "2026-02-10"),
+    })
+    index = CatalogSpatialIndex.from_frame(df)
+    index.save(str(tmp_path / "cat.sindex.npz"))
+    return df, CatalogSpatialIndex.load(str(tmp_path / "cat.sindex.npz"))
+
+
+def test_spatial_index_bbox_and_polygon_match_linear_scan(tmp_path):
+    df, index = _grid_index(tmp_path)
+    bbox = (150.85, -34.42, 150.90, -34.38)
+
+    expected = df[df.lon.between(bbox[0], bbox[2]) & df.lat.between(bbox[1], bbox[3])]
+    assert sorted(index.images_in_bbox(bbox)["image_path"]) == sorted(expected["image_path"])
+
+    feb = index.images_in_bbox(bbox, date_range=("2026-02-01", None))
+    assert sorted(feb["image_path"]) == sorted(expected[expected.capture_date == "2026-02-10"]["image_path"])
+
+    ring = [[bbox[0], bbox[1]], [bbox[2], bbox[1]], [bbox[2], bbox[3]], [bbox[0], bbox[3]], [bbox[0], bbox[1]]]
+    in_poly = index.images_in_polygon({"type": "Polygon", "coordinates": [ring]})
+    assert sorted(in_poly["image_path"]) == sorted(expected["image_path"])
+
+
+def test_spatial_index_nearest_matches_brute_force(tmp_path):
+    from data_pipeline.spatial_index import haversine_m
+
+    df, index = _grid_index(tmp_path)
+    lat, lon = -34.40, 150.87
+    dist = haversine_m(lat, lon, df["lat"].to_numpy(), df["lon"].to_numpy())
+    expected = list(df["image_path"].to_numpy()[dist.argsort()[:5]])
+
+    nearest = index.nearest_images(lat, lon, k=5)
+    assert list(nearest["image_path"]) == expected
+    assert nearest["distance_m"].is_monotonic_increasing
+    assert len(index.nearest_images(lat, lon, k=5000)) == len(df)
@@ -0,0 +1,39 @@
+# tests/test_onnx_export.py
+"""Tests for the ONNX / int8 export of UNetRegressor."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+
+pytest.importorskip("onnxruntime")
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "models"))
+from export_onnx import check_parity, export_module_onnx, quantize_onnx, synthetic_calibration  # noqa: E402
+from model import UNetRegressor  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def exported(tmp_path_factory):
+    torch.manual_seed(0)
+    model = UNetRegressor(in_ch=4, base=8).eval()
+    out = tmp_path_factory.mktemp("onnx")
+    fp32 = export_module_onnx(model, str(out / "model.onnx"))
+    int8 = quantize_onnx(fp32, str(out / "model_int8.onnx"), calibration=synthetic_calibration(n=4, size=64))
+    return model, fp32, int8
+
+
+def test_onnx_parity_with_dynamic_axes(exported):
+    model, fp32, int8 = exported
+    shapes = [(1, 4, 256, 256), (5, 4, 64, 64), (2, 4, 128, 200)]
+    assert all(err < 1e-4 for err in check_parity(model, fp32, shapes).values())
+
+    # int8 tracks fp32 to within a few percent of the output range
+    with torch.no_grad():
+        ref = model(torch.from_numpy(np.random.default_rng(0).uniform(0.02, 0.5, (1, 4, 256, 256))
+                                     .astype(np.float32))).numpy()
+    spread = float(ref.max() - ref.min())
+    assert all(err < 0.1 * spread for err in check_parity(model, int8, shapes[:2]).values())
+    assert Path(int8).stat().st_size < 0.5 * Path(fp32).stat().st_size
+
@@ -0,0 +1,168 @@
+# tests/test_tile_generator.py
+"""Tests for the XYZ tile pyramid generator."""
+import json
+import sqlite3
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_bounds
+
+from data_pipeline.tile_generator import (
+    MBTilesReader,
+    decode_png,
+    diff_bounds,
+    downsample_2x2,
+    generate_xyz_tiles,
+    tile_path,
+    tile_range,
+)
+
+BOUNDS = (150.87, -34.42, 150.89, -34.40)
+
+
+def _write_ortho(path, size=512, empty_left_half=False, constant=False, reflown=False):
+    rng = np.random.default_rng(3)
+    arr = rng.uniform(0.05, 0.4, size=(4, size, size)).astype("float32")
+    if constant:
+        arr[:] = 0.2
+    if reflown:
+        arr[:, 40:90, 300:360] = 0.35
+    if empty_left_half:
+        arr[:, :, : size // 2] = 0.0
+    with rasterio.open(
+        path, "w", driver="GTiff", height=size, width=size, count=4, dtype="float32",
+        crs="EPSG:4326", transform=from_bounds(*BOUNDS, size, size), nodata=0.0,
+    ) as dst:
+        dst.write(arr)
+
+
+def _read_png(path):
+    return decode_png(path.read_bytes())
+
+
+def _tiles(out):
+    return sorted(p.relative_to(out).as_posix() for p in out.rglob("*.png"))
+
+
+def test_pyramid_levels_built_from_children(tmp_path):
+    ortho = tmp_path / "ortho.tif"
+    _write_ortho(ortho)
+    out = tmp_path / "tiles"
+    tilejson = generate_xyz_tiles(str(ortho), str(out), min_zoom=12, max_zoom=15)
+
+    meta = json.loads(open(tilejson).read())
+    assert meta["minzoom"] == 12 and meta["maxzoom"] == 15
+    assert meta["bounds"][0] <= BOUNDS[0] and meta["bounds"][2] >= BOUNDS[2]
+
+    tiles = _tiles(out)
+    assert {t.split("/")[0] for t in tiles} == {"12", "13", "14", "15"}
+    assert not list(out.glob(".*")), "temporary Mercator raster must be removed"
+
+    # Every written tile at z15 has visible pixels; parents are 2x2 downsamples
+    for z in (15, 14, 13):
+        for t in tiles:
+            if t.startswith(f"{z}/"):
+                assert _read_png(out / t)[..., 3].any()
+    z, x, y = 14, *map(int, next(t for t in tiles if t.startswith("14/"))[3:-4].split("/"))
+    children = {
+        (dx, dy): _read_png(tile_path(out, z + 1, 2 * x + dx, 2 * y + dy))
+        for dx in (0, 1) for dy in (0, 1)
+        if tile_path(out, z + 1, 2 * x + dx, 2 * y + dy).exists()
+    }
+    np.testing.assert_array_equal(_read_png(tile_path(out, z, x, y)), downsample_2x2(children, 256))
+
+
+def test_fully_nodata_tiles_skipped_and_parallel_matches(tmp_path):
+    from rasterio.warp import transform_bounds
+
+    ortho = tmp_path / "ortho.tif"
+    _write_ortho(ortho, empty_left_half=True)
+    serial, parallel = tmp_path / "serial", tmp_path / "parallel"
+    generate_xyz_tiles(str(ortho), str(serial), min_zoom=13, max_zoom=16)
+    generate_xyz_tiles(str(ortho), str(parallel), min_zoom=13, max_zoom=16, workers=3)
+
+    assert _tiles(serial) == _tiles(parallel)
+    for t in _tiles(serial):
+        np.testing.assert_array_equal(_read_png(serial / t), _read_png(parallel / t))
+
+    # Only tiles touching the right (valid) half of the mosaic are written
+    x0, y0, x1, y1 = tile_range(transform_bounds("EPSG:4326", "EPSG:3857", *BOUNDS), 16)
+    mid_lon = (BOUNDS[0] + BOUNDS[2]) / 2
+    xm = tile_range(transform_bounds("EPSG:4326", "EPSG:3857", mid_lon, BOUNDS[1], BOUNDS[2], BOUNDS[3]), 16)[0]
+    xs = {int(t.split("/")[1]) for t in _tiles(serial) if t.startswith("16/")}
+    assert xs == set(range(xm, x1 + 1))
+
+
+def test_mbtiles_matches_directory_and_dedups(tmp_path):
+    ortho = tmp_path / "ortho.tif"
+    _write_ortho(ortho, constant=True)
+    tiles_dir, mbtiles = tmp_path / "tiles", tmp_path / "pasture.mbtiles"
+    generate_xyz_tiles(str(ortho), str(tiles_dir), min_zoom=13, max_zoom=16)
+    tilejson = generate_xyz_tiles(str(ortho), str(mbtiles), min_zoom=13, max_zoom=16, workers=2)
+
+    assert tilejson == str(tmp_path / "pasture.tilejson.json")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["ortho.tif", "pasture.mbtiles", "pasture.tilejson.json", "tiles"]
+
+    reader = MBTilesReader(str(mbtiles))
+    for t in _tiles(tiles_dir):
+        z, x, y = map(int, t[:-4].split("/"))
+        assert reader.get(z, x, y) == (tiles_dir / t).read_bytes()
+    reader.close()
+
+    conn = sqlite3.connect(str(mbtiles))
+    n_tiles = conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+    n_images = conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+    meta = dict(conn.execute("SELECT name, value FROM metadata"))
+    # MBTiles rows are TMS (y flipped)
+    z, x, row = conn.execute("SELECT zoom_level, tile_column, tile_row FROM tiles LIMIT 1").fetchone()
+    conn.close()
+    assert tile_path(tiles_dir, z, x, (1 << z) - 1 - row).exists()
+    assert n_tiles == len(_tiles(tiles_dir))
+    # A uniform mosaic renders mostly identical interior tiles
+    assert n_images < n_tiles
+    assert meta["format"] == "png" and meta["minzoom"] == "13" and meta["maxzoom"] == "16"
+
+
+def test_incremental_update_rebuilds_only_affected_tiles(tmp_path):
+    from rasterio.warp import transform_bounds
+
+    old, new = tmp_path / "old.tif", tmp_path / "new.tif"
+    _write_ortho(old)
+    _write_ortho(new, reflown=True)
+    out, mbtiles = tmp_path / "tiles", tmp_path / "farm.mbtiles"
+    generate_xyz_tiles(str(old), str(out), min_zoom=12, max_zoom=16)
+    generate_xyz_tiles(str(old), str(mbtiles), min_zoom=12, max_zoom=16)
+    before = {t: (out / t).read_bytes() for t in _tiles(out)}
+
+    generate_xyz_tiles(str(new), str(out), previous_ortho=str(old), workers=2)
+    after = {t: (out / t).read_bytes() for t in _tiles(out)}
+    assert before.keys() == after.keys()
+    changed = {t for t in before if before[t] != after[t]}
+
+    # Only max-zoom tiles over the re-flown area change, plus their ancestors
+    x0, y0, x1, y1 = tile_range(transform_bounds("EPSG:4326", "EPSG:3857", *diff_bounds(str(old), str(new))), 16)
+    base = {tuple(map(int, t[3:-4].split("/"))) for t in changed if t.startswith("16/")}
+    assert base and all(x0 <= x <= x1 and y0 <= y <= y1 for x, y in base)
+    assert len(base) < sum(t.startswith("16/") for t in before)
+    for z in range(12, 16):
+        ancestors = {(x >> (16 - z), y >> (16 - z)) for x, y in base}
+        assert {tuple(map(int, t[len(f"{z}/"):-4].split("/"))) for t in changed if t.startswith(f"{z}/")} == ancestors
+        for x, y in ancestors:
+            children = {
+                (dx, dy): _read_png(tile_path(out, z + 1, 2 * x + dx, 2 * y + dy))
+                for dx in (0, 1) for dy in (0, 1)
+                if tile_path(out, z + 1, 2 * x + dx, 2 * y + dy).exists()
+            }
+            np.testing.assert_array_equal(_read_png(tile_path(out, z, x, y)), downsample_2x2(children, 256))
+
+    # The same update applied to an MBTiles pyramid via explicit bounds gives identical tiles
+    generate_xyz_tiles(str(new), str(mbtiles), changed_bounds=diff_bounds(str(old), str(new)))
+    reader = MBTilesReader(str(mbtiles))
+    for t, data in after.items():
+        z, x, y = map(int, t[:-4].split("/"))
+        assert reader.get(z, x, y) == data
+    reader.close()
+
+    # Diffing identical mosaics is a no-op
+    generate_xyz_tiles(str(new), str(out), previous_ortho=str(new))
+    assert {t: (out / t).read_bytes() for t in _tiles(out)} == after
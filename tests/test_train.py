@@ -0,0 +1,45 @@
+# tests/test_train.py
+"""Tests for the UNetRegressor training loop options (AMP, gradient accumulation)."""
+import sys
+from pathlib import Path
+
+import pytest
+import torch
+from torch.utils.data import TensorDataset
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "models"))
+import train  # noqa: E402
+from train import resolve_amp_dtype, train_loop  # noqa: E402
+
+
+def test_resolve_amp_dtype():
+    assert resolve_amp_dtype("off", "cpu") is None
+    assert resolve_amp_dtype("auto", "cpu") is torch.bfloat16
+    assert resolve_amp_dtype("bf16", "cpu") is torch.bfloat16
+    with pytest.raises(ValueError):
+        resolve_amp_dtype("fp16", "cpu")
+    with pytest.raises(ValueError):
+        resolve_amp_dtype("int8", "cpu")
+
+
+def test_bf16_training_with_gradient_accumulation(tmp_path, monkeypatch, capsys):
+    steps = []
+
+    class CountingAdam(torch.optim.Adam):
+        def step(self, *args, **kwargs):
+            steps.append(1)
+            return super().step(*args, **kwargs)
+
+    monkeypatch.setattr(train.optim, "Adam", CountingAdam)
+    torch.manual_seed(0)
+    train_ds = TensorDataset(torch.rand(10, 4, 32, 32) * 0.5, torch.rand(10, 32, 32) * 5)
+    val_ds = TensorDataset(torch.rand(2, 4, 32, 32) * 0.5, torch.rand(2, 32, 32) * 5)
+
+    # 5 micro-batches of 2, stepped every 2: 3 optimizer steps per epoch (the last one partial)
+    model = train_loop(train_ds, val_ds, out_dir=str(tmp_path), epochs=2, device="cpu",
+                       batch_size=2, amp="bf16", accum_steps=2)
+    assert len(steps) == 6
+    assert all(p.dtype == torch.float32 for p in model.parameters())
+    assert (tmp_path / "best_model.pth").exists()
+    log = capsys.readouterr().out.splitlines()
+    assert len(log) == 2 and all("samples/s" in line for line in log)